@@ -65,8 +65,7 @@ class Test(base.TestBase):
         if not self.nested_command:
             try:
                 self.setup()
-                # Give some time for the topology to start.
-                time.sleep(10)
+                self.await_healthy()
                 self._run()
             finally:
                 self.teardown()
@@ -103,7 +102,7 @@ class Test(base.TestBase):
 
         logger.info("==> Restart containers")
         self.setup_start()
-        time.sleep(5)
+        self.await_healthy()
 
         logger.info("==> Check connectivity")
         subprocess.run(
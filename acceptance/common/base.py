@@ -218,6 +218,12 @@ class TestBase(cli.Application):
         print(self.test_state.dc("up", "-d"))
         print(self.test_state.dc("ps"))
 
+    def await_healthy(self):
+        """Waits until the services in the topology are healthy, see the
+        healthchecks in python/topology/docker.py.
+        """
+        self.test_state.dc.await_healthy()
+
     def teardown(self):
         out_dir = self.test_state.artifacts / "logs"
         self.test_state.dc.collect_logs(out_dir=out_dir)
@@ -29,7 +29,9 @@ import json
 import os
 import subprocess
 import sys
-from typing import List, NamedTuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
 from contextlib import redirect_stderr
 
 import plumbum
@@ -37,6 +39,10 @@ from plumbum import cmd
 
 SCION_DC_FILE = "gen/scion-dc.yml"
 DC_PROJECT = "scion"
+# Written next to the compose file for a topology generated with
+# --compose-shards, see python/topology/docker.py.
+SHARDS_INDEX = "scion-shards"
+NETWORKS_PROJECT = "scion-net"
 SCION_TESTING_DOCKER_ASSERTIONS_OFF = 'SCION_TESTING_DOCKER_ASSERTIONS_OFF'
 
 
@@ -47,6 +53,11 @@ def container_ip(container_name: str) -> str:
 
 
 class Compose(object):
+    """Runs docker compose for the scion project.
+
+    For a topology generated with --compose-shards, the commands are run
+    concurrently for the projects of the ISDs, like tools/dc does.
+    """
 
     def __init__(self,
                  project: str = DC_PROJECT,
@@ -56,34 +67,121 @@ class Compose(object):
 
     def __call__(self, *args, **kwargs) -> str:
         """Runs docker compose with the given arguments"""
-        with redirect_stderr(sys.stdout):
-            return cmd.docker_compose("-f", self.compose_file, "-p", self.project, *args, **kwargs)
+        shards = self._shards()
+        if shards is None:
+            return self._run(self.compose_file, self.project, *args, **kwargs)
+        if args and args[0] in ("up", "run"):
+            # The networks project is only created.
+            self._run_project(NETWORKS_PROJECT, "up", "--no-start")
+        owners = {}
+        for project, services in shards.items():
+            for svc in services:
+                owners.setdefault(svc, set()).add(project)
+        selected = set().union(*(owners.get(a, set()) for a in args)) or set(shards)
+        calls = []
+        for project in shards:
+            if project not in selected:
+                continue
+            p_args = [a for a in args if a not in owners or project in owners[a]]
+            calls.append((project, p_args))
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            futures = [pool.submit(self._run_project, project, *p_args, **kwargs)
+                       for project, p_args in calls]
+            out = "".join(f.result() for f in futures)
+        if args and args[0] == "down":
+            out += self._run_project(NETWORKS_PROJECT, "down")
+        return out
+
+    def await_healthy(self, timeout: float = 120):
+        """Waits until the services that have a healthcheck are healthy.
+
+        Raises:
+            UnhealthyServiceError: A service is unhealthy, or still starting
+                after the timeout.
+        """
+        deadline = time.time() + timeout
+        while True:
+            health = self._health()
+            unhealthy = sorted(c for c, h in health.items() if h == "unhealthy")
+            if unhealthy:
+                raise UnhealthyServiceError("Unhealthy: %s" % unhealthy)
+            starting = sorted(c for c, h in health.items() if h == "starting")
+            if not starting:
+                return
+            if time.time() > deadline:
+                raise UnhealthyServiceError("Not healthy after %ss: %s" % (timeout, starting))
+            time.sleep(1)
 
     def collect_logs(self, out_dir: str = "logs/docker"):
         """Collects the logs from the services into the given directory"""
         out_p = plumbum.local.path(out_dir)
         cmd.mkdir("-p", out_p)
-        for svc in self("config", "--services").splitlines():
-            # Collect logs.
-            dst_f = out_p / "%s.log" % svc
-            with open(dst_f, "w") as log_file:
-                cmd.docker.run(args=("logs", svc), stdout=log_file,
-                               stderr=subprocess.STDOUT, retcode=None)
-            # Collect coredupms.
-            coredump_f = out_p / "%s.coredump" % svc
-            try:
-                cmd.docker.run(args=("cp", svc+":/share/coredump", coredump_f))
-            except Exception:
-                # If the coredump does not exist, do nothing.
-                pass
-            # Collect tshark traces.
-            try:
-                cmd.docker.run(args=("cp", svc+":/share/tshark", out_p))
-                cmd.mv(out_p / "tshark" // "*", out_p)
-                cmd.rmdir(out_p / "tshark")
-            except Exception:
-                # If there are no tshark captures, do nothing.
-                pass
+        services = sorted(set(self("config", "--services").splitlines()))
+        if self._shards() is None:
+            for svc in services:
+                self._collect_svc_logs(svc, out_p)
+            return
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for f in [pool.submit(self._collect_svc_logs, svc, out_p) for svc in services]:
+                f.result()
+
+    def _collect_svc_logs(self, svc: str, out_p):
+        # Collect logs.
+        dst_f = out_p / "%s.log" % svc
+        with open(dst_f, "w") as log_file:
+            cmd.docker.run(args=("logs", svc), stdout=log_file,
+                           stderr=subprocess.STDOUT, retcode=None)
+        # Collect coredupms.
+        coredump_f = out_p / "%s.coredump" % svc
+        try:
+            cmd.docker.run(args=("cp", svc+":/share/coredump", coredump_f))
+        except Exception:
+            # If the coredump does not exist, do nothing.
+            pass
+        # Collect tshark traces.
+        try:
+            cmd.docker.run(args=("cp", svc+":/share/tshark", out_p))
+            cmd.mv(out_p / "tshark" // "*", out_p)
+            cmd.rmdir(out_p / "tshark")
+        except Exception:
+            # If there are no tshark captures, do nothing.
+            pass
+
+    def _health(self) -> Dict[str, str]:
+        """Returns the health status of the containers by name, the status is
+        empty for containers without a healthcheck."""
+        ids = self("ps", "-q").split()
+        if not ids:
+            return {}
+        out = cmd.docker("inspect", "-f", "{{.Name}} {{if .State.Health}}"
+                         "{{.State.Health.Status}}{{end}}", *ids)
+        health = {}
+        for line in out.splitlines():
+            name, _, status = line.partition(" ")
+            health[name.lstrip("/")] = status.strip()
+        return health
+
+    def _shards(self) -> Optional[Dict[str, List[str]]]:
+        """Returns the services of the ISD projects in index order, or None if
+        the topology is not sharded."""
+        index = os.path.join(os.path.dirname(str(self.compose_file)), SHARDS_INDEX)
+        if not os.path.exists(index):
+            return None
+        shards = {}
+        with open(index) as f:
+            for line in f:
+                project, *services = line.split()
+                shards[project] = services
+        return shards
+
+    def _run_project(self, project: str, *args, **kwargs) -> str:
+        gen_dir = os.path.dirname(str(self.compose_file))
+        return self._run(os.path.join(gen_dir, "%s-dc.yml" % project), project,
+                         *args, **kwargs)
+
+    def _run(self, compose_file: str, project: str, *args, **kwargs) -> str:
+        with redirect_stderr(sys.stdout):
+            return cmd.docker_compose("-f", compose_file, "-p", project, *args, **kwargs)
 
 
 class _Network(NamedTuple):
@@ -96,6 +194,10 @@ class UnexpectedNetworkError(Exception):
     pass
 
 
+class UnhealthyServiceError(Exception):
+    pass
+
+
 def assert_no_networks(writer=None):
     """Raises an exception if unexpected docker networks are found.
 
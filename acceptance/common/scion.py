@@ -19,13 +19,13 @@ from typing import Any, Dict, List, MutableMapping
 
 import toml
 from plumbum import local
-import yaml
 from plumbum.cmd import docker
 from plumbum.path.local import LocalPath
 
 from acceptance.common.log import LogExec
 from python.lib import scion_addr
 from python.lib.scion_addr import ISD_AS
+from python.lib.util import load_yaml_file
 
 logger = logging.getLogger(__name__)
 
@@ -183,8 +183,7 @@ class ASList(object):
 
     @staticmethod
     def load(file: str = "gen/as_list.yml") -> "ASList":
-        with open(file, "r") as content:
-            data = yaml.load(content, yaml.Loader)
+        data = load_yaml_file(file)
         cores = [scion_addr.ISD_AS(raw) for raw in data["Core"]]
         non_cores = [scion_addr.ISD_AS(raw) for raw in data["Non-core"]]
         return ASList(cores, non_cores)
@@ -51,7 +51,7 @@ class Test(base.TestBase):
         if not self.nested_command:
             try:
                 self.setup()
-                time.sleep(20)
+                self.await_healthy()
                 self._run()
             finally:
                 self.teardown()
@@ -158,10 +158,20 @@ class Test(base.TestBase):
         self._showpaths_run(destination, source, retcode)
 
     def _showpaths_run(self, source_as: str, destination_as: str, retcode: int):
-        print(cmd.docker("exec", "-t", self._testers[source_as], "scion",
-                         "sp", self._ases[destination_as],
-                         "--timeout", "2s",
-                         retcode=retcode))
+        # The services are healthy, but the paths are only available once the
+        # beacons are propagated.
+        deadline = time.time() + 30
+        while True:
+            rc, out, _ = cmd.docker.run(("exec", "-t", self._testers[source_as], "scion",
+                                         "sp", self._ases[destination_as],
+                                         "--timeout", "2s"), retcode=None)
+            if rc == retcode or time.time() > deadline:
+                break
+            time.sleep(1)
+        print(out)
+        if rc != retcode:
+            raise Exception("showpaths %s -> %s: exit code %d, expected %d" %
+                            (source_as, destination_as, rc, retcode))
 
 
 def configuration_server(server):
@@ -36,7 +36,7 @@ class Test(base.TestBase):
         if not self.nested_command:
             try:
                 self.setup()
-                time.sleep(20)
+                self.await_healthy()
                 self._run()
             finally:
                 self.teardown()
@@ -45,7 +45,18 @@ class Test(base.TestBase):
         ping_test = plumbum.local[self.gateway_acceptance]
 
         print("Running ping test")
-        print(ping_test("-d", "-outDir", self.test_state.artifacts))
+        # The services are healthy, but the gateways only get their sessions up
+        # once the beacons are propagated.
+        deadline = time.time() + 30
+        while True:
+            rc, out, err = ping_test.run(("-d", "-outDir", self.test_state.artifacts),
+                                         retcode=None)
+            print(out)
+            if rc == 0:
+                break
+            if time.time() > deadline:
+                raise Exception("Ping test failed:\n" + err)
+            time.sleep(1)
         print("Ping done")
 
 
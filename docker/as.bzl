@@ -0,0 +1,55 @@
+load("@rules_pkg//:pkg.bzl", "pkg_tar")
+load("@io_bazel_rules_docker//container:container.bzl", "container_image")
+load("@io_bazel_rules_docker//docker/package_managers:download_pkgs.bzl", "download_pkgs")
+load("@io_bazel_rules_docker//docker/package_managers:install_pkgs.bzl", "install_pkgs")
+
+# Builds the "as" image, which runs all services of an AS in one container
+# (topology generator option --pack-ases). as_init.sh adds the addresses of
+# the services and supervises them.
+def build_as_image():
+    download_pkgs(
+        name = "as_pkgs",
+        image_tar = "@debian10//image",
+        packages = [
+            "iproute2",
+            # For the healthcheck, see python/topology/docker.py.
+            "wget",
+        ],
+    )
+
+    install_pkgs(
+        name = "as_pkgs_image",
+        image_tar = "@debian10//image",
+        installables_tar = ":as_pkgs.tar",
+        installation_cleanup_commands = "rm -rf /var/lib/apt/lists/*",
+        output_image_name = "as_pkgs_image",
+    )
+
+    pkg_tar(
+        name = "as_app",
+        srcs = [
+            ":as_init.sh",
+            "//go/co",
+            "//go/cs",
+            "//go/daemon",
+            "//go/dispatcher",
+            "//go/posix-router",
+        ],
+        package_dir = "/app",
+        mode = "0755",
+    )
+
+    container_image(
+        name = "as",
+        repository = "scion",
+        base = ":as_pkgs_image.tar",
+        env = {"TZ": "UTC"},
+        tars = [
+            ":as_app",
+            "//licenses:licenses",
+        ],
+        layers = [":share_dirs_layer"],
+        workdir = "/share",
+        entrypoint = ["/app/as_init.sh"],
+        visibility = ["//visibility:public"],
+    )
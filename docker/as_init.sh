@@ -0,0 +1,65 @@
+#!/bin/bash
+# Init of the "as" image, which runs all services of an AS in one container
+# (topology generator option --pack-ases).
+#
+# SCION_ADDRS:    Secondary addresses as "ADDR/PREFIXLEN,PRIMARY", the address is
+#                 added to the interface that has the address PRIMARY.
+# SCION_SERVICES: Services as "BINARY:CONFIG", CONFIG is relative to /share/conf.
+#                 The first service is the dispatcher.
+# SCION_USER:     UID:GID the services run as.
+set -e
+
+DISP_DIR=/run/shm/dispatcher
+DISP_SOCK=$DISP_DIR/default.sock
+
+for entry in $SCION_ADDRS; do
+    addr=${entry%,*}
+    primary=${entry#*,}
+    dev=$(ip -o addr show | awk -v ip="$primary" '{split($4, a, "/")} a[1] == ip {print $2; exit}')
+    if [ -z "$dev" ]; then
+        echo "No interface with address $primary" >&2
+        exit 1
+    fi
+    flags=
+    # Duplicate address detection would delay the use of IPv6 addresses.
+    case $addr in *:*) flags=nodad ;; esac
+    ip addr add "$addr" dev "$dev" $flags
+done
+
+uid=${SCION_USER%:*}
+gid=${SCION_USER#*:}
+mkdir -p $DISP_DIR
+chown "$uid:$gid" $DISP_DIR
+
+pids=()
+stop() {
+    kill "${pids[@]}" 2>/dev/null || true
+    wait
+}
+trap 'stop; exit 0' TERM INT
+
+first=1
+for svc in $SCION_SERVICES; do
+    bin=${svc%%:*}
+    conf=${svc#*:}
+    setpriv --reuid="$uid" --regid="$gid" --clear-groups \
+        "/app/$bin" --config "/share/conf/$conf" &
+    pids+=($!)
+    if [ -n "$first" ]; then
+        first=
+        # The other services connect to the dispatcher on start.
+        for _ in $(seq 100); do
+            [ -S $DISP_SOCK ] && break
+            sleep 0.1
+        done
+    fi
+done
+echo "Started $SCION_SERVICES"
+
+# Stop the container as soon as one of the services exits.
+set +e
+wait -n
+status=$?
+echo "A service exited with status $status, stopping" >&2
+stop
+exit $status
@@ -16,6 +16,11 @@
 =======================================================
 """
 
+# Stdlib
+import re
+from array import array
+from typing import Dict, Iterable, List, Union
+
 # SCION
 from python.lib.errors import SCIONParseError
 
@@ -27,7 +32,12 @@ class ISD_AS:
     lower 48 bits.
     See formatting and allocations here:
     https://github.com/scionproto/scion/wiki/ISD-and-AS-numbering
+
+    Instances created from a string are interned per class and string, and must
+    not be modified. They hash and compare on their integer value, and cache
+    their string formats.
     """
+    __slots__ = ('_isd', '_as', '_int', '_str', '_as_str', '_file', '_as_file')
     ISD_BITS = 16
     MAX_ISD = (1 << ISD_BITS) - 1
     AS_BITS = 48
@@ -38,12 +48,40 @@ class ISD_AS:
     HEX_SEPARATOR = ":"
     HEX_FILE_SEPARATOR = "_"
     MAX_HEX_AS_PART = 0xffff
+    # Subclasses with additional per instance state must not be interned.
+    INTERN = True
+    _interned = {}
+
+    def __new__(cls, raw=None):
+        if not raw or not cls.INTERN:
+            return super().__new__(cls)
+        key = (cls, raw)
+        inst = ISD_AS._interned.get(key)
+        if inst is None:
+            inst = super().__new__(cls)
+            inst._init(raw)
+            inst = ISD_AS._interned.setdefault(key, inst)
+        return inst
 
     def __init__(self, raw=None):
+        if raw and self.INTERN:
+            # Initialized by __new__.
+            return
+        self._init(raw)
+
+    def _init(self, raw):
         self._isd = 0
         self._as = 0
         if raw:
             self._parse(raw)
+        self._reset()
+
+    def _reset(self):
+        """
+        Updates the integer value and clears the cached string formats.
+        """
+        self._int = (self._isd << self.AS_BITS) | (self._as & self.MAX_AS)
+        self._str = self._as_str = self._file = self._as_file = None
 
     def _parse(self, raw):
         """
@@ -103,11 +141,10 @@ class ISD_AS:
         """
         self._isd = raw >> self.AS_BITS
         self._as = raw & self.MAX_AS
+        self._reset()
 
     def int(self):
-        isd_as = self._isd << self.AS_BITS
-        isd_as |= self._as & self.MAX_AS
-        return isd_as
+        return self._int
 
     def any_as(self):  # pragma: no cover
         return self.from_values(self._isd, 0)
@@ -116,7 +153,9 @@ class ISD_AS:
         return self._isd == 0 and self._as == 0
 
     def __eq__(self, other):  # pragma: no cover
-        return self._isd == other._isd and self._as == other._as
+        if not isinstance(other, ISD_AS):
+            return NotImplemented
+        return self._int == other._int
 
     def isd_str(self):
         s = str(self._isd)
@@ -125,6 +164,17 @@ class ISD_AS:
         return s
 
     def as_str(self, sep=HEX_SEPARATOR):
+        if sep == self.HEX_SEPARATOR:
+            if self._as_str is None:
+                self._as_str = self._format_as(sep)
+            return self._as_str
+        if sep == self.HEX_FILE_SEPARATOR:
+            if self._as_file is None:
+                self._as_file = self._format_as(sep)
+            return self._as_file
+        return self._format_as(sep)
+
+    def _format_as(self, sep):
         dec_str = str(self._as)
         if self._as > self.MAX_AS:
             return "%s [Illegal AS: larger than %d]" % (dec_str, self.MAX_AS)
@@ -141,10 +191,16 @@ class ISD_AS:
         return self.as_str(self.HEX_FILE_SEPARATOR)
 
     def file_fmt(self):
-        return "%s-%s" % (self.isd_str(), self.as_file_fmt())
+        if self._file is None:
+            self._file = "%s-%s" % (self.isd_str(), self.as_file_fmt())
+        return self._file
 
     def __str__(self, as_sep=HEX_SEPARATOR):
-        return "%s-%s" % (self.isd_str(), self.as_str(as_sep))
+        if as_sep != self.HEX_SEPARATOR:
+            return "%s-%s" % (self.isd_str(), self.as_str(as_sep))
+        if self._str is None:
+            self._str = "%s-%s" % (self.isd_str(), self.as_str())
+        return self._str
 
     def __repr__(self):  # pragma: no cover
         return "ISD_AS(isd=%s, as=%s)" % (self._isd, self._as)
@@ -153,10 +209,132 @@ class ISD_AS:
         return self.LEN
 
     def __hash__(self):  # pragma: no cover
-        return hash(str(self))
+        return hash(self._int)
 
     @classmethod
     def parse_int(cls, raw: int):
         ia = ISD_AS()
         ia._parse_int(raw)
         return ia
+
+
+# The common ISD-AS string formats, parsed without creating ISD_AS objects. Anything else is parsed
+# by ISD_AS, which also reports the errors.
+_IA_RE = re.compile(r"([0-9]{1,5})-(?:([0-9]{1,10})|"
+                    r"([0-9a-fA-F]{1,4}):([0-9a-fA-F]{1,4}):([0-9a-fA-F]{1,4})|"
+                    r"([0-9a-fA-F]{1,4})_([0-9a-fA-F]{1,4})_([0-9a-fA-F]{1,4}))")
+
+
+def _parse_ia_int(raw: str) -> int:
+    m = _IA_RE.fullmatch(raw)
+    if m is not None:
+        isd_s, dec_s, h1, h2, h3, f1, f2, f3 = m.groups()
+        isd = int(isd_s)
+        if isd <= ISD_AS.MAX_ISD:
+            if dec_s is not None:
+                as_ = int(dec_s)
+                if as_ <= ISD_AS.MAX_BGP_AS:
+                    return isd << ISD_AS.AS_BITS | as_
+            else:
+                if h1 is None:
+                    h1, h2, h3 = f1, f2, f3
+                return isd << ISD_AS.AS_BITS | int(h1, 16) << 32 | int(h2, 16) << 16 | int(h3, 16)
+    return ISD_AS(raw).int()
+
+
+class ISDASArray:
+    """
+    Immutable sequence of ISD-AS values stored as a buffer of 64-bit unsigned ints, for tools that
+    handle thousands of ASes. Parsing, formatting, sorting, membership tests and ISD grouping work
+    on the integer values and do not create ISD_AS objects. Values sort numerically, i.e. by ISD
+    and then AS number.
+    """
+    __slots__ = ('_vals', '_set')
+    TYPECODE = 'Q'
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._vals = array(self.TYPECODE, values)
+        self._set = None
+
+    @classmethod
+    def parse(cls, raws: Iterable[str]) -> 'ISDASArray':
+        """
+        Parses ISD-AS strings in any format accepted by ISD_AS.
+
+        :raises SCIONParseError: if a string is not a valid ISD-AS.
+        """
+        return cls(_parse_ia_int(raw) for raw in raws)
+
+    @classmethod
+    def from_isd_as(cls, ias: Iterable[ISD_AS]) -> 'ISDASArray':
+        return cls(ia.int() for ia in ias)
+
+    def to_isd_as(self) -> List[ISD_AS]:
+        return [ISD_AS.parse_int(v) for v in self._vals]
+
+    def ints(self) -> array:
+        return array(self.TYPECODE, self._vals)
+
+    def isds(self) -> List[int]:
+        shift = ISD_AS.AS_BITS
+        return [v >> shift for v in self._vals]
+
+    def strs(self, sep: str = ISD_AS.HEX_SEPARATOR) -> List[str]:
+        """
+        Formats all values like ISD_AS.__str__ with the given AS separator.
+        """
+        shift, mask, max_bgp = ISD_AS.AS_BITS, ISD_AS.MAX_AS, ISD_AS.MAX_BGP_AS
+        fmt = "%d-%x" + sep + "%x" + sep + "%x"
+        return ["%d-%d" % (v >> shift, v & mask) if v & mask <= max_bgp else
+                fmt % (v >> shift, v >> 32 & 0xffff, v >> 16 & 0xffff, v & 0xffff)
+                for v in self._vals]
+
+    def file_fmts(self) -> List[str]:
+        return self.strs(ISD_AS.HEX_FILE_SEPARATOR)
+
+    def sorted(self) -> 'ISDASArray':
+        return ISDASArray(sorted(self._vals))
+
+    def group_by_isd(self) -> Dict[int, 'ISDASArray']:
+        """
+        Splits the values by ISD, keeping their order within each ISD.
+        """
+        shift = ISD_AS.AS_BITS
+        groups = {}
+        for v in self._vals:
+            vals = groups.get(v >> shift)
+            if vals is None:
+                vals = groups[v >> shift] = array(self.TYPECODE)
+            vals.append(v)
+        return {isd: ISDASArray(vals) for isd, vals in groups.items()}
+
+    def __contains__(self, item: Union[ISD_AS, int, str]):
+        if self._set is None:
+            self._set = frozenset(self._vals)
+        if isinstance(item, ISD_AS):
+            item = item.int()
+        elif isinstance(item, str):
+            try:
+                item = _parse_ia_int(item)
+            except SCIONParseError:
+                return False
+        return item in self._set
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ISDASArray(self._vals[index])
+        return ISD_AS.parse_int(self._vals[index])
+
+    def __iter__(self):
+        return map(ISD_AS.parse_int, self._vals)
+
+    def __len__(self):
+        return len(self._vals)
+
+    def __eq__(self, other):
+        if not isinstance(other, ISDASArray):
+            return NotImplemented
+        return self._vals == other._vals
+
+    def __repr__(self):  # pragma: no cover
+        return "ISDASArray(%s)" % self.strs()
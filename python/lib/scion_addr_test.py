@@ -0,0 +1,110 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`scion_addr_test` --- lib.scion_addr unit tests
+====================================================
+"""
+# Stdlib
+import pickle
+import unittest
+
+# SCION
+from python.lib.errors import SCIONParseError
+from python.lib.scion_addr import ISD_AS, ISDASArray
+
+
+class TestISD_AS(unittest.TestCase):
+    """
+    Unit tests for lib.scion_addr.ISD_AS
+    """
+    def test_parse(self):
+        for raw, want in (("1-ff00:0:110", (1, 0xff0000000110)),
+                          ("1-ff00_0_110", (1, 0xff0000000110)),
+                          ("65535-4294967295", (65535, 0xffffffff))):
+            with self.subTest(raw=raw):
+                ia = ISD_AS(raw)
+                self.assertEqual(ia.int(), want[0] << ISD_AS.AS_BITS | want[1])
+                self.assertEqual(ISD_AS.parse_int(ia.int()), ia)
+        for raw in ("1", "1-ff00:0", "65536-1", "1-4294967296", "x-1"):
+            with self.subTest(raw=raw):
+                with self.assertRaises(SCIONParseError):
+                    ISD_AS(raw)
+
+    def test_format(self):
+        ia = ISD_AS("1-ff00_0_110")
+        # Cached formats, repeated to return the cached values.
+        for _ in range(2):
+            self.assertEqual(str(ia), "1-ff00:0:110")
+            self.assertEqual(ia.file_fmt(), "1-ff00_0_110")
+            self.assertEqual(ia.as_str(), "ff00:0:110")
+        self.assertEqual(ia.__str__("."), "1-ff00.0.110")
+        self.assertEqual(str(ISD_AS.parse_int(ia.int())), "1-ff00:0:110")
+
+    def test_intern(self):
+        self.assertIs(ISD_AS("1-ff00:0:110"), ISD_AS("1-ff00:0:110"))
+        self.assertIsNot(ISD_AS(), ISD_AS())
+        a, b = ISD_AS("1-ff00:0:110"), ISD_AS("1-ff00_0_110")
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a, ISD_AS("1-ff00:0:111"))
+        self.assertNotEqual(a, "1-ff00:0:110")
+
+    def test_pickle(self):
+        ia = ISD_AS("1-ff00:0:110")
+        str(ia)
+        copy = pickle.loads(pickle.dumps(ia))
+        self.assertEqual(copy, ia)
+        self.assertEqual(copy.file_fmt(), ia.file_fmt())
+        self.assertEqual({ia: 1}[copy], 1)
+
+
+class TestISDASArray(unittest.TestCase):
+    """
+    Unit tests for lib.scion_addr.ISDASArray
+    """
+    RAWS = ["2-ff00:0:210", "1-ff00_0_110", "1-64512", "2-ABCD:1:0", "1-ff00:0:10f"]
+
+    def test_parse_format(self):
+        arr = ISDASArray.parse(self.RAWS)
+        ias = [ISD_AS(raw) for raw in self.RAWS]
+        self.assertEqual(len(arr), len(self.RAWS))
+        self.assertEqual(arr.to_isd_as(), ias)
+        self.assertEqual(list(arr), ias)
+        self.assertEqual(arr[1], ias[1])
+        self.assertEqual(arr.strs(), [str(ia) for ia in ias])
+        self.assertEqual(arr.file_fmts(), [ia.file_fmt() for ia in ias])
+        self.assertEqual(ISDASArray.from_isd_as(ias), arr)
+        self.assertEqual(arr[1:3], ISDASArray.parse(self.RAWS[1:3]))
+        for raw in ("1", "1-ff00:0", "65536-1", "1-4294967296", "1-ff00:0_1"):
+            with self.subTest(raw=raw):
+                with self.assertRaises(SCIONParseError):
+                    ISDASArray.parse(["1-1", raw])
+
+    def test_sort_contains_group(self):
+        arr = ISDASArray.parse(self.RAWS)
+        self.assertEqual(arr.sorted().strs(),
+                         ["1-64512", "1-ff00:0:10f", "1-ff00:0:110", "2-abcd:1:0", "2-ff00:0:210"])
+        self.assertIn("1-ff00:0:110", arr)
+        self.assertIn(ISD_AS("2-ff00:0:210"), arr)
+        self.assertIn(ISD_AS("1-64512").int(), arr)
+        self.assertNotIn("1-ff00:0:111", arr)
+        self.assertNotIn("garbage", arr)
+        groups = arr.group_by_isd()
+        self.assertEqual(list(groups), [2, 1])
+        self.assertEqual(groups[1].strs(), ["1-ff00:0:110", "1-64512", "1-ff00:0:10f"])
+        self.assertEqual(arr.isds(), [2, 1, 1, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
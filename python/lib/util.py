@@ -18,7 +18,13 @@
 Various utilities for SCION functionality.
 """
 # Stdlib
+import hashlib
+import logging
+import marshal
 import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # External packages
 import json
@@ -30,12 +36,22 @@ from python.lib.errors import (
     SCIONYAMLError,
 )
 
+# The libyaml based loader is much faster, and parses the same documents.
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+# Version of the YAML cache format, see load_yaml_file.
+_YAML_CACHE_VERSION = 1
+
+# The sink write_file hands its files to, if set. See WriteSink.
+_write_sink = None
+
 
 def write_file(file_path, text):
     """
     Write some text into a temporary file, creating its directory as needed, and
     then atomically move to target location.
 
+    If a WriteSink is active, the file is handed to it instead.
+
     :param str file_path: the path to the file.
     :param str text: the file content.
     :raises:
@@ -44,16 +60,29 @@ def write_file(file_path, text):
     # ":" is an illegal filename char on both windows and OSX, so disallow it globally to prevent
     # incompatibility.
     assert ":" not in file_path, file_path
-    dir_ = os.path.dirname(file_path)
+    if _write_sink is not None:
+        _write_sink.write(file_path, text)
+        return
+    _makedirs(os.path.dirname(file_path))
+    _write_atomic(file_path, text)
+
+
+def _makedirs(dir_):
     try:
         os.makedirs(dir_, exist_ok=True)
     except OSError as e:
         raise SCIONIOError("Error creating '%s' dir: %s" %
                            (dir_, e.strerror)) from None
+
+
+def _write_atomic(file_path, text, fsync=False):
     tmp_file = file_path + ".new"
     try:
         with open(tmp_file, 'w') as f:
             f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
     except OSError as e:
         raise SCIONIOError("Error creating/writing to temp file '%s': %s" %
                            (file_path, e.strerror)) from None
@@ -64,11 +93,168 @@ def write_file(file_path, text):
                            (tmp_file, file_path, e.strerror)) from None
 
 
-def load_yaml_file(file_path):
+class WriteSink(object):
+    """
+    Base class for sinks of write_file.
+
+    Used as a context manager, the sink receives all files passed to write_file
+    within the block. Sinks can be nested, forward() passes a file on to the
+    enclosing sink, or writes it if there is none.
+    """
+    _prev_sink = None
+
+    def write(self, file_path, text):
+        raise NotImplementedError
+
+    def forward(self, file_path, text):
+        if self._prev_sink is not None:
+            self._prev_sink.write(file_path, text)
+            return
+        _makedirs(os.path.dirname(file_path))
+        _write_atomic(file_path, text)
+
+    def close(self):
+        """
+        Called when the block is left without an error.
+        """
+
+    def abort(self):
+        """
+        Called when the block is left with an error.
+        """
+
+    def __enter__(self):
+        global _write_sink
+        self._prev_sink, _write_sink = _write_sink, self
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        global _write_sink
+        _write_sink = self._prev_sink
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class BatchWriter(WriteSink):
+    """
+    Writes the files passed to write_file from a thread pool.
+
+    Used as a context manager, which installs the writer as the sink of
+    write_file, and waits for all queued files to be written on exit. Every
+    file is still written to a temporary file and atomically moved into place.
+    Writes to the same path are applied in order, and created directories are
+    cached. With fsync, every file is synced before it is moved into place, and
+    the directories are synced once all files are written.
+
+    Example:
+        with BatchWriter(workers=8):
+            write_file("gen/a.toml", text)
+    """
+    def __init__(self, workers=4, fsync=False):
+        """
+        :param int workers: Number of writer threads. With 0, files are written
+            synchronously.
+        :param bool fsync: Sync files and directories to disk.
+        """
+        self.fsync = fsync
+        self._pool = ThreadPoolExecutor(workers) if workers > 0 else None
+        self._lock = threading.Lock()
+        self._dirs = set()
+        self._pending = {}
+        self._futures = []
+
+    def write(self, file_path, text):
+        """
+        Queues the text to be written to file_path.
+
+        :raises:
+            lib.errors.SCIONIOError: IO error occurred (only without workers)
+        """
+        if self._pool is None:
+            self._write(file_path, text, None)
+            return
+        with self._lock:
+            prev = self._pending.get(file_path)
+            fut = self._pool.submit(self._write, file_path, text, prev)
+            self._pending[file_path] = fut
+            self._futures.append(fut)
+
+    def _write(self, file_path, text, prev):
+        if prev is not None:
+            # Earlier writes to the same path go first. They were submitted
+            # earlier, so they are already running.
+            prev.exception()
+        dir_ = os.path.dirname(file_path)
+        if dir_ not in self._dirs:
+            _makedirs(dir_)
+            with self._lock:
+                self._dirs.add(dir_)
+        _write_atomic(file_path, text, self.fsync)
+
+    def flush(self):
+        """
+        Waits until all queued files are written.
+
+        :raises:
+            lib.errors.SCIONIOError: IO error occurred while writing any of the files.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+            self._pending = {}
+        err = None
+        for fut in futures:
+            e = fut.exception()
+            if e is not None and err is None:
+                err = e
+        if err is not None:
+            raise err
+        if self.fsync:
+            self._sync_dirs()
+
+    def _sync_dirs(self):
+        for dir_ in sorted(self._dirs):
+            try:
+                fd = os.open(dir_ or '.', os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                raise SCIONIOError("Error syncing '%s' dir: %s" %
+                                   (dir_, e.strerror)) from None
+
+    def close(self):
+        """
+        Waits until all queued files are written, and stops the writer threads.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def abort(self):
+        # Don't mask the original error with follow-up write errors.
+        try:
+            self.close()
+        except SCIONIOError:
+            pass
+
+
+def load_yaml_file(file_path, cache=False):
     """
     Read and parse a YAML config file.
 
+    With cache, the parsed data is cached in a marshal file next to the YAML
+    file (see yaml_cache_path). The cache is used if the path, mtime and size
+    of the file are unchanged, or if its content hash is unchanged. If the cache
+    cannot be written, e.g. in a read-only directory, the file is parsed on
+    every call.
+
     :param str file_path: the path to the file.
+    :param bool cache: use the parsed data cache.
     :returns: YAML data
     :rtype: dict
     :raises:
@@ -76,16 +262,75 @@ def load_yaml_file(file_path):
         lib.errors.SCIONYAMLError: error parsing file.
     """
     try:
-        with open(file_path) as f:
-            return yaml.load(f, Loader=yaml.SafeLoader)
+        with open(file_path, 'rb') as f:
+            if not cache:
+                return _parse_yaml(f, file_path)
+            st = os.fstat(f.fileno())
+            stat_key = [os.path.abspath(file_path), st.st_mtime_ns, st.st_size]
+            entry = _read_yaml_cache(file_path)
+            if entry and entry['stat'] == stat_key:
+                return entry['data']
+            raw = f.read()
     except OSError as e:
         raise SCIONIOError("Error opening '%s': %s" %
                            (file_path, e.strerror)) from None
+    digest = hashlib.sha256(raw).hexdigest()
+    if entry and entry['sha256'] == digest:
+        data = entry['data']
+    else:
+        data = _parse_yaml(raw, file_path)
+    _write_yaml_cache(file_path, {'version': _YAML_CACHE_VERSION, 'stat': stat_key,
+                                  'sha256': digest, 'data': data})
+    return data
+
+
+def yaml_cache_path(file_path):
+    """
+    Returns the path of the parsed data cache of a YAML file.
+    """
+    head, tail = os.path.split(file_path)
+    return os.path.join(head, '.%s.cache' % tail)
+
+
+def _parse_yaml(stream, file_path):
+    try:
+        return yaml.load(stream, Loader=_YAML_LOADER)
     except (yaml.scanner.ScannerError) as e:
         raise SCIONYAMLError("Error parsing '%s': %s" %
                              (file_path, e)) from None
 
 
+def _read_yaml_cache(file_path):
+    try:
+        with open(yaml_cache_path(file_path), 'rb') as f:
+            entry = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != _YAML_CACHE_VERSION:
+        return None
+    return entry
+
+
+def _write_yaml_cache(file_path, entry):
+    """
+    Writes the cache atomically. Failures are ignored, the cache is optional.
+    """
+    path = yaml_cache_path(file_path)
+    try:
+        # Values that marshal does not support, like dates, raise ValueError.
+        raw = marshal.dumps(entry)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=".yaml-cache.")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+            os.rename(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    except (OSError, ValueError) as e:
+        logging.debug("Not caching '%s': %s", file_path, e)
+
+
 def load_sciond_file(file_path):
     """
     Read a SCIOND addresses file.
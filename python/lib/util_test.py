@@ -17,6 +17,8 @@
 """
 # Stdlib
 import builtins
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open
 
@@ -29,8 +31,10 @@ from python.lib.errors import (
     SCIONYAMLError,
 )
 from python.lib.util import (
+    BatchWriter,
     load_yaml_file,
     write_file,
+    yaml_cache_path,
 )
 
 
@@ -78,6 +82,46 @@ class TestWriteFile(unittest.TestCase):
             write_file("File_Path", "Text")
 
 
+class TestBatchWriter(unittest.TestCase):
+    """
+    Unit tests for lib.util.BatchWriter
+    """
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_write(self):
+        for workers, fsync in ((0, False), (4, False), (4, True)):
+            with self.subTest(workers=workers, fsync=fsync), \
+                    tempfile.TemporaryDirectory() as tmp:
+                with BatchWriter(workers, fsync):
+                    for i in range(50):
+                        write_file(os.path.join(tmp, "d%d" % (i % 5), "f%d" % i), str(i))
+                    for i in range(20):
+                        write_file(os.path.join(tmp, "same"), str(i))
+                self.assertEqual(self._read(os.path.join(tmp, "d3", "f13")), "13")
+                self.assertEqual(self._read(os.path.join(tmp, "same")), "19")
+                self.assertEqual(len(os.listdir(tmp)), 6)
+
+    def test_sink_restored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "f")
+            with BatchWriter(2):
+                pass
+            with patch("python.lib.util.BatchWriter.write", autospec=True) as write:
+                write_file(path, "Text")
+                write.assert_not_called()
+            self.assertEqual(self._read(path), "Text")
+
+    def test_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # A file where the directory should go
+            write_file(os.path.join(tmp, "d"), "")
+            with self.assertRaises(SCIONIOError):
+                with BatchWriter(2):
+                    write_file(os.path.join(tmp, "d", "f"), "Text")
+
+
 class TestLoadYAMLFile(unittest.TestCase):
     """
     Unit tests for lib.util.load_yaml_file
@@ -95,6 +139,24 @@ class TestLoadYAMLFile(unittest.TestCase):
             with self.assertRaises(SCIONYAMLError):
                 load_yaml_file("File_Path")
 
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "x.topo")
+            with open(path, "w") as f:
+                f.write("ASes: {1-ff00:0:110: {core: true}}\n")
+            self.assertEqual(load_yaml_file(path, cache=True),
+                             {"ASes": {"1-ff00:0:110": {"core": True}}})
+            self.assertTrue(os.path.exists(yaml_cache_path(path)))
+            # A touched file with the same content is not parsed again.
+            os.utime(path, (0, 0))
+            with patch("python.lib.util.yaml.load", autospec=True) as loader:
+                load_yaml_file(path, cache=True)
+                load_yaml_file(path, cache=True)
+                loader.assert_not_called()
+            with open(path, "w") as f:
+                f.write("ASes: {}\n")
+            self.assertEqual(load_yaml_file(path, cache=True), {"ASes": {}})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# Copyright 2022 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`benchmark` --- SCION topology generator benchmark
+=======================================================
+
+Generates synthetic topologies of increasing size and runs the topology
+generator on them, recording wall time, peak RSS and the files written by every
+generator stage, as well as the utilization of the address space. Every case
+runs in a fresh interpreter, so that the RSS high-water marks of the cases do
+not influence each other.
+
+Example:
+    PYTHONPATH=. python/topology/benchmark.py --sizes 100,1000 -o bench.json
+
+The speedup of the serialization backends on scaled up copies of wide.topo:
+    PYTHONPATH=. python/topology/benchmark.py --kinds wide --sizes 500 --no-certs \
+        --topogen-args="--serializer pure" -o pure.json
+    PYTHONPATH=. python/topology/benchmark.py --kinds wide --sizes 500 --no-certs \
+        --baseline pure.json
+
+The startup time of topogen, failing if it exceeds the budget:
+    PYTHONPATH=. python/topology/benchmark.py --import-time --import-budget 150
+"""
+# Stdlib
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# External packages
+import yaml
+
+DEFAULT_SIZES = "100,1000"
+DEFAULT_KINDS = "tree,mesh,peering"
+DEFAULT_SEED = 1
+# Module whose import time --import-time measures, and its default budget.
+IMPORT_MODULE = "python.topology.generator"
+DEFAULT_IMPORT_BUDGET_MS = 150
+IMPORT_RUNS = 5
+
+# ConfigGenerator methods that are timed, and the generator they run.
+STAGES = (
+    ("_generate_topology", "TopoGenerator"),
+    ("_generate_go", "GoGenerator"),
+    ("_generate_docker", "DockerGenerator"),
+    ("_generate_supervisor", "SupervisorGenerator"),
+    ("_generate_jaeger", "JaegerGenerator"),
+    ("_generate_prom_conf", "PrometheusGenerator"),
+    ("_generate_certs_trcs", "CertGenerator"),
+)
+
+WIDE_TOPO = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "..", "..", "topology", "wide.topo")
+
+CORE_ATTRS = {"core": True, "voting": True, "authoritative": True, "issuing": True}
+
+
+class SyntheticTopo(object):
+    """
+    Builds a .topo config with a given number of ASes spread over a number of ISDs.
+    """
+
+    def __init__(self, seed, isds, cores_per_isd):
+        self.rand = random.Random(seed)
+        self.isds = isds
+        self.cores_per_isd = cores_per_isd
+        self.ases = {}
+        self.links = []
+        self.cores = {isd: [] for isd in range(1, isds + 1)}
+        self.non_cores = {isd: [] for isd in range(1, isds + 1)}
+        self._next_as = 0x100
+
+    def add_as(self, isd, core, voting=True):
+        ia = "%d-ff00:0:%x" % (isd, self._next_as)
+        self._next_as += 1
+        if core:
+            attrs = dict(CORE_ATTRS) if voting else {"core": True, "issuing": True}
+            self.cores[isd].append(ia)
+        else:
+            attrs = {"cert_issuer": self.cores[isd][0]}
+            self.non_cores[isd].append(ia)
+        self.ases[ia] = attrs
+        return ia
+
+    def add_link(self, a, b, link_type):
+        self.links.append({"a": a, "b": b, "linkAtoB": link_type})
+
+    def add_core_backbone(self):
+        """
+        Creates the core ASes of every ISD, connects them with a full mesh inside
+        the ISD and connects the ISDs with a ring of core links.
+        """
+        for isd in self.cores:
+            for _ in range(self.cores_per_isd):
+                self.add_as(isd, core=True)
+            cores = self.cores[isd]
+            for i, a in enumerate(cores):
+                for b in cores[i + 1:]:
+                    self.add_link(a, b, "CORE")
+        isds = sorted(self.cores)
+        ring = list(zip(isds, isds[1:]))
+        if len(isds) > 2:
+            ring.append((isds[-1], isds[0]))
+        for a, b in ring:
+            self.add_link(self.cores[a][0], self.cores[b][0], "CORE")
+
+    def add_children(self, count):
+        """
+        Attaches count non-core ASes as children of a random core or earlier
+        non-core AS of the same ISD.
+        """
+        isds = sorted(self.cores)
+        for i in range(count):
+            isd = isds[i % len(isds)]
+            parent = self.rand.choice(self.cores[isd] + self.non_cores[isd])
+            child = self.add_as(isd, core=False)
+            self.add_link(parent, child, "CHILD")
+
+    def add_peerings(self, per_as):
+        """
+        Adds per_as peering links from every non-core AS to random other non-core ASes.
+        """
+        non_cores = [ia for isd in sorted(self.non_cores) for ia in self.non_cores[isd]]
+        if len(non_cores) < 2:
+            return
+        seen = set()
+        for a in non_cores:
+            for _ in range(per_as):
+                b = self.rand.choice(non_cores)
+                key = tuple(sorted((a, b)))
+                if a == b or key in seen:
+                    continue
+                seen.add(key)
+                self.add_link(a, b, "PEER")
+
+    def config(self):
+        return {"ASes": self.ases, "links": self.links}
+
+
+def tree_topo(size, seed=DEFAULT_SEED):
+    """
+    A core backbone per ISD with a random tree of non-core ASes below it.
+    """
+    isds = max(1, min(16, size // 250))
+    topo = SyntheticTopo(seed, isds, cores_per_isd=3)
+    topo.add_core_backbone()
+    topo.add_children(max(0, size - len(topo.ases)))
+    return topo.config()
+
+
+def mesh_topo(size, seed=DEFAULT_SEED, degree=2):
+    """
+    A scale-free mesh of core ASes, built by preferential attachment. Only the
+    first few core ASes of every ISD are voting ASes.
+    """
+    isds = max(1, min(16, size // 500))
+    topo = SyntheticTopo(seed, isds, cores_per_isd=3)
+    topo.add_core_backbone()
+    isd_list = sorted(topo.cores)
+    # Every link endpoint is appended once, so that choosing uniformly from the
+    # list picks ASes proportional to their degree.
+    endpoints = [ia for link in topo.links for ia in (link["a"], link["b"])]
+    for i in range(max(0, size - len(topo.ases))):
+        isd = isd_list[i % len(isd_list)]
+        new = topo.add_as(isd, core=True, voting=False)
+        targets = set()
+        while len(targets) < min(degree, len(endpoints)):
+            targets.add(topo.rand.choice(endpoints))
+        for target in sorted(targets):
+            topo.add_link(target, new, "CORE")
+            endpoints.extend((target, new))
+    return topo.config()
+
+
+def peering_topo(size, seed=DEFAULT_SEED, peers_per_as=4):
+    """
+    A tree topology where every non-core AS additionally peers with a number of
+    random other non-core ASes.
+    """
+    isds = max(1, min(16, size // 250))
+    topo = SyntheticTopo(seed, isds, cores_per_isd=3)
+    topo.add_core_backbone()
+    topo.add_children(max(0, size - len(topo.ases)))
+    topo.add_peerings(peers_per_as)
+    return topo.config()
+
+
+def wide_topo(size, seed=DEFAULT_SEED):
+    """
+    Copies of topology/wide.topo, with the copy number in the second AS number
+    group. The first core AS of every copy is linked to that of the first copy.
+    """
+    with open(WIDE_TOPO) as f:
+        base = yaml.safe_load(f)
+    first = next(iter(base["ASes"]))
+    ases, links = {}, []
+    for copy in range(max(1, round(size / len(base["ASes"])))):
+        def rename(ia):
+            isd, as_ = ia.split("-")
+            parts = as_.split(":")
+            return "%s-%s:%x:%s" % (isd, parts[0], copy, parts[2])
+        for ia, attrs in base["ASes"].items():
+            attrs = dict(attrs)
+            if "cert_issuer" in attrs:
+                attrs["cert_issuer"] = rename(attrs["cert_issuer"])
+            ases[rename(ia)] = attrs
+        for link in base["links"]:
+            links.append(dict(link, a=rename(link["a"]), b=rename(link["b"])))
+        if copy:
+            links.append({"a": first, "b": rename(first), "linkAtoB": "CORE"})
+    return {"ASes": ases, "links": links}
+
+
+TOPO_KINDS = {
+    "tree": tree_topo,
+    "mesh": mesh_topo,
+    "peering": peering_topo,
+    "wide": wide_topo,
+}
+
+
+class StageRecorder(object):
+    """
+    Wraps the stage methods of a ConfigGenerator instance and records the wall
+    time, the peak RSS and the files written for every stage.
+
+    On Linux, the RSS high-water mark is reset before every stage, so that the
+    peak RSS of a stage is its own. The reset also applies to ru_maxrss, so the
+    recorder keeps the peak of the whole run (peak_kib) itself.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.stages = {}
+        self.peak_kib = peak_rss_kib()
+
+    def instrument(self, confgen, skip=()):
+        for method, name in STAGES:
+            if name in skip:
+                setattr(confgen, method, self._skipped(name))
+            else:
+                setattr(confgen, method, self.wrap(name, getattr(confgen, method)))
+
+    def wrap(self, name, f):
+        def wrapper(*args, **kwargs):
+            return self.run(name, f, *args, **kwargs)
+        return wrapper
+
+    def run(self, name, f, *args, **kwargs):
+        files_before, bytes_before = count_files(self.output_dir)
+        self.peak_kib = max(self.peak_kib, peak_rss_kib())
+        reset = reset_peak_rss()
+        rss_before = peak_rss_kib()
+        children_before = peak_rss_kib(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        ret = f(*args, **kwargs)
+        wall = time.perf_counter() - start
+        rss_after = peak_rss_kib()
+        self.peak_kib = max(self.peak_kib, rss_after)
+        files_after, bytes_after = count_files(self.output_dir)
+        self.stages[name] = {
+            "wall_s": round(wall, 4),
+            # Without the reset, the high-water mark of the process is only
+            # attributable through its growth.
+            "peak_rss_kib": rss_after if reset else None,
+            "rss_growth_kib": max(0, rss_after - rss_before),
+            "children_rss_growth_kib": max(
+                0, peak_rss_kib(resource.RUSAGE_CHILDREN) - children_before),
+            "files": files_after - files_before,
+            "bytes": bytes_after - bytes_before,
+        }
+        return ret
+
+    def _skipped(self, name):
+        def skipped(*args, **kwargs):
+            self.stages[name] = {"skipped": True}
+        return skipped
+
+
+def count_files(path):
+    """
+    Returns the number and total size of the files below path.
+    """
+    count, size = 0, 0
+    for dirpath, _, filenames in os.walk(path):
+        for f in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, f)).st_size
+            except OSError:
+                continue
+            count += 1
+    return count, size
+
+
+def peak_rss_kib(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss
+
+
+def reset_peak_rss():
+    """
+    Resets the RSS high-water mark of the process, which is only supported on
+    Linux.
+
+    :returns: Whether the high-water mark was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def run_case(kind, size, opts):
+    """
+    Generates the synthetic topology and runs the topology generator on it.
+    Meant to be run in a fresh process.
+    """
+    # Imported here, so that the import cost is attributed to the case.
+    from python.topology import generator
+    from python.topology.config import ConfigGenArgs, ConfigGenerator
+
+    random.seed(opts["seed"])
+    workdir = tempfile.mkdtemp(prefix="topogen-bench.")
+    try:
+        topo_config = TOPO_KINDS[kind](size, seed=opts["seed"])
+        topo_file = os.path.join(workdir, "%s-%d.topo" % (kind, size))
+        with open(topo_file, "w") as f:
+            yaml.dump(topo_config, f, default_flow_style=False)
+        output_dir = os.path.join(workdir, "gen")
+        # The stages run one after another, so that their time and resource
+        # usage can be attributed. --topogen-args can override this.
+        raw = ["-c", topo_file, "-o", output_dir, "--stage-workers", "1"] + opts["topogen_args"]
+        parser = generator.add_arguments(argparse.ArgumentParser())
+        raw_args = parser.parse_args(raw)
+        generator.init_features(raw_args)
+
+        recorder = StageRecorder(output_dir)
+        start = time.perf_counter()
+        try:
+            confgen = recorder.run("load", ConfigGenerator, ConfigGenArgs(raw_args))
+            recorder.instrument(confgen, skip=opts["skip"])
+            confgen.generate_all()
+        except SystemExit as e:
+            # The generator exits on fatal errors (e.g. an exhausted address
+            # space), which would otherwise kill the pool worker.
+            raise RuntimeError("topogen exited with status %s" % e.code) from None
+        total = time.perf_counter() - start
+        files, size_bytes = count_files(output_dir)
+        return {
+            "kind": kind,
+            "size": size,
+            "ases": len(topo_config["ASes"]),
+            "links": len(topo_config["links"]),
+            "stages": recorder.stages,
+            "subnets": {
+                "ipv4": confgen.subnet_gen4.utilization(),
+                "ipv6": confgen.subnet_gen6.utilization(),
+            },
+            "total": {
+                "wall_s": round(total, 4),
+                "peak_rss_kib": max(recorder.peak_kib, peak_rss_kib()),
+                "files": files,
+                "bytes": size_bytes,
+            },
+        }
+    finally:
+        if opts["keep"]:
+            print("Kept output in %s" % workdir, file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_cases(kinds, sizes, opts):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        for kind in kinds:
+            # Not a multiprocessing.Pool, as its daemonic workers cannot
+            # start the worker processes of topogen --jobs.
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                try:
+                    res = pool.submit(run_case, kind, size, opts).result()
+                except Exception as e:
+                    # Record the failure, e.g. an exhausted address or port
+                    # space, and continue with the remaining cases.
+                    res = {"kind": kind, "size": size, "error": "%s: %s" % (
+                        type(e).__name__, e), "stages": {}}
+                    print("%-8s %6d ASes failed: %s" % (kind, size, res["error"]))
+                    results.append(res)
+                    continue
+            print("%-8s %6d ASes %7d links: %8.2fs %8d KiB peak RSS %7d files" % (
+                kind, res["ases"], res["links"], res["total"]["wall_s"],
+                res["total"]["peak_rss_kib"], res["total"]["files"]))
+            results.append(res)
+    return results
+
+
+def measure_import(module=IMPORT_MODULE, runs=IMPORT_RUNS):
+    """
+    Measures the time to import module in fresh interpreters, with -X importtime.
+
+    :returns: The minimum over the runs of the total import time in ms, and the
+        cumulative import times in ms of the modules imported in the fastest run.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    best, best_modules = None, {}
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                              env=env, stderr=subprocess.PIPE, universal_newlines=True,
+                              check=True)
+        modules = {}
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = line.split("|")
+            if not line.startswith("import time:") or not parts[1].strip().isdigit():
+                continue
+            modules[parts[2].strip()] = int(parts[1]) / 1000
+        total = modules[module]
+        if best is None or total < best:
+            best, best_modules = total, modules
+    return round(best, 2), best_modules
+
+
+def run_import_time(budget_ms, baseline, tolerance):
+    """
+    :returns: The results, and a list of human readable budget violations and regressions.
+    """
+    total, modules = measure_import()
+    top = sorted(modules.items(), key=lambda m: m[1], reverse=True)[:20]
+    print("import %s: %.1f ms (budget %.1f ms)" % (IMPORT_MODULE, total, budget_ms))
+    for name, ms in top[1:11]:
+        print("  %8.1f ms %s" % (ms, name))
+    res = {"module": IMPORT_MODULE, "ms": total, "budget_ms": budget_ms,
+           "modules": dict(top)}
+    regressions = []
+    if total > budget_ms:
+        regressions.append("import %s: %.1f ms exceeds the budget of %.1f ms" % (
+            IMPORT_MODULE, total, budget_ms))
+    old = (baseline or {}).get("import")
+    if old and total > old["ms"] * (1 + tolerance) + 5:
+        regressions.append("import %s: %.1f ms -> %.1f ms" % (IMPORT_MODULE, old["ms"], total))
+    return res, regressions
+
+
+# The metrics of a stage that compare checks: the key, the absolute slack on top
+# of the relative tolerance, whether the tolerance applies, and the format.
+COMPARED_METRICS = (
+    ("wall_s", 0.05, True, "%.2fs"),
+    ("peak_rss_kib", 10 * 1024, True, "%d KiB"),
+    ("files", 0, False, "%d files"),
+)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the wall time, the peak RSS and the number of files written of
+    every stage, and the peak RSS of every case, against the baseline results.
+    A value regresses if it exceeds the baseline value by more than the
+    relative tolerance and a small absolute slack. The number of files must
+    not grow at all.
+
+    :returns: A list of human readable regression descriptions.
+    """
+    base = {(c["kind"], c["size"]): c for c in baseline["cases"]}
+    regressions = []
+
+    def check(what, new, old):
+        for key, slack, relative, fmt in COMPARED_METRICS:
+            if new.get(key) is None or old.get(key) is None:
+                continue
+            limit = old[key] * (1 + tolerance) if relative else old[key]
+            if new[key] > limit + slack:
+                regressions.append(("%s: " + fmt + " -> " + fmt) % (what, old[key], new[key]))
+
+    for case in results:
+        old = base.get((case["kind"], case["size"]))
+        if old is None or "error" in case or "error" in old:
+            continue
+        for name, stage in case["stages"].items():
+            check("%s/%d %s" % (case["kind"], case["size"], name), stage,
+                  old["stages"].get(name, {}))
+        check("%s/%d total" % (case["kind"], case["size"]),
+              {"peak_rss_kib": case["total"]["peak_rss_kib"]},
+              {"peak_rss_kib": old["total"]["peak_rss_kib"]})
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Comma separated list of topology sizes (number of ASes)')
+    parser.add_argument('--kinds', default=DEFAULT_KINDS,
+                        help='Comma separated list of topology kinds (%s)' %
+                        ','.join(sorted(TOPO_KINDS)))
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help='Seed for the synthetic topologies and random IFIDs')
+    parser.add_argument('-d', '--docker', action='store_true',
+                        help='Benchmark the docker backend instead of supervisor')
+    parser.add_argument('--no-certs', action='store_true',
+                        help='Skip the certificate generation (needs scion-pki otherwise)')
+    parser.add_argument('--topogen-args', default='',
+                        help='Additional arguments passed to topogen')
+    parser.add_argument('-o', '--out', default='topogen-bench.json',
+                        help='Output file for the JSON results')
+    parser.add_argument('--baseline',
+                        help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative slowdown per stage tolerated by --baseline')
+    parser.add_argument('--keep', action='store_true',
+                        help='Keep the generated topologies and output')
+    parser.add_argument('--import-time', action='store_true',
+                        help='Only measure the time to import topogen, which dominates its\
+                        startup time')
+    parser.add_argument('--import-budget', type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        metavar='MS', help='Import time budget for --import-time in ms')
+    parser.add_argument('--write-topo', metavar='DIR',
+                        help='Only write the synthetic .topo files to DIR')
+    return parser
+
+
+def write_topos(kinds, sizes, seed, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for size in sizes:
+        for kind in kinds:
+            path = os.path.join(out_dir, "%s-%d.topo" % (kind, size))
+            with open(path, "w") as f:
+                yaml.dump(TOPO_KINDS[kind](size, seed=seed), f, default_flow_style=False)
+            print(path)
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    kinds = [k for k in args.kinds.split(',') if k]
+    for kind in kinds:
+        if kind not in TOPO_KINDS:
+            logging.critical("Unknown topology kind '%s'", kind)
+            sys.exit(1)
+    if args.write_topo:
+        write_topos(kinds, sizes, args.seed, args.write_topo)
+        return
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    meta = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    if args.import_time:
+        res, regressions = run_import_time(args.import_budget, baseline, args.tolerance)
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "import": res}, f, indent=2, sort_keys=True)
+        for r in regressions:
+            print("REGRESSION: %s" % r, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        return
+    topogen_args = args.topogen_args.split()
+    if args.docker:
+        topogen_args.append('-d')
+    opts = {
+        "seed": args.seed,
+        "keep": args.keep,
+        "skip": ("CertGenerator",) if args.no_certs else (),
+        "topogen_args": topogen_args,
+    }
+    results = {
+        "meta": dict(meta, seed=args.seed, topogen_args=topogen_args),
+        "cases": run_cases(kinds, sizes, opts),
+    }
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    if baseline:
+        regressions = compare(results["cases"], baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION: %s" % r, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`benchmark_test` --- topology.benchmark unit tests
+=======================================================
+"""
+# Stdlib
+import unittest
+
+# SCION
+from python.topology.benchmark import compare
+
+
+def _case(wall_s, peak_rss_kib, files):
+    return {
+        "kind": "tree",
+        "size": 100,
+        "stages": {
+            "GoGenerator": {"wall_s": wall_s, "peak_rss_kib": peak_rss_kib, "files": files},
+            "CertGenerator": {"skipped": True},
+        },
+        "total": {"peak_rss_kib": peak_rss_kib},
+    }
+
+
+class TestCompare(unittest.TestCase):
+    """
+    Unit tests for topology.benchmark.compare
+    """
+    def test_within_tolerance(self):
+        baseline = {"cases": [_case(1.0, 100000, 10)]}
+        self.assertEqual(compare([_case(1.1, 105000, 10)], baseline, 0.1), [])
+
+    def test_regressions(self):
+        baseline = {"cases": [_case(1.0, 100000, 10)]}
+        regressions = compare([_case(2.0, 200000, 11)], baseline, 0.1)
+        self.assertEqual(regressions, [
+            "tree/100 GoGenerator: 1.00s -> 2.00s",
+            "tree/100 GoGenerator: 100000 KiB -> 200000 KiB",
+            "tree/100 GoGenerator: 10 files -> 11 files",
+            "tree/100 total: 100000 KiB -> 200000 KiB",
+        ])
+
+    def test_unattributed_rss(self):
+        # Without a reset of the high-water mark, the stage has no peak RSS.
+        baseline = {"cases": [_case(1.0, 100000, 10)]}
+        case = _case(1.0, None, 10)
+        case["total"]["peak_rss_kib"] = 100000
+        self.assertEqual(compare([case], baseline, 0.1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
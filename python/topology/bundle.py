@@ -0,0 +1,157 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`bundle` --- SCION topology generator artifact bundle
+==========================================================
+
+An in-memory file tree of the generated files, for library users that would
+otherwise generate into a temporary directory and read the files back.
+
+Example:
+    bundle = ArtifactBundle()
+    ConfigGenerator(args).generate_all(bundle=bundle)
+    topo = bundle.text("ASff00_0_110/topology.json")
+    bundle.write_tar("gen.tar")
+"""
+# Stdlib
+import fnmatch
+import io
+import os
+import threading
+from collections.abc import Mapping as MappingABC
+from typing import Iterable, List, Union
+
+# SCION
+from python.lib.util import WriteSink
+
+
+class ArtifactBundle(WriteSink, MappingABC):
+    """
+    Maps the paths of the generated files, relative to the bundle root, to
+    their content.
+
+    Used as a context manager, the bundle is the sink of write_file and
+    collects the files written within the block. The files can be read as a
+    mapping, or written out as a tar stream or to a directory.
+    """
+    def __init__(self, root: str = None):
+        """
+        :param str root: The directory the paths passed to write_file are
+            relative to. If not set, ConfigGenerator.generate_all sets it to
+            the output directory.
+        """
+        self.root = root
+        self._files = {}
+        self._dirs = set()
+        self._lock = threading.Lock()
+
+    def write(self, file_path, text):
+        self.add(self.relpath(file_path), text)
+
+    def relpath(self, file_path: str) -> str:
+        rel = os.path.normpath(os.path.relpath(file_path, self.root or os.curdir))
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep) or os.path.isabs(rel):
+            raise ValueError("'%s' is outside of the bundle root '%s'" % (file_path, self.root))
+        return rel
+
+    def add(self, rel: str, data: Union[str, bytes]):
+        """
+        Adds the file with the given relative path, replacing an existing one.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        with self._lock:
+            self._files[os.path.normpath(rel)] = data
+
+    def add_dir(self, rel: str):
+        """
+        Adds an empty directory. It is not part of the mapping, which only
+        contains files.
+        """
+        with self._lock:
+            self._dirs.add(os.path.normpath(rel))
+
+    def add_tree(self, src: str, dst: str = os.curdir, skip: Iterable[str] = ()):
+        """
+        Adds the files of the directory src below the relative path dst,
+        except the paths relative to src in skip.
+        """
+        skip = set(skip)
+        for root, _, files in os.walk(src):
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, src)
+                if rel not in skip:
+                    with open(path, 'rb') as f:
+                        self.add(os.path.join(dst, rel), f.read())
+
+    def glob(self, pattern: str) -> List[str]:
+        """
+        Returns the sorted paths matching the pattern. Like glob.glob, "*" does
+        not match across directories.
+        """
+        pattern = os.path.normpath(pattern)
+        depth = pattern.count(os.sep)
+        return sorted(rel for rel in self._files
+                      if rel.count(os.sep) == depth and fnmatch.fnmatchcase(rel, pattern))
+
+    def text(self, rel: str) -> str:
+        return self._files[rel].decode()
+
+    def write_tar(self, out, prefix: str = ''):
+        """
+        Streams the files and directories as a tar archive to out, a path or
+        a binary file object that need not be seekable. The entries are sorted
+        and carry no timestamps or owners, so that the same files always
+        produce the same archive.
+        """
+        # Imported here, as it is only needed for tar output.
+        import tarfile
+        kwargs = {'name': out} if isinstance(out, str) else {'fileobj': out}
+        with tarfile.open(mode='w|', format=tarfile.GNU_FORMAT, **kwargs) as tar:
+            entries = [(rel, None) for rel in self._dirs]
+            entries += self._files.items()
+            for rel, data in sorted(entries, key=lambda e: e[0]):
+                info = tarfile.TarInfo(os.path.join(prefix, rel))
+                if data is None:
+                    info.type = tarfile.DIRTYPE
+                    info.mode = 0o755
+                    tar.addfile(info)
+                    continue
+                info.size = len(data)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+
+    def write_dir(self, path: str):
+        """
+        Writes the files and directories below the directory path.
+        """
+        for rel in sorted(self._dirs):
+            os.makedirs(os.path.join(path, rel), exist_ok=True)
+        for rel, data in sorted(self._files.items()):
+            file_path = os.path.join(path, rel)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp = file_path + ".new"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, file_path)
+
+    def __getitem__(self, rel: str) -> bytes:
+        return self._files[rel]
+
+    def __iter__(self):
+        return iter(sorted(self._files))
+
+    def __len__(self):
+        return len(self._files)
@@ -0,0 +1,80 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`bundle_test` --- topology.bundle unit tests
+=================================================
+"""
+# Stdlib
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+# SCION
+from python.lib.util import write_file
+from python.topology.bundle import ArtifactBundle
+
+
+class TestArtifactBundle(unittest.TestCase):
+    """
+    Unit tests for topology.bundle.ArtifactBundle
+    """
+    def _bundle(self):
+        bundle = ArtifactBundle("gen")
+        with bundle:
+            write_file("gen/b.yml", "b")
+            write_file("gen/ISD1/trcs/ISD1-B1-S1.trc", "trc")
+            write_file("gen/a/c.json", "c")
+        bundle.add("a/d.key", b"\x00")
+        bundle.add_dir("logs")
+        return bundle
+
+    def test_mapping(self):
+        bundle = self._bundle()
+        self.assertEqual(list(bundle), ["ISD1/trcs/ISD1-B1-S1.trc", "a/c.json", "a/d.key",
+                                        "b.yml"])
+        self.assertEqual(bundle["a/d.key"], b"\x00")
+        self.assertEqual(bundle.text("a/c.json"), "c")
+        self.assertEqual(bundle.glob("*/trcs/*.trc"), ["ISD1/trcs/ISD1-B1-S1.trc"])
+        self.assertEqual(bundle.glob("*.yml"), ["b.yml"])
+        with self.assertRaises(ValueError):
+            with bundle:
+                write_file("other/x", "x")
+
+    def test_tar(self):
+        tars = []
+        for _ in range(2):
+            buf = io.BytesIO()
+            self._bundle().write_tar(buf, prefix="gen")
+            tars.append(buf.getvalue())
+        self.assertEqual(tars[0], tars[1])
+        with tarfile.open(fileobj=io.BytesIO(tars[0])) as tar:
+            self.assertEqual(tar.getnames()[:2], ["gen/ISD1/trcs/ISD1-B1-S1.trc", "gen/a/c.json"])
+            self.assertTrue(tar.getmember("gen/logs").isdir())
+            self.assertEqual(tar.extractfile("gen/a/c.json").read(), b"c")
+            self.assertEqual({m.mtime for m in tar.getmembers()}, {0})
+
+    def test_dir(self):
+        bundle = self._bundle()
+        with tempfile.TemporaryDirectory() as tmp:
+            bundle.write_dir(tmp)
+            self.assertTrue(os.path.isdir(os.path.join(tmp, "logs")))
+            loaded = ArtifactBundle()
+            loaded.add_tree(tmp, "gen", skip=["b.yml"])
+        self.assertEqual(dict(loaded), {"gen/" + k: v for k, v in bundle.items() if k != "b.yml"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,13 +18,39 @@
 """
 import base64
 import collections
+import contextlib
+import glob
+import json
+import logging
 import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from plumbum import local
-
-from python.topology import common
+from python.topology import common, groups
+from python.topology.manifest import content_hash
+from python.topology.serialization import dump_yaml
 from python.lib.util import write_file
 
+# The AS attributes of the topology config that scion-pki testcrypto uses.
+CRYPTO_ATTRS = ('cert_issuer', 'authoritative', 'core', 'issuing', 'voting')
+# Cached crypto is regenerated after a day, well before the AS certificates
+# (valid for 3 days by default) expire.
+CRYPTO_CACHE_MAX_AGE = 24 * 60 * 60
+CRYPTO_CACHE_META = 'meta.json'
+COPY_WORKERS = 8
+
+
+def crypto_ases(topo_config):
+    """
+    Returns the ASes of the topology config, including the members of the AS
+    groups, with the attributes that scion-pki testcrypto uses.
+    """
+    return {ia: {k: attrs.get(k) for k in CRYPTO_ATTRS}
+            for ia, attrs in groups.iter_ases(topo_config)}
+
 
 class CertGenArgs(common.ArgsTopoConfig):
     pass
@@ -37,30 +63,159 @@ class CertGenerator(object):
         arguments and the parsed topo config.
         """
         self.args = args
-        self.pki = local['./bin/scion-pki']
-        if not local.path('./bin/scion-pki').exists():
-            self.pki = local[local.which('scion-pki')]
+        self.pki = self.args.host.scion_pki
         self.core_count = collections.defaultdict(int)
 
-    def generate(self, topo_dicts):
-        self.pki('testcrypto', '-t', self.args.topo_config, '-o', self.args.output_dir)
+    def generate(self, topo_dicts, crypto=True, bundle=None):
+        """
+        :param bool crypto: Generate the certificates and TRCs. Otherwise, only
+            the master keys are generated.
+        :param ArtifactBundle bundle: Add the files to the bundle instead of
+            the output directory.
+        """
+        if crypto:
+            if bundle is not None:
+                self._bundle_crypto(bundle)
+            elif self.args.crypto_cache:
+                self._copy_tree(self._cached_crypto(), self.args.output_dir)
+            else:
+                self._testcrypto(self.args.output_dir)
         self._master_keys(topo_dicts)
-        self._copy_files(topo_dicts)
+        if crypto:
+            if bundle is not None:
+                self._bundle_trcs(topo_dicts, bundle)
+            else:
+                self._copy_files(topo_dicts)
+
+    def _testcrypto(self, out_dir):
+        with contextlib.ExitStack() as stack:
+            topo_file = self.args.topo_config
+            if groups.has_groups(self.args.config):
+                # scion-pki does not know the AS groups, it gets the expanded ASes.
+                f = stack.enter_context(tempfile.NamedTemporaryFile(
+                    'w', prefix='topogen-', suffix='.topo'))
+                f.write(dump_yaml(groups.expanded_topo(self.args.config, links=False)))
+                f.flush()
+                topo_file = f.name
+            # The output is discarded, errors are reported on stderr.
+            subprocess.run([self.pki, 'testcrypto', '-t', topo_file, '-o', out_dir],
+                           check=True, stdout=subprocess.DEVNULL)
+
+    def cache_key(self):
+        """
+        Returns the key of the crypto cache: the hash of the ISD/AS attributes
+        of the topology, and of the identity of the scion-pki binary.
+        """
+        st = os.stat(self.pki)
+        return content_hash({
+            'ASes': crypto_ases(self.args.config),
+            'scion-pki': [self.pki, st.st_size, st.st_mtime_ns],
+        })
+
+    def _cached_crypto(self):
+        """
+        Returns the cache directory with the testcrypto output of the topology.
+        It is generated on a miss, or if the cached crypto is too old.
+        """
+        cache_dir = self.args.crypto_cache
+        os.makedirs(cache_dir, exist_ok=True)
+        self._prune_cache(cache_dir)
+        entry = os.path.join(cache_dir, self.cache_key())
+        if os.path.isdir(entry):
+            logging.info("Using cached crypto %s", entry)
+            return entry
+        # Stage the output, so that concurrent or failed runs never leave a
+        # partial cache entry behind.
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=cache_dir)
+        try:
+            self._testcrypto(staging)
+            # Not written with write_file, the cache is not part of the output.
+            with open(os.path.join(staging, CRYPTO_CACHE_META), 'w') as f:
+                json.dump({'created': time.time()}, f)
+            os.rename(staging, entry)
+        except OSError:
+            if not os.path.isdir(entry):
+                raise
+            # Another run added the entry in the meantime.
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return entry
+
+    def _prune_cache(self, cache_dir):
+        now = time.time()
+        for name in os.listdir(cache_dir):
+            entry = os.path.join(cache_dir, name)
+            try:
+                with open(os.path.join(entry, CRYPTO_CACHE_META)) as f:
+                    created = json.load(f)['created']
+            except (OSError, ValueError, KeyError):
+                created = 0
+                if name.startswith('.staging-') and \
+                        now - os.stat(entry).st_mtime < CRYPTO_CACHE_MAX_AGE:
+                    # Possibly still used by a concurrent run.
+                    continue
+            if now - created >= CRYPTO_CACHE_MAX_AGE:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _bundle_crypto(self, bundle):
+        out = bundle.relpath(self.args.output_dir)
+        if self.args.crypto_cache:
+            bundle.add_tree(self._cached_crypto(), out, skip=[CRYPTO_CACHE_META])
+            return
+        with tempfile.TemporaryDirectory(prefix='topogen-crypto.') as tmp:
+            self._testcrypto(tmp)
+            bundle.add_tree(tmp, out)
+
+    def _copy_tree(self, src, dst):
+        copies = []
+        for root, _, files in os.walk(src):
+            rel = os.path.relpath(root, src)
+            os.makedirs(os.path.join(dst, rel), exist_ok=True)
+            copies += [(os.path.join(root, f), os.path.join(dst, rel, f))
+                       for f in files if f != CRYPTO_CACHE_META or rel != '.']
+        self._copy(copies)
+
+    def _copy(self, copies):
+        """
+        Copies the (src, dst) file pairs across a thread pool. The files are
+        copied rather than hardlinked, as scion-pki overwrites files in place.
+        """
+        with ThreadPoolExecutor(COPY_WORKERS) as pool:
+            # Consume the results, to raise copy errors.
+            list(pool.map(lambda c: shutil.copyfile(*c), copies))
 
     def _master_keys(self, topo_dicts):
         for topo_id in topo_dicts:
             base = topo_id.base_dir(self.args.output_dir)
-            write_file(os.path.join(base, 'keys', 'master0.key'),
-                       base64.b64encode(os.urandom(16)).decode())
-            write_file(os.path.join(base, 'keys', 'master1.key'),
-                       base64.b64encode(os.urandom(16)).decode())
+            for name in ('master0.key', 'master1.key'):
+                path = os.path.join(base, 'keys', name)
+                write_file(path, self._master_key(path))
+
+    def _master_key(self, path):
+        if self.args.incremental:
+            # Keep the existing keys, so that the services need not be restarted.
+            try:
+                with open(path) as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        return base64.b64encode(os.urandom(16)).decode()
 
     def _copy_files(self, topo_dicts):
-        cp = local['cp']
-        mkdir = local['mkdir']
-        # Copy the certs and key dir for all elements.
-        for topo_id, as_topo in topo_dicts.items():
-            base = local.path(self.args.output_dir)
-            as_dir = local.path(topo_id.base_dir(self.args.output_dir))
-            mkdir('-p', as_dir / 'certs')
-            cp(base // '*/trcs/*.trc', as_dir / 'certs/')
+        # Copy the TRCs of all ISDs to the certs dir of all ASes.
+        trcs = sorted(glob.glob(os.path.join(self.args.output_dir, '*', 'trcs', '*.trc')))
+        copies = []
+        for topo_id in topo_dicts:
+            certs_dir = os.path.join(topo_id.base_dir(self.args.output_dir), 'certs')
+            os.makedirs(certs_dir, exist_ok=True)
+            copies += [(trc, os.path.join(certs_dir, os.path.basename(trc))) for trc in trcs]
+        self._copy(copies)
+
+    def _bundle_trcs(self, topo_dicts, bundle):
+        trcs = bundle.glob(os.path.join(bundle.relpath(self.args.output_dir), '*', 'trcs',
+                                        '*.trc'))
+        for topo_id in topo_dicts:
+            certs_dir = os.path.join(bundle.relpath(topo_id.base_dir(self.args.output_dir)),
+                                     'certs')
+            for trc in trcs:
+                bundle.add(os.path.join(certs_dir, os.path.basename(trc)), bundle[trc])
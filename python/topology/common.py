@@ -15,13 +15,15 @@
 # Stdlib
 from ipaddress import ip_address
 import os
+import shutil
 import subprocess
+import threading
 from urllib.parse import urlsplit
-from typing import Mapping, Tuple, List
+from typing import Tuple, List
 
 # SCION
 from python.lib.scion_addr import ISD_AS
-from python.topology.net import AddressProxy, NetworkDescription, IPNetwork
+from python.topology.net import AddressProxy, AddressRegistry, HostRef
 
 COMMON_DIR = 'endhost'
 
@@ -42,6 +44,13 @@ DISP_CONFIG_NAME = 'disp.toml'
 SIG_CONFIG_NAME = 'sig.toml'
 
 SD_API_PORT = 30255
+# Lists the docker-compose projects of a topology generated with --compose-shards.
+COMPOSE_SHARDS_INDEX = 'scion-shards'
+# The socket of the dispatcher in the docker containers.
+DOCKER_DISP_SOCKET = '/run/shm/dispatcher/default.sock'
+# Timing of the docker healthchecks: a service is unhealthy after retries failed
+# checks in a row, so the services have a minute to start.
+HEALTHCHECK_TIMING = {'interval': '2s', 'timeout': '2s', 'retries': 30}
 
 
 class ArgsBase:
@@ -71,6 +80,8 @@ class ArgsTopoDicts(ArgsBase):
 
 
 class TopoID(ISD_AS):
+    __slots__ = ()
+
     def ISD(self):
         return "ISD%s" % self.isd_str()
 
@@ -80,9 +91,6 @@ class TopoID(ISD_AS):
     def AS_file(self):
         return "AS%s" % self.as_file_fmt()
 
-    def file_fmt(self):
-        return "%s-%s" % (self.isd_str(), self.as_file_fmt())
-
     def base_dir(self, out_dir):
         return os.path.join(out_dir, self.AS_file())
 
@@ -115,28 +123,15 @@ def join_host_port(host: str, port: int) -> str:
     return '[{}]:{}'.format(host, port)
 
 
-def sciond_ip(docker, topo_id, networks: Mapping[IPNetwork,
-                                                 NetworkDescription]):
-    for net_desc in networks.values():
-        for prog, ip_net in net_desc.ip_net.items():
-            if prog == 'sd%s' % topo_id.file_fmt():
-                return ip_net.ip
-    return None
+def sciond_ip(docker, topo_id, registry: AddressRegistry):
+    return registry.ip(sciond_name(topo_id))
 
 
-def colibri_ip_list(docker, topo_id,
-                    networks: Mapping[IPNetwork, NetworkDescription]) -> List[str]:
-    list = []
-    for net_desc in networks.values():
-        for prog, ip_net in net_desc.ip_net.items():
-            if '-'.join(prog.split('-')[0:2]) == 'co%s' % topo_id.file_fmt():
-                list.append(str(ip_net.ip))
-    return list
+def colibri_ip_list(docker, topo_id, registry: AddressRegistry) -> List[str]:
+    return [str(registry.ip(elem)) for elem in registry.elems(topo_id, 'co')]
 
 
-def prom_addr_dispatcher(docker, topo_id,
-                         networks: Mapping[IPNetwork,
-                                           NetworkDescription], port, name):
+def prom_addr_dispatcher(docker, topo_id, registry: AddressRegistry, port, name):
     if not docker:
         return "[127.0.0.1]:%s" % port
     target_name = ''
@@ -146,10 +141,10 @@ def prom_addr_dispatcher(docker, topo_id,
         target_name = 'sig%s' % topo_id.file_fmt()
     else:
         target_name = 'disp%s' % topo_id.file_fmt()
-    for net_desc in networks.values():
-        if target_name in net_desc.ip_net:
-            return '[%s]:%s' % (net_desc.ip_net[target_name].ip, port)
-    return None
+    ip = registry.ip(target_name)
+    if ip is None:
+        return None
+    return '[%s]:%s' % (ip, port)
 
 
 def docker_image(args, image):
@@ -160,29 +155,87 @@ def docker_image(args, image):
     return image
 
 
-def docker_host(docker, addr=None):
-    if docker or not addr:
-        # Using docker topology or there is no default addr,
-        # we directly get the DOCKER0 IP
-        addr = docker_ip()
-    return addr
-
-
-def docker_ip():
-    return subprocess.check_output(['tools/docker-ip']).decode("utf-8").strip()
-
+class HostFacts(object):
+    """
+    Facts about the host that the topology is generated on and for: the IP of
+    the docker bridge, the user and group of the generated containers, the base
+    directory of their mounts, and the path of scion-pki. Every fact is probed
+    at most once per run, and only if it is not overridden, e.g. on the command
+    line for hermetic runs.
+    """
+    DOCKER_IP_TOOL = 'tools/docker-ip'
 
-def remote_nets(networks, topo_id):
+    def __init__(self, docker_ip: str = None, user: str = None, output_base: str = None,
+                 scion_pki: str = None):
+        """
+        :param str docker_ip: The IP of the docker bridge, e.g. of docker0.
+        :param str user: The "uid:gid" of the containers.
+        :param str output_base: The directory the containers mount the
+            generated files and the logs from.
+        :param str scion_pki: The path of the scion-pki binary.
+        """
+        self._docker_ip = docker_ip
+        self._user = user
+        self._output_base = output_base
+        self._scion_pki = scion_pki
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.docker_ip, args.user, args.output_base, args.scion_pki)
+
+    @property
+    def docker_ip(self) -> str:
+        with self._lock:
+            if self._docker_ip is None:
+                self._docker_ip = subprocess.check_output(
+                    [self.DOCKER_IP_TOOL]).decode("utf-8").strip()
+            return self._docker_ip
+
+    @property
+    def user(self) -> str:
+        if self._user is None:
+            self._user = '%d:%d' % (os.getuid(), os.getgid())
+        return self._user
+
+    @property
+    def output_base(self) -> str:
+        if self._output_base is None:
+            self._output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
+        return self._output_base
+
+    @property
+    def scion_pki(self) -> str:
+        if self._scion_pki is None:
+            pki = os.path.abspath('./bin/scion-pki')
+            if not os.path.exists(pki):
+                pki = shutil.which('scion-pki')
+                if pki is None:
+                    raise FileNotFoundError("scion-pki not found in ./bin or PATH")
+            self._scion_pki = pki
+        return self._scion_pki
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def remote_nets(registry: AddressRegistry, topo_id):
     """
     Returns the subnets of all remote ASes the SIG in topo_id is connected to.
-    :param networks dict: Scion elem to subnet/IP map.
+    :param AddressRegistry registry: The allocated element addresses.
     :param topo_id: A key of a topo dict generated by TopoGenerator.
     :return: String of comma separated subnets.
     """
     rem_nets = []
-    for key in networks:
-        if 'sig' in key and topo_id.file_fmt() not in key:
-            rem_nets.append(str(networks[key][0]['net']))
+    for elem in registry.elems(role='sig'):
+        if topo_id.file_fmt() not in elem:
+            rem_nets.append(str(registry.net(elem)))
     return ','.join(rem_nets)
 
 
@@ -194,8 +247,71 @@ def sciond_svc_name(topo_id):
     return 'scion_%s' % sciond_name(topo_id)
 
 
+def as_disp_id(topo_id):
+    """
+    Returns the ID of the dispatcher that the services of an AS share with
+    --shared-dispatcher.
+    """
+    return topo_id.file_fmt()
+
+
+def as_disp_elem(topo_id):
+    """
+    Returns the address element of the shared dispatcher of an AS.
+    """
+    return 'disp%s' % topo_id.file_fmt()
+
+
+def packed_as_svc_name(topo_id):
+    """
+    Returns the name of the container of an AS packed with --pack-ases.
+    """
+    return 'scion_as_%s' % topo_id.file_fmt()
+
+
+def shares_as_disp(args, elem_id: str) -> bool:
+    """
+    Returns whether the element runs in the network namespace of the shared
+    dispatcher of its AS. The border routers do not use the dispatcher and
+    keep their own namespace.
+    """
+    return bool(args.shared_dispatcher) and elem_id.startswith(('cs', 'tester_'))
+
+
+def docker_healthcheck(test: List[str]) -> dict:
+    """
+    Returns the docker-compose healthcheck that runs test.
+    """
+    return dict(HEALTHCHECK_TIMING, test=test)
+
+
+def metrics_healthcheck(addr: str) -> dict:
+    """
+    Returns the healthcheck of a service that serves metrics on addr. The
+    app images have the busybox tools of the debug base image.
+    """
+    return docker_healthcheck(['CMD', '/busybox/wget', '-q', '-O', '/dev/null',
+                               'http://%s/metrics' % addr])
+
+
+def disp_healthcheck() -> dict:
+    """
+    Returns the healthcheck of a dispatcher, which is healthy as soon as the
+    applications can connect to it.
+    """
+    return docker_healthcheck(['CMD', '/busybox/test', '-S', DOCKER_DISP_SOCKET])
+
+
+def depends_healthy(*services: str) -> dict:
+    """
+    Returns the docker-compose depends_on entry to start a service once the
+    given services are healthy.
+    """
+    return {svc: {'condition': 'service_healthy'} for svc in services}
+
+
 def json_default(o):
-    if isinstance(o, AddressProxy):
+    if isinstance(o, (AddressProxy, HostRef)):
         return str(o.ip)
     raise TypeError
 
@@ -0,0 +1,69 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`common_test` --- topology.common unit tests
+=================================================
+"""
+# Stdlib
+import argparse
+import os
+import pickle
+import unittest
+from unittest import mock
+
+# SCION
+from python.topology.common import HostFacts, shares_as_disp
+
+
+class TestHostFacts(unittest.TestCase):
+    """
+    Unit tests for topology.common.HostFacts
+    """
+    @mock.patch('subprocess.check_output', return_value=b'172.17.0.1\n')
+    def test_probe_once(self, check_output):
+        facts = HostFacts()
+        self.assertEqual(facts.docker_ip, '172.17.0.1')
+        self.assertEqual(facts.docker_ip, '172.17.0.1')
+        check_output.assert_called_once_with([HostFacts.DOCKER_IP_TOOL])
+        self.assertEqual(facts.user, '%d:%d' % (os.getuid(), os.getgid()))
+        # The probed facts are kept, e.g. in the worker processes.
+        copy = pickle.loads(pickle.dumps(facts))
+        self.assertEqual(copy.docker_ip, '172.17.0.1')
+        check_output.assert_called_once()
+
+    @mock.patch('subprocess.check_output')
+    def test_overrides(self, check_output):
+        facts = HostFacts(docker_ip='10.0.0.1', user='1:2', output_base='$SCIONROOT',
+                          scion_pki='/opt/scion-pki')
+        self.assertEqual((facts.docker_ip, facts.user, facts.output_base, facts.scion_pki),
+                         ('10.0.0.1', '1:2', '$SCIONROOT', '/opt/scion-pki'))
+        check_output.assert_not_called()
+
+
+class TestSharesASDisp(unittest.TestCase):
+    """
+    Unit tests for topology.common.shares_as_disp
+    """
+    def test_shares_as_disp(self):
+        shared = argparse.Namespace(shared_dispatcher=True)
+        for elem, want in (("cs1-ff00_0_110-1", True), ("tester_1-ff00_0_110", True),
+                           ("br1-ff00_0_110-1", False), ("sd1-ff00_0_110", False)):
+            with self.subTest(elem=elem):
+                self.assertEqual(shares_as_disp(shared, elem), want)
+        self.assertFalse(shares_as_disp(argparse.Namespace(shared_dispatcher=False),
+                                        "cs1-ff00_0_110-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
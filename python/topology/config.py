@@ -18,7 +18,7 @@
 """
 # Stdlib
 import configparser
-import json
+import contextlib
 import logging
 import os
 import sys
@@ -26,6 +26,7 @@ from io import StringIO
 from typing import Mapping
 
 # SCION
+from python.lib import defines, scion_addr
 from python.lib.defines import (
     DEFAULT_MTU,
     DEFAULT6_NETWORK,
@@ -33,31 +34,53 @@ from python.lib.defines import (
 )
 from python.lib.scion_addr import ISD_AS
 from python.lib.util import (
+    BatchWriter,
     load_yaml_file,
     write_file,
 )
-from python.topology.cert import CertGenArgs, CertGenerator
-from python.topology.common import ArgsBase
-from python.topology.docker import DockerGenArgs, DockerGenerator
+from python.topology.bundle import ArtifactBundle
+from python.topology.cert import CertGenArgs, CertGenerator, crypto_ases
+from python.topology.common import ArgsBase, COMPOSE_SHARDS_INDEX, HostFacts
+from python.topology import common, go, prometheus, serialization
+from python.topology import net as topo_net
 from python.topology.go import GoGenArgs, GoGenerator
+from python.topology.groups import iter_ases
 from python.topology.jaeger import JaegerGenArgs, JaegerGenerator
+from python.topology.manifest import (
+    content_hash,
+    IncrementalWriter,
+    Manifest,
+    MANIFEST_FILE,
+    MANIFEST_VERSION,
+)
 from python.topology.net import (
+    AddressRegistry,
     NetworkDescription,
     IPNetwork,
     SubnetGenerator,
     DEFAULT_NETWORK,
 )
 from python.topology.prometheus import PrometheusGenArgs, PrometheusGenerator
-from python.topology.supervisor import SupervisorGenArgs, SupervisorGenerator
+from python.topology.stages import Stage, StageScheduler
 from python.topology.topo import TopoGenArgs, TopoGenerator
 
 DEFAULT_TOPOLOGY_FILE = "topology/default.topo"
 
 SCIOND_ADDRESSES_FILE = "sciond_addresses.json"
 
+# The modules that the Go configs are rendered with. Their sources are part of
+# the incremental input hash of the ASes, so that a change regenerates the configs.
+GO_SOURCE_MODULES = (go, common, topo_net, prometheus, serialization, defines, scion_addr)
+
+# Arguments that do not affect the content of the generated files.
+NON_CONTENT_ARGS = ('incremental', 'write_workers', 'fsync', 'jobs', 'stage_workers', 'timings',
+                    'crypto_cache', 'serializer', 'host')
+
 
 class ConfigGenArgs(ArgsBase):
-    pass
+    def __init__(self, args):
+        super().__init__(args)
+        self.host = HostFacts.from_args(args)
 
 
 class ConfigGenerator(object):
@@ -72,10 +95,26 @@ class ConfigGenerator(object):
         :param ConfigGenArgs args: Contains the passed command line arguments.
         """
         self.args = args
-        self.topo_config = load_yaml_file(self.args.topo_config)
+        serialization.set_backend(self.args.serializer)
+        self.topo_config = load_yaml_file(self.args.topo_config, cache=True)
         if self.args.sig and not self.args.docker:
             logging.critical("Cannot use sig without docker!")
             sys.exit(1)
+        if self.args.fabric and not self.args.docker:
+            logging.critical("Cannot use fabric without docker!")
+            sys.exit(1)
+        if self.args.shared_dispatcher and not self.args.docker:
+            logging.critical("Cannot use shared dispatcher without docker!")
+            sys.exit(1)
+        if self.args.pack_ases:
+            if not self.args.docker:
+                logging.critical("Cannot pack ASes without docker!")
+                sys.exit(1)
+            # The services of an AS share the dispatcher and its address.
+            self.args.shared_dispatcher = True
+        if self.args.compose_shards and not self.args.docker:
+            logging.critical("Cannot use compose shards without docker!")
+            sys.exit(1)
         self.default_mtu = None
         self._read_defaults(self.args.network)
 
@@ -84,58 +123,173 @@ class ConfigGenerator(object):
         Configure default network.
         """
         defaults = self.topo_config.get("defaults", {})
-        self.subnet_gen4 = SubnetGenerator(DEFAULT_NETWORK, self.args.docker)
-        self.subnet_gen6 = SubnetGenerator(DEFAULT6_NETWORK, self.args.docker)
+        self.subnet_gen4 = SubnetGenerator(DEFAULT_NETWORK, self.args.docker,
+                                           self.args.subnet_alloc, self.args.compact_addrs)
+        self.subnet_gen6 = SubnetGenerator(DEFAULT6_NETWORK, self.args.docker,
+                                           self.args.subnet_alloc, self.args.compact_addrs)
         self.default_mtu = defaults.get("mtu", DEFAULT_MTU)
 
-    def generate_all(self):
+    def generate_all(self, bundle: ArtifactBundle = None):
         """
         Generate all needed files.
+
+        :param ArtifactBundle bundle: Collect the files in the bundle instead
+            of writing them to the output directory.
         """
+        if bundle is not None and self.args.incremental:
+            raise ValueError("An artifact bundle cannot be generated incrementally")
+        self.incremental = None
+        self.bundle = bundle
+        if bundle is not None:
+            # Nothing is written to the output directory.
+            if bundle.root is None:
+                bundle.root = self.args.output_dir
+            with bundle:
+                self._generate_all()
+            return
+        with contextlib.ExitStack() as stack:
+            if self.args.write_workers or self.args.fsync:
+                stack.enter_context(BatchWriter(self.args.write_workers, self.args.fsync))
+            if self.args.incremental:
+                self.incremental = stack.enter_context(IncrementalWriter(
+                    self.args.output_dir, Manifest.load(self.args.output_dir), Manifest()))
+            else:
+                # The files will not match the manifest of an earlier incremental run
+                # anymore, and tools/dc must not use the shards of an earlier run.
+                for name in (MANIFEST_FILE, COMPOSE_SHARDS_INDEX):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self.args.output_dir, name))
+            self._generate_all()
+
+    def _generate_all(self):
         self._ensure_uniq_ases()
+        self.topo_dicts = None
+        scheduler = StageScheduler(self._stages(), self.args.stage_workers)
+        scheduler.run()
+        logging.info("Stage timings:\n%s", scheduler.summary())
+        if self.args.timings:
+            print(scheduler.summary())
+
+    def _stages(self):
+        """
+        Returns the generation stages, with the artifacts they require and provide.
+        """
+        stages = [
+            Stage("topology", self._generate_topology_stage,
+                  provides=("topo_dicts", "networks")),
+            Stage("go", lambda: self._generate_go(self.topo_dicts),
+                  requires=("topo_dicts", "networks"), provides=("go_configs",)),
+        ]
+        if self.args.docker:
+            stages.append(Stage("docker", lambda: self._generate_docker(self.topo_dicts),
+                                requires=("topo_dicts", "networks"),
+                                provides=("docker_compose",)))
+        else:
+            stages.append(Stage("supervisor", lambda: self._generate_supervisor(self.topo_dicts),
+                                requires=("topo_dicts",), provides=("supervisor_conf",)))
+        stages += [
+            Stage("jaeger", lambda: self._generate_jaeger(self.topo_dicts),
+                  requires=("topo_dicts",), provides=("jaeger_conf",)),
+            Stage("prometheus", lambda: self._generate_prom_conf(self.topo_dicts),
+                  requires=("topo_dicts", "networks"), provides=("prometheus_conf",)),
+            Stage("certs", lambda: self._generate_certs_trcs(self.topo_dicts),
+                  requires=("topo_dicts",), provides=("crypto",)),
+            Stage("networks_conf", lambda: self._write_networks_conf(self.networks,
+                                                                     NETWORKS_FILE),
+                  requires=("networks",), provides=("networks_conf",)),
+            Stage("sciond_conf", lambda: self._write_sciond_conf(self.registry,
+                                                                 SCIOND_ADDRESSES_FILE),
+                  requires=("networks",), provides=("sciond_conf",)),
+        ]
+        return stages
+
+    def _generate_topology_stage(self):
         topo_dicts, self.all_networks = self._generate_topology()
         self.networks = remove_v4_nets(self.all_networks)
-        self._generate_with_topo(topo_dicts)
-        self._write_networks_conf(self.networks, NETWORKS_FILE)
-        self._write_sciond_conf(self.networks, SCIOND_ADDRESSES_FILE)
+        self.registry = AddressRegistry(self.all_networks)
+        self.topo_dicts = topo_dicts
 
     def _ensure_uniq_ases(self):
         seen = set()
-        for asStr in self.topo_config["ASes"]:
+        for asStr, _ in iter_ases(self.topo_config):
             ia = ISD_AS(asStr)
             if ia.as_str() in seen:
                 logging.critical("Non-unique AS Id '%s'", ia.as_str())
                 sys.exit(1)
             seen.add(ia.as_str())
 
-    def _generate_with_topo(self, topo_dicts):
-        self._generate_go(topo_dicts)
-        if self.args.docker:
-            self._generate_docker(topo_dicts)
-        else:
-            self._generate_supervisor(topo_dicts)
-        self._generate_jaeger(topo_dicts)
-        self._generate_prom_conf(topo_dicts)
-        self._generate_certs_trcs(topo_dicts)
-
     def _generate_certs_trcs(self, topo_dicts):
         certgen = CertGenerator(self._cert_args())
-        certgen.generate(topo_dicts)
+        certgen.generate(topo_dicts, crypto=self._crypto_changed(topo_dicts), bundle=self.bundle)
+
+    def _crypto_changed(self, topo_dicts):
+        """
+        Returns whether the certificates and TRCs need to be generated. In
+        incremental mode, they are kept if the ASes did not change, hashed like
+        the key of the crypto cache.
+        """
+        if not self.incremental:
+            return True
+        self.incremental.new.crypto = content_hash(crypto_ases(self.topo_config))
+        if self.incremental.new.crypto != self.incremental.old.crypto:
+            return True
+        for topo_id in topo_dicts:
+            base = topo_id.base_dir(self.args.output_dir)
+            if not all(os.path.isdir(os.path.join(base, d)) for d in ('certs', 'crypto')):
+                return True
+        return False
 
     def _cert_args(self):
         return CertGenArgs(self.args, self.topo_config)
 
     def _generate_go(self, topo_dicts):
-        args = self._go_args(topo_dicts)
+        only = None
+        if self.incremental:
+            only = self._changed_go_ases(topo_dicts)
+            self.incremental.record()
+        args = self._go_args(topo_dicts, only)
         go_gen = GoGenerator(args)
-        go_gen.generate_br()
-        go_gen.generate_sciond()
-        go_gen.generate_control_service()
-        go_gen.generate_co()
-        go_gen.generate_disp()
+        go_gen.generate()
+        if self.incremental:
+            self._record_go_files(topo_dicts, self.incremental.stop_recording())
+
+    def _go_args(self, topo_dicts, only=None):
+        return GoGenArgs(self.args, topo_dicts, self.registry, only)
+
+    def _changed_go_ases(self, topo_dicts):
+        """
+        Returns the ASes whose Go configs need to be generated. The configs of
+        the other ASes are kept from the previous run.
+        """
+        args = {k: v for k, v in vars(self.args).items() if k not in NON_CONTENT_ARGS}
+        core = sorted(str(t) for t, topo in topo_dicts.items() if 'core' in topo['attributes'])
+        sources = []
+        for mod in GO_SOURCE_MODULES:
+            with open(mod.__file__) as f:
+                sources.append(content_hash(f.read()))
+        inputs = [MANIFEST_VERSION, sources, args, core, self.args.host.docker_ip]
+        changed = set()
+        for topo_id, topo in topo_dicts.items():
+            elems = [(e, str(self.registry.ip(e))) for e in self.registry.elems(topo_id)]
+            entry = {'go_hash': content_hash([inputs, str(topo_id), topo, elems]),
+                     'go_files': []}
+            old = self.incremental.old.ases.get(str(topo_id))
+            if old and old['go_hash'] == entry['go_hash'] and \
+                    all(self.incremental.keep(f) for f in old['go_files']):
+                entry['go_files'] = old['go_files']
+            else:
+                changed.add(topo_id)
+            self.incremental.new.ases[str(topo_id)] = entry
+        logging.info("Incremental generation: %d of %d ASes changed",
+                     len(changed), len(topo_dicts))
+        return changed
 
-    def _go_args(self, topo_dicts):
-        return GoGenArgs(self.args, topo_dicts, self.networks)
+    def _record_go_files(self, topo_dicts, written):
+        as_dirs = {topo_id.AS_file(): str(topo_id) for topo_id in topo_dicts}
+        for rel in written:
+            ia = as_dirs.get(rel.split(os.sep, 1)[0])
+            if ia is not None:
+                self.incremental.new.ases[ia]['go_files'].append(rel)
 
     def _generate_jaeger(self, topo_dicts):
         args = JaegerGenArgs(self.args, topo_dicts)
@@ -152,19 +306,24 @@ class ConfigGenerator(object):
 
     def _generate_supervisor(self, topo_dicts):
         args = self._supervisor_args(topo_dicts)
+        from python.topology.supervisor import SupervisorGenerator
         super_gen = SupervisorGenerator(args)
         super_gen.generate()
 
     def _supervisor_args(self, topo_dicts):
+        # The backends are imported when selected, to keep the startup time low.
+        from python.topology.supervisor import SupervisorGenArgs
         return SupervisorGenArgs(self.args, topo_dicts)
 
     def _generate_docker(self, topo_dicts):
         args = self._docker_args(topo_dicts)
+        from python.topology.docker import DockerGenerator
         docker_gen = DockerGenerator(args)
         docker_gen.generate()
 
     def _docker_args(self, topo_dicts):
-        return DockerGenArgs(self.args, topo_dicts, self.all_networks)
+        from python.topology.docker import DockerGenArgs
+        return DockerGenArgs(self.args, topo_dicts, self.all_networks, self.registry)
 
     def _generate_prom_conf(self, topo_dicts):
         args = self._prometheus_args(topo_dicts)
@@ -172,7 +331,7 @@ class ConfigGenerator(object):
         prom_gen.generate()
 
     def _prometheus_args(self, topo_dicts):
-        return PrometheusGenArgs(self.args, topo_dicts, self.networks)
+        return PrometheusGenArgs(self.args, topo_dicts, self.registry)
 
     def _write_ca_files(self, topo_dicts, ca_files):
         isds = set()
@@ -196,15 +355,13 @@ class ConfigGenerator(object):
         config.write(text)
         write_file(os.path.join(self.args.output_dir, out_file), text.getvalue())
 
-    def _write_sciond_conf(self, networks: Mapping[IPNetwork, NetworkDescription], out_file: str):
+    def _write_sciond_conf(self, registry: AddressRegistry, out_file: str):
         d = dict()
-        for net_desc in networks.values():
-            for prog, ip_net in net_desc.ip_net.items():
-                if prog.startswith("sd"):
-                    ia = prog[2:].replace("_", ":")
-                    d[ia] = str(ip_net.ip)
-        with open(os.path.join(self.args.output_dir, out_file), mode="w") as f:
-            json.dump(d, f, sort_keys=True, indent=4)
+        for prog in registry.elems(role='sd'):
+            ia = prog[2:].replace("_", ":")
+            d[ia] = str(registry.ip(prog))
+        write_file(os.path.join(self.args.output_dir, out_file),
+                   serialization.dump_json(d, sort_keys=True, indent=4))
 
 
 def remove_v4_nets(nets: Mapping[IPNetwork, NetworkDescription]
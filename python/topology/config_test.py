@@ -0,0 +1,67 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`config_test` --- topology.config unit tests
+=================================================
+"""
+# Stdlib
+import copy
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+# SCION
+from python.topology.common import TopoID
+from python.topology.config import ConfigGenerator
+from python.topology.manifest import Manifest
+
+GROUPS_TOPO = {
+    "groups": [{
+        "ases": ["1-ff00:0:1000..ff00:0:1001"],
+        "attributes": {"core": True},
+    }],
+}
+
+
+class TestCryptoChanged(unittest.TestCase):
+    """
+    Unit tests for ConfigGenerator._crypto_changed in incremental mode.
+    """
+    def _crypto_changed(self, out, topo_config, old):
+        gen = ConfigGenerator.__new__(ConfigGenerator)
+        gen.args = SimpleNamespace(output_dir=out)
+        gen.topo_config = topo_config
+        gen.incremental = SimpleNamespace(old=Manifest(crypto=old), new=Manifest())
+        topo_dicts = {TopoID(ia): {} for ia in ("1-ff00:0:1000", "1-ff00:0:1001")}
+        return gen._crypto_changed(topo_dicts), gen.incremental.new.crypto
+
+    def test_groups_only(self):
+        with tempfile.TemporaryDirectory() as out:
+            for as_dir in ("ASff00_0_1000", "ASff00_0_1001"):
+                for d in ("certs", "crypto"):
+                    os.makedirs(os.path.join(out, as_dir, d))
+            changed, crypto = self._crypto_changed(out, GROUPS_TOPO, None)
+            self.assertTrue(changed)
+            changed, _ = self._crypto_changed(out, GROUPS_TOPO, crypto)
+            self.assertFalse(changed)
+            # The attributes of the group members are part of the hash.
+            topo = copy.deepcopy(GROUPS_TOPO)
+            topo["groups"][0]["attributes"]["voting"] = True
+            changed, _ = self._crypto_changed(out, topo, crypto)
+            self.assertTrue(changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,35 +15,82 @@
 # Stdlib
 import copy
 import os
+import re
+from collections import defaultdict
+from ipaddress import ip_network
 from typing import Mapping
-# External packages
-import yaml
 # SCION
 from python.lib.defines import DOCKER_COMPOSE_CONFIG_VERSION
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsTopoDicts,
-    docker_host,
+    COMPOSE_SHARDS_INDEX,
+    as_disp_elem,
+    as_disp_id,
+    depends_healthy,
+    disp_healthcheck,
+    docker_healthcheck,
     docker_image,
+    DOCKER_DISP_SOCKET,
+    metrics_healthcheck,
+    packed_as_svc_name,
+    prom_addr,
+    sciond_name,
     sciond_svc_name,
+    SD_CONFIG_NAME,
+    shares_as_disp,
 )
 from python.topology.docker_utils import DockerUtilsGenArgs, DockerUtilsGenerator
-from python.topology.net import NetworkDescription, IPNetwork
+from python.topology.net import (
+    AddressRegistry,
+    NetworkDescription,
+    IPNetwork,
+    socket_address_str,
+)
+from python.topology.prometheus import (
+    CO_PROM_PORT,
+    CS_PROM_PORT,
+    DEFAULT_BR_PROM_PORT,
+    SCIOND_PROM_PORT,
+)
+from python.topology.serialization import dump_yaml
 from python.topology.sig import SIGGenArgs, SIGGenerator
 
 DOCKER_CONF = 'scion-dc.yml'
+# The project of a sharded topology that creates the networks.
+NETWORKS_PROJECT = 'scion-net'
+# Matches the ASes in file format in the service names, e.g. "1-ff00_0_110".
+_SVC_AS_RE = re.compile(r'\d+-[0-9a-f_]+')
+# Passed through to the border routers.
+BR_ENVIRONMENT = {
+    'SCION_EXPERIMENTAL_BFD_DETECT_MULT': '${SCION_EXPERIMENTAL_BFD_DETECT_MULT}',
+    'SCION_EXPERIMENTAL_BFD_DESIRED_MIN_TX': '${SCION_EXPERIMENTAL_BFD_DESIRED_MIN_TX}',
+    'SCION_EXPERIMENTAL_BFD_REQUIRED_MIN_RX': '${SCION_EXPERIMENTAL_BFD_REQUIRED_MIN_RX}',
+}
+
+
+def shard_project(isd: str) -> str:
+    return 'scion-isd%s' % isd
+
+
+def shard_compose_file(project: str) -> str:
+    # The naming scheme of tools/dc.
+    return '%s-dc.yml' % project
 
 
 class DockerGenArgs(ArgsTopoDicts):
     def __init__(self, args, topo_dicts,
-                 networks: Mapping[IPNetwork, NetworkDescription]):
+                 networks: Mapping[IPNetwork, NetworkDescription],
+                 registry: AddressRegistry):
         """
         :param object args: Contains the passed command line arguments as named attributes.
         :param dict topo_dicts: The generated topo dicts from TopoGenerator.
         :param dict networks: The generated networks from SubnetGenerator.
+        :param AddressRegistry registry: The allocated element addresses.
         """
         super().__init__(args, topo_dicts)
         self.networks = networks
+        self.registry = registry
 
 
 class DockerGenerator(object):
@@ -60,8 +107,8 @@ class DockerGenerator(object):
         }
         self.elem_networks = {}
         self.bridges = {}
-        self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
-        self.user = '%d:%d' % (os.getuid(), os.getgid())
+        self.output_base = self.args.host.output_base
+        self.user = self.args.host.user
         self.prefix = 'scion_'
 
     def generate(self):
@@ -75,8 +122,71 @@ class DockerGenerator(object):
         docker_utils_gen = DockerUtilsGenerator(self._docker_utils_args())
         self.dc_conf = docker_utils_gen.generate()
 
+        if self.args.compose_shards:
+            self._write_shards()
+            return
         write_file(os.path.join(self.args.output_dir, DOCKER_CONF),
-                   yaml.dump(self.dc_conf, default_flow_style=False))
+                   dump_yaml(self.dc_conf))
+
+    def _write_shards(self):
+        """
+        Splits the compose config into one project per ISD, so that the ISDs
+        can be brought up and torn down concurrently. The ISD projects use
+        the networks as external networks, which are created by a separate
+        project. The index (COMPOSE_SHARDS_INDEX) lists the ISD projects and
+        their services, one project per line.
+        """
+        isds = {topo_id.file_fmt(): topo_id.isd_str() for topo_id in self.args.topo_dicts}
+        services = dict(self.dc_conf['services'])
+        chowner = services.pop('utils_chowner')
+        shards = defaultdict(dict)
+        for name, entry in services.items():
+            isd = next((isds[m] for m in _SVC_AS_RE.findall(name) if m in isds), None)
+            if isd is None:
+                raise ValueError("Service '%s' does not belong to an AS" % name)
+            shards[isd][name] = entry
+        networks = self.dc_conf['networks']
+        net_conf = {
+            'version': DOCKER_COMPOSE_CONFIG_VERSION,
+            'services': {
+                # Compose only creates the networks that a service uses. The
+                # service is only created, never started (up --no-start), so that
+                # it takes none of the addresses.
+                'utils_networks': {
+                    'image': 'busybox',
+                    'networks': sorted(networks),
+                },
+            },
+            'networks': {k: dict(v, name=k) for k, v in networks.items()},
+        }
+        write_file(os.path.join(self.args.output_dir, shard_compose_file(NETWORKS_PROJECT)),
+                   dump_yaml(net_conf))
+        index = []
+        for isd in sorted(shards, key=int):
+            shard_services = shards[isd]
+            used_nets = set()
+            used_vols = set()
+            for entry in shard_services.values():
+                used_nets.update(entry.get('networks', ()))
+                for vol in entry.get('volumes', ()):
+                    used_vols.add(vol.split(':')[0])
+            vols = sorted(v for v in self.dc_conf['volumes'] if v in used_vols)
+            shard_chowner = dict(chowner)
+            shard_chowner['volumes'] = [
+                v for v in chowner['volumes']
+                if v.split(':')[0] not in self.dc_conf['volumes'] or v.split(':')[0] in used_vols]
+            conf = {
+                'version': DOCKER_COMPOSE_CONFIG_VERSION,
+                'services': dict(shard_services, utils_chowner=shard_chowner),
+                'networks': {n: {'external': {'name': n}} for n in sorted(used_nets)},
+                'volumes': {v: None for v in vols},
+            }
+            project = shard_project(isd)
+            write_file(os.path.join(self.args.output_dir, shard_compose_file(project)),
+                       dump_yaml(conf))
+            index.append(' '.join([project, 'utils_chowner'] + list(shard_services)))
+        write_file(os.path.join(self.args.output_dir, COMPOSE_SHARDS_INDEX),
+                   '\n'.join(index) + '\n')
 
     def _docker_utils_args(self):
         return DockerUtilsGenArgs(self.args, self.dc_conf, self.bridges,
@@ -87,6 +197,9 @@ class DockerGenerator(object):
                           self.elem_networks)
 
     def _gen_topo(self, topo_id, topo, base):
+        if self.args.pack_ases:
+            self._packed_as_conf(topo_id, topo, base)
+            return
         self._dispatcher_conf(topo_id, topo, base)
         self._br_conf(topo_id, topo, base)
         self._control_service_conf(topo_id, topo, base)
@@ -141,49 +254,49 @@ class DockerGenerator(object):
                 self.dc_conf['networks'][net_name]['enable_ipv6'] = True
 
     def _br_conf(self, topo_id, topo, base):
-        for k, _ in topo.get("border_routers", {}).items():
+        for k, v in topo.get("border_routers", {}).items():
             disp_id = k
             image = docker_image(self.args, 'posix-router')
             entry = {
                 'image': image,
                 'container_name': self.prefix + k,
-                'depends_on': [
-                    'scion_disp_%s' % disp_id,
-                ],
-                'network_mode': 'service:scion_disp_%s' % disp_id,
                 'user': self.user,
-                'volumes':
-                [self._disp_vol(disp_id),
-                 '%s:/share/conf:ro' % base],
-                'environment': {
-                    'SCION_EXPERIMENTAL_BFD_DETECT_MULT':
-                    '${SCION_EXPERIMENTAL_BFD_DETECT_MULT}',
-                    'SCION_EXPERIMENTAL_BFD_DESIRED_MIN_TX':
-                    '${SCION_EXPERIMENTAL_BFD_DESIRED_MIN_TX}',
-                    'SCION_EXPERIMENTAL_BFD_REQUIRED_MIN_RX':
-                    '${SCION_EXPERIMENTAL_BFD_REQUIRED_MIN_RX}',
-                },
+                'volumes': ['%s:/share/conf:ro' % base],
+                'environment': dict(BR_ENVIRONMENT),
+                'healthcheck': metrics_healthcheck(
+                    prom_addr(v['internal_addr'], DEFAULT_BR_PROM_PORT)),
                 'command': ['--config', '/share/conf/%s.toml' % k]
             }
+            if self.args.shared_dispatcher:
+                # The border router does not use the dispatcher, it is attached
+                # to its networks itself.
+                entry['extra_hosts'] = ['jaeger:%s' % self.args.host.docker_ip]
+                entry['networks'] = self._networks(k)
+            else:
+                entry['depends_on'] = depends_healthy('scion_disp_%s' % disp_id)
+                entry['network_mode'] = 'service:scion_disp_%s' % disp_id
+                entry['volumes'].insert(0, self._disp_vol(disp_id))
             self.dc_conf['services']['scion_%s' % k] = entry
 
     def _control_service_conf(self, topo_id, topo, base):
-        for k in topo.get("control_service", {}).keys():
+        for k, v in topo.get("control_service", {}).items():
+            disp_id = self._disp_id(topo_id, k)
             entry = {
                 'image':
                 docker_image(self.args, 'control'),
                 'container_name':
                 self.prefix + k,
-                'depends_on': ['scion_disp_%s' % k],
+                'depends_on': depends_healthy('scion_disp_%s' % disp_id),
+                'healthcheck': metrics_healthcheck(prom_addr(v['addr'], CS_PROM_PORT)),
                 'network_mode':
-                'service:scion_disp_%s' % k,
+                'service:scion_disp_%s' % disp_id,
                 'user':
                 self.user,
                 'volumes': [
                     self._cache_vol(),
                     self._certs_vol(),
                     '%s:/share/conf:ro' % base,
-                    self._disp_vol(k),
+                    self._disp_vol(disp_id),
                 ],
                 'command': ['--config', '/share/conf/%s.toml' % k]
             }
@@ -192,41 +305,27 @@ class DockerGenerator(object):
     def _dispatcher_conf(self, topo_id, topo, base):
         image = 'dispatcher'
         base_entry = {
-            'extra_hosts': ['jaeger:%s' % docker_host(self.args.docker)],
+            'extra_hosts': ['jaeger:%s' % self.args.host.docker_ip],
             'image': docker_image(self.args, image),
-            'networks': {},
             'user': self.user,
             'volumes': [],
+            'healthcheck': disp_healthcheck(),
             'depends_on': {
                 'utils_chowner': {
                     'condition': 'service_started'
                 },
             },
         }
-        keys = (list(topo.get("border_routers", {})) +
-                list(topo.get("control_service", {})) +
-                ["tester_%s" % topo_id.file_fmt()])
-        for disp_id in keys:
+        if self.args.shared_dispatcher:
+            disps = [(as_disp_id(topo_id), as_disp_elem(topo_id))]
+        else:
+            keys = (list(topo.get("border_routers", {})) +
+                    list(topo.get("control_service", {})) +
+                    ["tester_%s" % topo_id.file_fmt()])
+            disps = [(k, k) for k in keys]
+        for disp_id, elem_id in disps:
             entry = copy.deepcopy(base_entry)
-            net_key = disp_id
-            if disp_id.startswith('br'):
-                net_key = disp_id + '_internal'
-                # add data networks:
-                for net in self.elem_networks[disp_id]:
-                    ipv = 'ipv4'
-                    if ipv not in net:
-                        ipv = 'ipv6'
-                    entry['networks'][self.bridges[net['net']]] = {
-                        '%s_address' % ipv: str(net[ipv])
-                    }
-            net = self.elem_networks[net_key][0]
-            ipv = 'ipv4'
-            if ipv not in net:
-                ipv = 'ipv6'
-            ip = str(net[ipv])
-            entry['networks'][self.bridges[net['net']]] = {
-                '%s_address' % ipv: ip
-            }
+            entry['networks'] = self._networks(elem_id)
             entry['container_name'] = '%sdisp_%s' % (self.prefix, disp_id)
             entry['volumes'].append(self._disp_vol(disp_id))
             conf = '%s:/share/conf:rw' % base
@@ -239,6 +338,120 @@ class DockerGenerator(object):
             self.dc_conf['volumes'][self._disp_vol(disp_id).split(':')
                                     [0]] = None
 
+    def _packed_as_conf(self, topo_id, topo, base):
+        """
+        Packs the dispatcher, border routers, control and colibri services
+        and the daemon of the AS into one container. The init of the "as"
+        image adds the addresses of the services as secondary addresses and
+        supervises the services, which use the same configs as in separate
+        containers.
+        """
+        disp_id = as_disp_id(topo_id)
+        elems = [as_disp_elem(topo_id)]
+        services = ['dispatcher:disp_%s.toml' % disp_id]
+        # The container is healthy once the dispatcher and all services are.
+        checks = ['test -S %s' % DOCKER_DISP_SOCKET]
+        metrics = []
+        for k, v in topo.get("border_routers", {}).items():
+            elems.append(k)
+            services.append('posix-router:%s.toml' % k)
+            metrics.append(prom_addr(v['internal_addr'], DEFAULT_BR_PROM_PORT))
+        # The control service has the address of the dispatcher.
+        for k, v in topo.get("control_service", {}).items():
+            services.append('cs:%s.toml' % k)
+            metrics.append(prom_addr(v['addr'], CS_PROM_PORT))
+        for k, v in topo.get("colibri_service", {}).items():
+            # only a single Go-CO per AS is currently supported
+            if k.endswith("-1"):
+                elems.append(k)
+                services.append('co:%s.toml' % k)
+                metrics.append(prom_addr(v['addr'], CO_PROM_PORT))
+        elems.append(sciond_name(topo_id))
+        services.append('daemon:%s' % SD_CONFIG_NAME)
+        sd_net = self.elem_networks[sciond_name(topo_id)][0]
+        metrics.append(socket_address_str(sd_net.get('ipv4', sd_net.get('ipv6')),
+                                          SCIOND_PROM_PORT))
+        checks += ['wget -q -O /dev/null http://%s/metrics' % a for a in metrics]
+        networks = {}
+        secondary = []
+        for elem_id in elems:
+            for net in self._elem_nets(elem_id):
+                bridge = self.bridges[net['net']]
+                ipv = 'ipv4' if 'ipv4' in net else 'ipv6'
+                if bridge not in networks:
+                    networks[bridge] = {'%s_address' % ipv: str(net[ipv])}
+                    continue
+                # The init adds the address to the interface with the primary address.
+                primary = next(iter(networks[bridge].values()))
+                secondary.append('%s/%d,%s' % (net[ipv], ip_network(net['net']).prefixlen,
+                                               primary))
+        environment = dict(BR_ENVIRONMENT)
+        environment.update({
+            'SCION_USER': self.user,
+            'SCION_ADDRS': ' '.join(secondary),
+            'SCION_SERVICES': ' '.join(services),
+        })
+        entry = {
+            'image': docker_image(self.args, 'as'),
+            'container_name': packed_as_svc_name(topo_id),
+            # The init adds the secondary addresses, and then runs the
+            # services as SCION_USER.
+            'cap_add': ['NET_ADMIN'],
+            'depends_on': {
+                'utils_chowner': {
+                    'condition': 'service_started'
+                },
+            },
+            'extra_hosts': ['jaeger:%s' % self.args.host.docker_ip],
+            'environment': environment,
+            'healthcheck': docker_healthcheck(['CMD-SHELL', ' && '.join(checks)]),
+            'networks': networks,
+            'volumes': [
+                self._disp_vol(disp_id),
+                self._cache_vol(),
+                self._certs_vol(),
+                '%s:/share/conf:rw' % base,
+            ],
+        }
+        self.dc_conf['services'][packed_as_svc_name(topo_id)] = entry
+        self.dc_conf['volumes'][self._disp_vol(disp_id).split(':')[0]] = None
+
+    def _elem_nets(self, elem_id):
+        """
+        Returns the networks of the element: the first network of the element,
+        and for border routers also the data networks.
+        """
+        nets = []
+        net_key = elem_id
+        if elem_id.startswith('br'):
+            net_key = elem_id + '_internal'
+            # add data networks:
+            nets += self.elem_networks[elem_id]
+        nets.append(self.elem_networks[net_key][0])
+        return nets
+
+    def _networks(self, elem_id):
+        """
+        Returns the docker networks of the element, see _elem_nets.
+        """
+        networks = {}
+        for net in self._elem_nets(elem_id):
+            ipv = 'ipv4'
+            if ipv not in net:
+                ipv = 'ipv6'
+            networks[self.bridges[net['net']]] = {
+                '%s_address' % ipv: str(net[ipv])
+            }
+        return networks
+
+    def _disp_id(self, topo_id, elem_id):
+        """
+        Returns the ID of the dispatcher the element uses.
+        """
+        if shares_as_disp(self.args, elem_id):
+            return as_disp_id(topo_id)
+        return elem_id
+
     def _sciond_conf(self, topo_id, base):
         name = sciond_svc_name(topo_id)
         net = self.elem_networks["sd" + topo_id.file_fmt()][0]
@@ -246,14 +459,15 @@ class DockerGenerator(object):
         if ipv not in net:
             ipv = 'ipv6'
         ip = str(net[ipv])
-        disp_id = 'cs%s-1' % topo_id.file_fmt()
+        disp_id = self._disp_id(topo_id, 'cs%s-1' % topo_id.file_fmt())
         entry = {
-            'extra_hosts': ['jaeger:%s' % docker_host(self.args.docker)],
+            'extra_hosts': ['jaeger:%s' % self.args.host.docker_ip],
             'image':
             docker_image(self.args, 'daemon'),
             'container_name':
             '%ssd%s' % (self.prefix, topo_id.file_fmt()),
-            'depends_on': ['scion_disp_%s' % disp_id],
+            'depends_on': depends_healthy('scion_disp_%s' % disp_id),
+            'healthcheck': metrics_healthcheck(socket_address_str(net[ipv], SCIOND_PROM_PORT)),
             'user':
             self.user,
             'volumes': [
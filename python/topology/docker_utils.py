@@ -19,8 +19,13 @@ import os
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsBase,
+    as_disp_elem,
+    as_disp_id,
+    depends_healthy,
     docker_image,
+    packed_as_svc_name,
     remote_nets,
+    shares_as_disp,
 )
 
 
@@ -45,8 +50,8 @@ class DockerUtilsGenerator(object):
         """
         self.args = args
         self.dc_conf = args.dc_conf
-        self.user = '%d:%d' % (os.getuid(), os.getgid())
-        self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
+        self.user = self.args.host.user
+        self.output_base = self.args.host.output_base
 
     def generate(self):
         self._utils_conf()
@@ -73,27 +78,33 @@ class DockerUtilsGenerator(object):
     def _test_conf(self, topo_id):
         cntr_base = '/share'
         name = 'tester_%s' % topo_id.file_fmt()
+        disp_id, net_key = name, name
+        if shares_as_disp(self.args, name):
+            disp_id, net_key = as_disp_id(topo_id), as_disp_elem(topo_id)
+        disp_svc = 'scion_disp_%s' % disp_id
+        if self.args.pack_ases:
+            disp_svc = packed_as_svc_name(topo_id)
         entry = {
             'image': docker_image(self.args, 'tester'),
             'container_name': 'tester_%s' % topo_id.file_fmt(),
-            'depends_on': ['scion_disp_%s' % name],
+            'depends_on': depends_healthy(disp_svc),
             'privileged': True,
             'entrypoint': 'sh tester.sh',
             'environment': {},
             # 'user': self.user,
             'volumes': [
-                'vol_scion_disp_%s:/run/shm/dispatcher:rw' % name,
+                'vol_scion_disp_%s:/run/shm/dispatcher:rw' % disp_id,
                 self.output_base + '/logs:' + cntr_base + '/logs:rw',
                 self.output_base + '/gen:' + cntr_base + '/gen:rw',
                 self.output_base + '/gen-certs:' + cntr_base + '/gen-certs:rw'
             ],
-            'network_mode': 'service:scion_disp_%s' % name,
+            'network_mode': 'service:%s' % disp_svc,
         }
-        net = self.args.networks[name][0]
+        net = self.args.networks[net_key][0]
         ipv = 'ipv4'
         if ipv not in net:
             ipv = 'ipv6'
-        disp_net = self.args.networks[name][0]
+        disp_net = self.args.networks[net_key][0]
         entry['environment']['SCION_LOCAL_ADDR'] = str(disp_net[ipv])
         sciond_net = self.args.networks['sd%s' % topo_id.file_fmt()][0]
         entry['environment']['SCION_DAEMON'] = '%s:30255' % sciond_net[ipv]
@@ -103,13 +114,16 @@ class DockerUtilsGenerator(object):
             # net information for the connected SIG
             sig_net = self.args.networks['sig%s' % topo_id.file_fmt()][0]
             entry['environment']['SIG_IP'] = str(sig_net[ipv])
-            entry['environment']['REMOTE_NETS'] = remote_nets(self.args.networks, topo_id)
+            entry['environment']['REMOTE_NETS'] = remote_nets(self.args.registry, topo_id)
         self.dc_conf['services'][name] = entry
 
     def _sig_testing_conf(self):
         text = ''
         for topo_id in self.args.topo_dicts:
-            net = self.args.networks['tester_%s' % topo_id.file_fmt()][0]
+            name = 'tester_%s' % topo_id.file_fmt()
+            if shares_as_disp(self.args, name):
+                name = as_disp_elem(topo_id)
+            net = self.args.networks[name][0]
             ipv = 'ipv4'
             if ipv not in net:
                 ipv = 'ipv6'
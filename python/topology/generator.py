@@ -24,6 +24,16 @@ import argparse
 from python.lib.defines import (
     GEN_PATH,
 )
+from python.topology.net import (
+    DEFAULT_PORT_RANGES,
+    parse_port_range,
+    SUBNET_ALLOC_COMPAT,
+    SUBNET_ALLOC_MODES,
+)
+from python.topology.serialization import (
+    BACKEND_FAST,
+    BACKENDS,
+)
 from python.topology.config import (
     ConfigGenerator,
     ConfigGenArgs,
@@ -36,12 +46,43 @@ def add_arguments(parser):
                         help='Path policy file')
     parser.add_argument('-d', '--docker', action='store_true',
                         help='Create a docker-compose configuration')
+    parser.add_argument('--fabric', action='store_true',
+                        help='Connect the border routers of an ISD through one shared docker\
+                        network instead of one network per link (only available with -d). The\
+                        interfaces of a border router share its address and use port 50000 +\
+                        IFID.')
+    parser.add_argument('--shared-dispatcher', action='store_true',
+                        help='Run a single dispatcher per AS, which the control service and the\
+                        tester of the AS share, instead of one dispatcher per service (only\
+                        available with -d). The border routers run without a dispatcher.')
+    parser.add_argument('--pack-ases', action='store_true',
+                        help='Run all services of an AS in a single container of the "as" image\
+                        (only available with -d). Implies --shared-dispatcher.')
+    parser.add_argument('--compose-shards', action='store_true',
+                        help='Split the docker-compose configuration into one project per ISD\
+                        and a project that creates the networks, which tools/dc brings up and\
+                        tears down concurrently (only available with -d)')
     parser.add_argument('-n', '--network',
                         help='Network to create subnets in (E.g. "127.0.0.0/8"')
     parser.add_argument('-o', '--output-dir', default=GEN_PATH,
                         help='Output directory')
+    parser.add_argument('--output-base',
+                        help='Directory the docker-compose files mount the generated files and\
+                        the logs from, e.g. "$SCIONROOT" for relocatable output (default:\
+                        $SCION_OUTPUT_BASE or the working directory)')
+    parser.add_argument('--docker-ip',
+                        help='IP of the docker bridge, which runs jaeger (default: the IP of\
+                        $DOCKER_IF or docker0, probed with tools/docker-ip)')
+    parser.add_argument('--user', metavar='UID:GID',
+                        help='User and group of the docker containers (default: the current\
+                        user and group)')
+    parser.add_argument('--scion-pki', metavar='PATH',
+                        help='Path of the scion-pki binary (default: ./bin/scion-pki or\
+                        scion-pki in PATH)')
     parser.add_argument('--random-ifids', action='store_true',
                         help='Generate random IFIDs')
+    parser.add_argument('--seed', type=int,
+                        help='Seed for the generated IFIDs, to make them reproducible')
     parser.add_argument('--docker-registry', help='Specify docker registry to pull images from')
     parser.add_argument('--image-tag', help='Docker image tag')
     parser.add_argument('--sig', action='store_true',
@@ -49,6 +90,47 @@ def add_arguments(parser):
                         to be built manually e.g. when running acceptance tests)')
     parser.add_argument('--features', help='Feature flags to enable, a comma separated list\
                         e.g. foo,bar enables foo and bar feature.')
+    parser.add_argument('--subnet-alloc', choices=SUBNET_ALLOC_MODES,
+                        default=SUBNET_ALLOC_COMPAT,
+                        help='Subnet allocation strategy. "%s" keeps the addresses of previous\
+                        releases, "%s" packs the subnets densely.' % SUBNET_ALLOC_MODES)
+    parser.add_argument('--compact-addrs', action='store_true',
+                        help='Store element addresses as integer offsets and only create address\
+                        objects when they are written out. Reduces memory use on large topologies.')
+    parser.add_argument('--port-range', type=parse_port_range, action='append',
+                        metavar='FIRST-LAST',
+                        help='Port range for the services of a topology without docker, can be\
+                        given multiple times (default: %d-%d)' % DEFAULT_PORT_RANGES[0])
+    parser.add_argument('--check-ports', action='store_true',
+                        help='Do not assign ports that are bound on the host')
+    parser.add_argument('--port-plan', metavar='FILE',
+                        help='Keep the ports of the services assigned in FILE by an earlier run,\
+                        and write the assigned ports to FILE')
+    parser.add_argument('--write-workers', type=int, default=0,
+                        help='Number of threads writing the generated files (default: write them\
+                        synchronously)')
+    parser.add_argument('--fsync', action='store_true',
+                        help='Sync the generated files and directories to disk')
+    parser.add_argument('--serializer', choices=BACKENDS, default=BACKEND_FAST,
+                        help='Serialization backend of the generated YAML and TOML files. Both\
+                        produce the same output, "%s" uses the pure-Python serializers.'
+                        % BACKENDS[1])
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes generating the service configs')
+    parser.add_argument('--stage-workers', type=int, default=4,
+                        help='Number of generation stages (e.g. service configs, docker-compose\
+                        file, certificates) that run concurrently. With 1, the stages run one\
+                        after another.')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print the start time and duration of every generation stage')
+    parser.add_argument('--crypto-cache', metavar='DIR',
+                        help='Cache the certificates, keys and TRCs generated by scion-pki in\
+                        DIR, and reuse them for topologies with the same ISDs, ASes and AS\
+                        attributes. Cached crypto is regenerated after a day.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only regenerate the ASes whose inputs changed since the last\
+                        incremental run into the output directory, and only write files whose\
+                        content changed. Files that are not generated anymore are removed.')
     return parser
 
 
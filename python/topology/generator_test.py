@@ -0,0 +1,50 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`generator_test` --- topology.generator unit tests
+=======================================================
+"""
+# Stdlib
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Modules that are only imported when the corresponding backend is used.
+LAZY_MODULES = (
+    "plumbum",
+    "multiprocessing",
+    "python.topology.docker",
+    "python.topology.supervisor",
+)
+
+
+class TestImports(unittest.TestCase):
+    """
+    Checks the modules imported by topology.generator
+    """
+    def test_lazy_imports(self):
+        # A fresh interpreter, as other tests may have imported the modules.
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        out = subprocess.check_output([sys.executable, "-c", (
+            "import json, sys; import python.topology.generator; "
+            "print(json.dumps(sorted(sys.modules)))")], env=env)
+        modules = json.loads(out)
+        for mod in LAZY_MODULES:
+            self.assertNotIn(mod, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,17 +18,14 @@
 """
 # Stdlib
 import os
-import toml
-import json
-from typing import Mapping
 
 # SCION
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsTopoDicts,
     DISP_CONFIG_NAME,
+    as_disp_id,
     colibri_ip_list,
-    docker_host,
     prom_addr,
     prom_addr_dispatcher,
     sciond_ip,
@@ -38,7 +35,9 @@ from python.topology.common import (
     SD_CONFIG_NAME,
 )
 
-from python.topology.net import socket_address_str, NetworkDescription, IPNetwork
+from python.topology.net import socket_address_str, AddressRegistry
+from python.topology import serialization
+from python.topology.serialization import dump_json, dump_toml
 
 from python.topology.prometheus import (
     CS_PROM_PORT,
@@ -54,9 +53,16 @@ DEFAULT_COLIBRI_TOTAL_BW = 1000000
 
 
 class GoGenArgs(ArgsTopoDicts):
-    def __init__(self, args, topo_dicts, networks: Mapping[IPNetwork, NetworkDescription]):
+    def __init__(self, args, topo_dicts, registry: AddressRegistry, only=None):
+        """
+        :param object args: Contains the passed command line arguments as named attributes.
+        :param dict topo_dicts: The generated topo dicts from TopoGenerator.
+        :param AddressRegistry registry: The allocated element addresses.
+        :param set only: The ASes to generate the configs for, or None for all ASes.
+        """
         super().__init__(args, topo_dicts)
-        self.networks = networks
+        self.registry = registry
+        self.only = only
 
 
 class GoGenerator(object):
@@ -70,12 +76,71 @@ class GoGenerator(object):
         self.certs_dir = '/share/crypto' if args.docker else 'gen-certs'
         self.log_level = 'debug'
 
+    def _topos(self):
+        """
+        Returns the topo dicts of the ASes to generate the configs for.
+        """
+        if self.args.only is None:
+            return self.args.topo_dicts.items()
+        return [(topo_id, topo) for topo_id, topo in self.args.topo_dicts.items()
+                if topo_id in self.args.only]
+
+    def generate(self):
+        """
+        Generates the configs of all services. With the jobs argument, the
+        per AS configs are generated by a pool of worker processes.
+        """
+        if self.args.jobs > 1:
+            self._generate_parallel()
+        else:
+            self.generate_br()
+            self.generate_sciond()
+            self.generate_control_service()
+            self.generate_co()
+            self.generate_disp()
+
+    def _generate_parallel(self):
+        # Imported here, as they are only needed with multiple jobs.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        topo_ids = [topo_id for topo_id, _ in self._topos()]
+        chunksize = max(1, len(topo_ids) // (self.args.jobs * 4))
+        # Probed here, so that the workers inherit it rather than probing it each.
+        self.args.host.docker_ip
+        # Spawned rather than forked, as other generator stages run in threads.
+        with ProcessPoolExecutor(self.args.jobs, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.args,)) as pool:
+            # map returns the results in order, so the files are written in
+            # the same order on every run.
+            for files in pool.map(_as_files, topo_ids, chunksize=chunksize):
+                _write_files(files)
+        if not self.args.docker:
+            self.generate_disp()
+
+    def as_files(self, topo_id):
+        """
+        Returns the (path, content) pairs of all configs of the AS.
+        """
+        topo = self.args.topo_dicts[topo_id]
+        files = self._br_files(topo_id, topo)
+        files += self._sciond_files(topo_id, topo)
+        files += self._control_service_files(topo_id, topo)
+        files += self._co_files(topo_id, topo)
+        if self.args.docker:
+            files += self._disp_docker_files(topo_id, topo)
+        return files
+
     def generate_br(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            for k, v in topo.get("border_routers", {}).items():
-                base = topo_id.base_dir(self.args.output_dir)
-                br_conf = self._build_br_conf(topo_id, topo["isd_as"], base, k, v)
-                write_file(os.path.join(base, "%s.toml" % k), toml.dumps(br_conf))
+        for topo_id, topo in self._topos():
+            _write_files(self._br_files(topo_id, topo))
+
+    def _br_files(self, topo_id, topo):
+        files = []
+        for k, v in topo.get("border_routers", {}).items():
+            base = topo_id.base_dir(self.args.output_dir)
+            br_conf = self._build_br_conf(topo_id, topo["isd_as"], base, k, v)
+            files.append((os.path.join(base, "%s.toml" % k), dump_toml(br_conf)))
+        return files
 
     def _build_br_conf(self, topo_id, ia, base, name, v):
         config_dir = '/share/conf' if self.args.docker else base
@@ -96,20 +161,25 @@ class GoGenerator(object):
         return raw_entry
 
     def generate_control_service(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            ca = 'issuing' in topo.get("attributes", [])
-            for elem_id, elem in topo.get("control_service", {}).items():
-                # only a single Go-BS per AS is currently supported
-                if elem_id.endswith("-1"):
-                    base = topo_id.base_dir(self.args.output_dir)
-                    bs_conf = self._build_control_service_conf(
-                        topo_id, topo["isd_as"], base, elem_id, elem, ca)
-                    write_file(os.path.join(base, "%s.toml" % elem_id),
-                               toml.dumps(bs_conf))
+        for topo_id, topo in self._topos():
+            _write_files(self._control_service_files(topo_id, topo))
+
+    def _control_service_files(self, topo_id, topo):
+        files = []
+        ca = 'issuing' in topo.get("attributes", [])
+        for elem_id, elem in topo.get("control_service", {}).items():
+            # only a single Go-BS per AS is currently supported
+            if elem_id.endswith("-1"):
+                base = topo_id.base_dir(self.args.output_dir)
+                bs_conf = self._build_control_service_conf(
+                    topo_id, topo["isd_as"], base, elem_id, elem, ca)
+                files.append((os.path.join(base, "%s.toml" % elem_id),
+                              dump_toml(bs_conf)))
+        return files
 
     def _build_control_service_conf(self, topo_id, ia, base, name, infra_elem, ca):
         config_dir = '/share/conf' if self.args.docker else base
-        co_ip_list = colibri_ip_list(self.args.docker, topo_id, self.args.networks)
+        co_ip_list = colibri_ip_list(self.args.docker, topo_id, self.args.registry)
         raw_entry = {
             'general': {
                 'id': name,
@@ -147,22 +217,27 @@ class GoGenerator(object):
         return raw_entry
 
     def generate_co(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            for elem_id, elem in topo.get("colibri_service", {}).items():
-                # only a single Go-CO per AS is currently supported
-                if elem_id.endswith("-1"):
-                    base = topo_id.base_dir(self.args.output_dir)
-                    co_conf = self._build_co_conf(topo_id, topo["isd_as"], base, elem_id, elem)
-                    write_file(os.path.join(base, "%s.toml" % elem_id), toml.dumps(co_conf))
-                    capacities = self._build_co_capacities(topo_id)
-                    write_file(os.path.join(base, 'capacities.json'),
-                               json.dumps(capacities, indent=2))
-                    rsvps = self._build_co_reservations(topo_id)
-                    write_file(os.path.join(base, 'reservations.json'),
-                               json.dumps(rsvps, indent=2))
+        for topo_id, topo in self._topos():
+            _write_files(self._co_files(topo_id, topo))
+
+    def _co_files(self, topo_id, topo):
+        files = []
+        for elem_id, elem in topo.get("colibri_service", {}).items():
+            # only a single Go-CO per AS is currently supported
+            if elem_id.endswith("-1"):
+                base = topo_id.base_dir(self.args.output_dir)
+                co_conf = self._build_co_conf(topo_id, topo["isd_as"], base, elem_id, elem)
+                files.append((os.path.join(base, "%s.toml" % elem_id), dump_toml(co_conf)))
+                capacities = self._build_co_capacities(topo_id)
+                files.append((os.path.join(base, 'capacities.json'),
+                              dump_json(capacities, indent=2)))
+                rsvps = self._build_co_reservations(topo_id)
+                files.append((os.path.join(base, 'reservations.json'),
+                              dump_json(rsvps, indent=2)))
+        return files
 
     def _build_co_conf(self, topo_id, ia, base, name, infra_elem):
-        daemon_ip = sciond_ip(self.args.docker, topo_id, self.args.networks)
+        daemon_ip = sciond_ip(self.args.docker, topo_id, self.args.registry)
         config_dir = '/share/conf' if self.args.docker else base
         raw_entry = {
             'general': {
@@ -178,8 +253,8 @@ class GoGenerator(object):
             },
             'colibri': {
                 'delta': 0.3,
-                'capacities': os.path.join(base, 'capacities.json'),
-                'reservations': os.path.join(base, 'reservations.json'),
+                'capacities': os.path.join(config_dir, 'capacities.json'),
+                'reservations': os.path.join(config_dir, 'reservations.json'),
                 'db': {
                     'connection': os.path.join(self.db_dir, '%s.reservation.db' % name),
                 },
@@ -245,22 +320,25 @@ class GoGenerator(object):
             'min_size': 5,
             'split_cls': 7,
             'end_props': {
-                'start': list(start_props),
-                'end': list(end_props)
+                'start': sorted(start_props),
+                'end': sorted(end_props)
             },
             'required_count': 1,
         }
 
     def generate_sciond(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            base = topo_id.base_dir(self.args.output_dir)
-            sciond_conf = self._build_sciond_conf(topo_id, topo["isd_as"], base)
-            write_file(os.path.join(base, SD_CONFIG_NAME), toml.dumps(sciond_conf))
+        for topo_id, topo in self._topos():
+            _write_files(self._sciond_files(topo_id, topo))
+
+    def _sciond_files(self, topo_id, topo):
+        base = topo_id.base_dir(self.args.output_dir)
+        sciond_conf = self._build_sciond_conf(topo_id, topo["isd_as"], base)
+        return [(os.path.join(base, SD_CONFIG_NAME), dump_toml(sciond_conf))]
 
     def _build_sciond_conf(self, topo_id, ia, base):
         name = sciond_name(topo_id)
         config_dir = '/share/conf' if self.args.docker else base
-        ip = sciond_ip(self.args.docker, topo_id, self.args.networks)
+        ip = sciond_ip(self.args.docker, topo_id, self.args.registry)
         raw_entry = {
             'general': {
                 'id': name,
@@ -298,25 +376,33 @@ class GoGenerator(object):
         else:
             elem_dir = os.path.join(self.args.output_dir, "dispatcher")
             config_file_path = os.path.join(elem_dir, DISP_CONFIG_NAME)
-            write_file(config_file_path, toml.dumps(self._build_disp_conf("dispatcher")))
+            write_file(config_file_path, dump_toml(self._build_disp_conf("dispatcher")))
 
     def _gen_disp_docker(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            base = topo_id.base_dir(self.args.output_dir)
+        for topo_id, topo in self._topos():
+            _write_files(self._disp_docker_files(topo_id, topo))
+
+    def _disp_docker_files(self, topo_id, topo):
+        files = []
+        base = topo_id.base_dir(self.args.output_dir)
+        if self.args.shared_dispatcher:
+            elem_ids = ['sig_%s' % topo_id.file_fmt(), as_disp_id(topo_id)]
+        else:
             elem_ids = ['sig_%s' % topo_id.file_fmt()] + \
                 list(topo.get("border_routers", {})) + \
                 list(topo.get("control_service", {})) + \
                 ['tester_%s' % topo_id.file_fmt()]
-            for k in elem_ids:
-                disp_id = 'disp_%s' % k
-                disp_conf = self._build_disp_conf(disp_id, topo_id)
-                write_file(os.path.join(base, '%s.toml' % disp_id), toml.dumps(disp_conf))
+        for k in elem_ids:
+            disp_id = 'disp_%s' % k
+            disp_conf = self._build_disp_conf(disp_id, topo_id)
+            files.append((os.path.join(base, '%s.toml' % disp_id), dump_toml(disp_conf)))
+        return files
 
     def _build_disp_conf(self, name, topo_id=None):
         prometheus_addr = prom_addr_dispatcher(self.args.docker, topo_id,
-                                               self.args.networks, DISP_PROM_PORT, name)
+                                               self.args.registry, DISP_PROM_PORT, name)
         api_addr = prom_addr_dispatcher(self.args.docker, topo_id,
-                                        self.args.networks, DISP_PROM_PORT+700, name)
+                                        self.args.registry, DISP_PROM_PORT+700, name)
         return {
             'dispatcher': {
                 'id': name,
@@ -332,7 +418,7 @@ class GoGenerator(object):
         }
 
     def _tracing_entry(self):
-        docker_ip = docker_host(self.args.docker)
+        docker_ip = self.args.host.docker_ip
         entry = {
             'enabled': True,
             'debug': True,
@@ -358,3 +444,22 @@ class GoGenerator(object):
         return {
             'addr': a,
         }
+
+
+def _write_files(files):
+    for path, text in files:
+        write_file(path, text)
+
+
+# The generator of a worker process of GoGenerator._generate_parallel.
+_worker_gen = None
+
+
+def _init_worker(args):
+    global _worker_gen
+    serialization.set_backend(args.serializer)
+    _worker_gen = GoGenerator(args)
+
+
+def _as_files(topo_id):
+    return _worker_gen.as_files(topo_id)
@@ -0,0 +1,130 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`groups` --- AS groups of topology files
+=============================================
+
+Besides the ASes and links that are spelled out, a topology file can declare
+groups of ASes in a range, which share their attributes and links:
+
+    groups:
+      - ases: "1-ff00:0:1000..1-ff00:0:1fff"
+        attributes: {cert_issuer: "1-ff00:0:110"}
+        links:
+          - {a: "1-ff00:0:110", linkAtoB: CHILD}
+
+Ranges are inclusive and run over the numeric ISD-AS value, both ends must be
+in the same ISD. The end can also be given as an AS number, e.g.
+"1-ff00:0:1000..ff00:0:1fff". A link template omits the end point of the
+member, so the template above links every member as a CHILD of 1-ff00:0:110.
+
+The groups are expanded lazily by iter_ases and iter_links, the expanded
+topology is never built, except for tools that need it as a file
+(expanded_topo).
+"""
+# Stdlib
+from typing import Iterator, Mapping, Tuple
+
+# SCION
+from python.lib.errors import SCIONParseError
+from python.lib.scion_addr import ISD_AS, ISDASArray
+
+RANGE_SEPARATOR = '..'
+
+
+def iter_ases(topo_config: Mapping) -> Iterator[Tuple[str, Mapping]]:
+    """
+    Yields the ISD-AS string and the attributes of every AS: first the spelled
+    out ASes, then the members of the groups in order. The members of a group
+    share their attributes dict, which must not be modified.
+    """
+    yield from (topo_config.get("ASes") or {}).items()
+    for group in topo_config.get("groups", ()):
+        attrs = group.get("attributes") or {}
+        for isd_as in group_members(group).strs():
+            yield isd_as, attrs
+
+
+def iter_links(topo_config: Mapping) -> Iterator[dict]:
+    """
+    Yields every link: first the spelled out links, then the links of the
+    group members, member by member. The links of the members are new dicts,
+    the others are the dicts of topo_config.
+    """
+    yield from topo_config.get("links") or ()
+    for group in topo_config.get("groups", ()):
+        templates = group.get("links") or ()
+        for template in templates:
+            if ("a" in template) == ("b" in template):
+                raise SCIONParseError("Link template must omit exactly one of a and b: %s" %
+                                      template)
+        if not templates:
+            continue
+        for isd_as in group_members(group).strs():
+            for template in templates:
+                link = dict(template)
+                link["b" if "a" in template else "a"] = isd_as
+                yield link
+
+
+def group_members(group: Mapping) -> ISDASArray:
+    """
+    Returns the ASes of a group.
+
+    :raises SCIONParseError: if a range is invalid.
+    """
+    ranges = group["ases"]
+    if isinstance(ranges, str):
+        ranges = [ranges]
+    members = []
+    for raw in ranges:
+        first, last = parse_range(raw)
+        members.append(range(first, last + 1))
+    return ISDASArray(v for r in members for v in r)
+
+
+def parse_range(raw: str) -> Tuple[int, int]:
+    """
+    Parses an ISD-AS range "first..last" into the int values of its ends.
+
+    :raises SCIONParseError: if the range is invalid.
+    """
+    first_s, sep, last_s = raw.partition(RANGE_SEPARATOR)
+    first = ISD_AS(first_s.strip())
+    if not sep:
+        return first.int(), first.int()
+    last_s = last_s.strip()
+    if "-" not in last_s:
+        last_s = "%s-%s" % (first.isd_str(), last_s)
+    last = ISD_AS(last_s)
+    if last.isd_str() != first.isd_str() or last.int() < first.int():
+        raise SCIONParseError("Invalid ISD-AS range: %s" % raw)
+    return first.int(), last.int()
+
+
+def has_groups(topo_config: Mapping) -> bool:
+    return bool(topo_config.get("groups"))
+
+
+def expanded_topo(topo_config: Mapping, links: bool = True) -> dict:
+    """
+    Returns the topology with the groups expanded into ASes and, unless links
+    is False, links.
+    """
+    topo = {k: v for k, v in topo_config.items() if k not in ("ASes", "links", "groups")}
+    # Copied, so that the members of a group are not dumped as YAML aliases.
+    topo["ASes"] = {isd_as: dict(attrs) for isd_as, attrs in iter_ases(topo_config)}
+    if links:
+        topo["links"] = list(iter_links(topo_config))
+    return topo
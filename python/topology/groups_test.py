@@ -0,0 +1,66 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import unittest
+
+# SCION
+from python.lib.errors import SCIONParseError
+from python.topology import groups
+
+TOPO = {
+    "ASes": {"1-ff00:0:110": {"core": True}},
+    "links": [{"a": "1-ff00:0:110", "b": "1-ff00:0:111", "linkAtoB": "CHILD"}],
+    "groups": [{
+        "ases": ["1-ff00:0:1000..ff00:0:1001", "1-ff00:0:2000"],
+        "attributes": {"cert_issuer": "1-ff00:0:110"},
+        "links": [{"a": "1-ff00:0:110", "linkAtoB": "CHILD"}],
+    }],
+}
+
+
+class GroupsTest(unittest.TestCase):
+    def test_iter_ases(self):
+        ases = list(groups.iter_ases(TOPO))
+        self.assertEqual([ia for ia, _ in ases], [
+            "1-ff00:0:110", "1-ff00:0:1000", "1-ff00:0:1001", "1-ff00:0:2000"])
+        self.assertEqual(ases[1][1], {"cert_issuer": "1-ff00:0:110"})
+
+    def test_iter_links(self):
+        links = list(groups.iter_links(TOPO))
+        self.assertEqual(len(links), 4)
+        self.assertEqual(links[3], {"a": "1-ff00:0:110", "b": "1-ff00:0:2000",
+                                    "linkAtoB": "CHILD"})
+
+    def test_invalid_template(self):
+        topo = {"groups": [{"ases": "1-ff00:0:1000", "links": [{"linkAtoB": "CHILD"}]}]}
+        with self.assertRaises(SCIONParseError):
+            list(groups.iter_links(topo))
+
+    def test_parse_range(self):
+        self.assertEqual(groups.parse_range("1-ff00:0:1..1-ff00:0:3"),
+                         (groups.ISD_AS("1-ff00:0:1").int(), groups.ISD_AS("1-ff00:0:3").int()))
+        for raw in ("1-ff00:0:3..ff00:0:1", "1-ff00:0:1..2-ff00:0:3"):
+            with self.assertRaises(SCIONParseError):
+                groups.parse_range(raw)
+
+    def test_expanded_topo(self):
+        topo = groups.expanded_topo(TOPO, links=False)
+        self.assertNotIn("groups", topo)
+        self.assertNotIn("links", topo)
+        self.assertEqual(len(topo["ASes"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
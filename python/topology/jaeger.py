@@ -13,12 +13,12 @@
 # limitations under the License.
 
 import os
-import yaml
 
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsTopoDicts,
 )
+from python.topology.serialization import dump_yaml
 
 JAEGER_DC = 'jaeger-dc.yml'
 
@@ -31,16 +31,15 @@ class JaegerGenerator(object):
 
     def __init__(self, args):
         self.args = args
-        output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
         self.local_jaeger_dir = os.path.join('traces')
-        self.docker_jaeger_dir = os.path.join(output_base, self.local_jaeger_dir)
+        self.docker_jaeger_dir = os.path.join(self.args.host.output_base, self.local_jaeger_dir)
 
     def generate(self):
         dc_conf = self._generate_dc()
         os.makedirs(os.path.join(self.local_jaeger_dir, 'data'), exist_ok=True)
         os.makedirs(os.path.join(self.local_jaeger_dir, 'key'), exist_ok=True)
         write_file(os.path.join(self.args.output_dir, JAEGER_DC),
-                   yaml.dump(dc_conf, default_flow_style=False))
+                   dump_yaml(dc_conf))
 
     def _generate_dc(self):
         name = 'jaeger'
@@ -50,7 +49,7 @@ class JaegerGenerator(object):
                 'jaeger': {
                     'image': 'jaegertracing/all-in-one:1.22.0',
                     'container_name': name,
-                    'user': '%s:%s' % (str(os.getuid()), str(os.getgid())),
+                    'user': self.args.host.user,
                     'ports': [
                         '6831:6831/udp',
                         '16686:16686'
@@ -0,0 +1,176 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`manifest` --- SCION topology generation manifest
+======================================================
+
+Support for incremental topology generation. The manifest records the hashes
+of the generator inputs per AS and of every generated file. On a rerun, ASes
+with unchanged inputs are skipped, and only files whose content changed are
+written, so that their mtimes stay stable.
+"""
+# Stdlib
+import hashlib
+import json
+import logging
+import os
+import threading
+
+# SCION
+from python.lib.util import WriteSink
+
+MANIFEST_FILE = '.topogen-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def content_hash(data) -> str:
+    """
+    Returns the hex sha256 of a string, or of the canonical JSON encoding of any
+    other value.
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class Manifest(object):
+    """
+    Hashes of the files and of the per AS inputs of a generator run.
+    File paths are relative to the output directory.
+    """
+    def __init__(self, files=None, ases=None, crypto=None):
+        """
+        :param dict files: File path to content hash.
+        :param dict ases: AS to a dict with the input hash of its Go configs
+            ("go_hash") and the files generated from them ("go_files").
+        :param str crypto: Hash of the inputs of the crypto generation.
+        """
+        self.files = files or {}
+        self.ases = ases or {}
+        self.crypto = crypto
+
+    @classmethod
+    def load(cls, output_dir: str) -> 'Manifest':
+        """
+        Loads the manifest of the previous run, or returns an empty one.
+        """
+        path = os.path.join(output_dir, MANIFEST_FILE)
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring invalid manifest %s: %s", path, e)
+            return cls()
+        if raw.get('version') != MANIFEST_VERSION:
+            return cls()
+        return cls(raw.get('files'), raw.get('ases'), raw.get('crypto'))
+
+    def dumps(self) -> str:
+        return json.dumps({
+            'version': MANIFEST_VERSION,
+            'crypto': self.crypto,
+            'ases': self.ases,
+            'files': self.files,
+        }, sort_keys=True, indent=1)
+
+
+class IncrementalWriter(WriteSink):
+    """
+    write_file sink that only writes files whose content differs from the
+    previous run. The previous content is known from the old manifest, the
+    files are not read.
+
+    On close, the files of the previous run that were neither written nor kept
+    are removed, and the new manifest is written. If generation fails, the old
+    manifest is removed, so that the next run writes all files.
+    """
+    def __init__(self, output_dir: str, old: Manifest, new: Manifest):
+        self.output_dir = output_dir
+        self.old = old
+        self.new = new
+        self.written = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        # Recording is per thread, as the generator stages run concurrently.
+        self._local = threading.local()
+
+    def rel(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.output_dir)
+
+    def write(self, file_path, text):
+        rel = self.rel(file_path)
+        digest = content_hash(text)
+        recorded = getattr(self._local, 'recorded', None)
+        if recorded is not None:
+            recorded.append(rel)
+        unchanged = self.old.files.get(rel) == digest and os.path.exists(file_path)
+        with self._lock:
+            self.new.files[rel] = digest
+            if unchanged:
+                self.unchanged += 1
+            else:
+                self.written += 1
+        if not unchanged:
+            self.forward(file_path, text)
+
+    def keep(self, rel: str) -> bool:
+        """
+        Keeps a file of the previous run, which was not generated again.
+
+        :returns: False if the file does not exist anymore.
+        """
+        if rel not in self.old.files or \
+                not os.path.exists(os.path.join(self.output_dir, rel)):
+            return False
+        with self._lock:
+            self.new.files[rel] = self.old.files[rel]
+        return True
+
+    def record(self):
+        """
+        Starts recording the paths of the files written by the current thread.
+        """
+        self._local.recorded = []
+
+    def stop_recording(self):
+        """
+        Stops recording, and returns the recorded paths.
+        """
+        recorded, self._local.recorded = self._local.recorded, None
+        return recorded
+
+    def close(self):
+        removed = 0
+        for rel in self.old.files:
+            if rel in self.new.files:
+                continue
+            try:
+                os.remove(os.path.join(self.output_dir, rel))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        logging.info("Incremental generation: %d files written, %d unchanged, %d removed",
+                     self.written, self.unchanged, removed)
+        text = self.new.dumps()
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        if text != self.old.dumps() or not os.path.exists(path):
+            self.forward(path, text)
+
+    def abort(self):
+        try:
+            os.remove(os.path.join(self.output_dir, MANIFEST_FILE))
+        except FileNotFoundError:
+            pass
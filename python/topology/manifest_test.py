@@ -0,0 +1,77 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`manifest_test` --- topology.manifest unit tests
+=====================================================
+"""
+# Stdlib
+import os
+import tempfile
+import unittest
+
+# SCION
+from python.lib.util import write_file
+from python.topology.manifest import (
+    IncrementalWriter,
+    Manifest,
+    MANIFEST_FILE,
+)
+
+
+class TestIncrementalWriter(unittest.TestCase):
+    """
+    Unit tests for topology.manifest.IncrementalWriter
+    """
+    def _run(self, out, files, keep=()):
+        with IncrementalWriter(out, Manifest.load(out), Manifest()) as w:
+            for path, text in files.items():
+                write_file(os.path.join(out, path), text)
+            kept = [w.keep(path) for path in keep]
+        return w, kept
+
+    def test_rerun(self):
+        with tempfile.TemporaryDirectory() as out:
+            w, _ = self._run(out, {"a/x": "1", "a/y": "2", "z": "3"})
+            self.assertEqual((w.written, w.unchanged), (3, 0))
+            os.utime(os.path.join(out, "a", "x"), (0, 0))
+            w, kept = self._run(out, {"a/x": "1", "a/y": "changed"}, keep=["z", "missing"])
+            self.assertEqual((w.written, w.unchanged), (1, 1))
+            self.assertEqual(kept, [True, False])
+            # The unchanged file was not rewritten.
+            self.assertEqual(os.stat(os.path.join(out, "a", "x")).st_mtime, 0)
+            with open(os.path.join(out, "a", "y")) as f:
+                self.assertEqual(f.read(), "changed")
+            self.assertEqual(Manifest.load(out).files.keys(), {"a/x", "a/y", "z"})
+
+    def test_stale_and_deleted(self):
+        with tempfile.TemporaryDirectory() as out:
+            self._run(out, {"x": "1", "y": "2"})
+            os.remove(os.path.join(out, "x"))
+            w, _ = self._run(out, {"x": "1"})
+            # Deleted files are written again, files that are not generated anymore are removed.
+            self.assertEqual(w.written, 1)
+            self.assertTrue(os.path.exists(os.path.join(out, "x")))
+            self.assertFalse(os.path.exists(os.path.join(out, "y")))
+
+    def test_abort(self):
+        with tempfile.TemporaryDirectory() as out:
+            self._run(out, {"x": "1"})
+            with self.assertRaises(RuntimeError):
+                with IncrementalWriter(out, Manifest.load(out), Manifest()):
+                    raise RuntimeError
+            self.assertFalse(os.path.exists(os.path.join(out, MANIFEST_FILE)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,10 +17,15 @@
 =============================================
 """
 # Stdlib
+import heapq
 import logging
 import math
+import os
+import re
 import sys
+from array import array
 from collections import defaultdict
+from collections.abc import Mapping as MappingABC
 from ipaddress import (
     ip_interface,
     ip_network,
@@ -31,17 +36,21 @@ from ipaddress import (
     IPv4Interface,
     IPv6Interface,
 )
-from typing import Mapping, Union
+from typing import List, Mapping, Optional, Tuple, Union
 
 # External packages
 import yaml
 
 # SCION
 from python.lib.defines import DEFAULT6_NETWORK_ADDR
+from python.topology.serialization import add_yaml_representer
 
 DEFAULT_NETWORK = "127.0.0.0/8"
 DEFAULT_PRIV_NETWORK = "192.168.0.0/16"
 DEFAULT_SCN_DC_NETWORK = "172.20.0.0/20"
+DEFAULT_PORT_RANGES = [(31000, 34999)]
+# The state of listening sockets in /proc/net/tcp.
+LISTEN = "0A"
 
 IPAddress = Union[IPv4Address, IPv6Address]
 IPNetwork = Union[IPv4Network, IPv6Network]
@@ -73,15 +82,83 @@ class AddressProxy(yaml.YAMLObject):
         return dumper.represent_scalar('tag:yaml.org,2002:str', str(inst.ip))
 
 
+class HostRef(object):
+    """
+    Reference to the address of an element in a compact AddressGenerator.
+
+    Like AddressProxy, but the address is only materialized when accessed.
+    """
+    __slots__ = ('_gen', '_idx')
+
+    def __init__(self, gen: 'AddressGenerator', idx: int):
+        self._gen = gen
+        self._idx = idx
+
+    @property
+    def ip(self) -> Optional[IPAddress]:
+        return self._gen.host_ip(self._idx)
+
+    def __str__(self):
+        return str(self._gen.host_intf(self._idx))
+
+
+add_yaml_representer(AddressProxy, AddressProxy.to_yaml)
+add_yaml_representer(
+    HostRef, lambda dumper, inst: dumper.represent_scalar('tag:yaml.org,2002:str', str(inst.ip)))
+
+
+class HostMap(MappingABC):
+    """
+    Read-only element id to interface mapping of a compact AddressGenerator.
+    The interfaces are created on access.
+    """
+    def __init__(self, gen: 'AddressGenerator'):
+        self._gen = gen
+
+    def __getitem__(self, elem: str) -> IPInterface:
+        return self._gen.host_intf(self._gen.index[elem])
+
+    def __contains__(self, elem):
+        return elem in self._gen.index
+
+    def __iter__(self):
+        return iter(self._gen.sorted_elems)
+
+    def __len__(self):
+        return len(self._gen.index)
+
+
 class AddressGenerator(object):
-    def __init__(self, docker):
-        self._addrs = defaultdict(lambda: AddressProxy())
+    def __init__(self, docker, compact=False):
+        """
+        :param bool docker: Whether the docker backend is used.
+        :param bool compact: Store the element addresses as integer offsets into
+            the subnet instead of creating address objects for every element.
+        """
         self.docker = docker
-
-    def register(self, id_: str) -> AddressProxy:
-        return self._addrs[id_]
+        self.compact = compact
+        if not compact:
+            self._addrs = defaultdict(lambda: AddressProxy())
+            return
+        self.index = {}  # type: Mapping[str, int]
+        self.sorted_elems = ()
+        self._offsets = array('I')
+        self._subnet = None
+        self._base = 0
+        self._addr_cls = None
+
+    def register(self, id_: str) -> Union[AddressProxy, HostRef]:
+        if not self.compact:
+            return self._addrs[id_]
+        idx = self.index.get(id_)
+        if idx is None:
+            idx = self.index[id_] = len(self._offsets)
+            self._offsets.append(0)
+        return HostRef(self, idx)
 
     def alloc_addrs(self, subnet) -> Mapping[str, IPInterface]:
+        if self.compact:
+            return self._alloc_offsets(subnet)
         hosts = subnet.hosts()
         interfaces = {}
         # With the docker backend, docker itself claims the first ip of every network
@@ -93,13 +170,153 @@ class AddressGenerator(object):
             proxy.set_intf(intf)
         return interfaces
 
+    def _alloc_offsets(self, subnet) -> HostMap:
+        # Same addresses as subnet.hosts(): all addresses of /31 (/127) and /32
+        # (/128) networks, and all but the network address otherwise.
+        first = 0 if subnet.prefixlen >= subnet.max_prefixlen - 1 else 1
+        # With the docker backend, docker itself claims the first ip of every network
+        if self.docker:
+            first += 1
+        self.sorted_elems = tuple(sorted(self.index))
+        if first + len(self.sorted_elems) > subnet.num_addresses:
+            raise ValueError("Subnet %s too small for %d hosts" % (subnet, len(self)))
+        for offset, elem in enumerate(self.sorted_elems, first):
+            self._offsets[self.index[elem]] = offset
+        self._subnet = subnet
+        self._base = int(subnet.network_address)
+        self._addr_cls = type(subnet.network_address)
+        return HostMap(self)
+
+    def host_ip(self, idx: int) -> Optional[IPAddress]:
+        if self._subnet is None:
+            return None
+        return self._addr_cls(self._base + self._offsets[idx])
+
+    def host_intf(self, idx: int) -> Optional[IPInterface]:
+        ip = self.host_ip(idx)
+        if ip is None:
+            return None
+        return ip_interface("%s/%s" % (ip, self._subnet.prefixlen))
+
     def __len__(self):
+        if self.compact:
+            return len(self._offsets)
         return len(self._addrs)
 
 
+SUBNET_ALLOC_COMPAT = "compat"
+SUBNET_ALLOC_BEST_FIT = "best-fit"
+SUBNET_ALLOC_MODES = (SUBNET_ALLOC_COMPAT, SUBNET_ALLOC_BEST_FIT)
+
+
+class BuddyAllocator(object):
+    """
+    Buddy allocator for the address space of an IP network.
+
+    Blocks are represented by their integer base address, kept in free lists
+    per prefix length. Allocating a block splits the smallest sufficient free
+    block, returning the buddies on the way down to the free lists.
+
+    In compat mode, free blocks of the same size are reused last-in-first-out,
+    which results in the same allocations as the previous ipaddress based
+    allocator. In best-fit mode, the free block with the lowest address is used,
+    which keeps the allocated space contiguous.
+    """
+    def __init__(self, net: IPNetwork, best_fit: bool = False):
+        self.net = net
+        self.best_fit = best_fit
+        self._max_prefixlen = net.max_prefixlen
+        self._addr_cls = type(net.network_address)
+        self._free = defaultdict(list)  # type: Mapping[int, List[int]]
+        self.reserved = 0
+        self.allocated = 0
+        self._put(int(net.network_address), net.prefixlen)
+
+    def block_size(self, prefixlen: int) -> int:
+        return 1 << (self._max_prefixlen - prefixlen)
+
+    def alloc(self, prefixlen: int) -> Optional[int]:
+        """
+        Allocates a block of the given prefix length.
+
+        :returns: The base address of the block, or None if there is no space left.
+        """
+        for prefix in range(prefixlen, self.net.prefixlen - 1, -1):
+            if not self._free.get(prefix):
+                # No blocks available at this size
+                continue
+            addr = self._take(prefix)
+            self._split(addr, prefix, addr, prefixlen)
+            self.allocated += self.block_size(prefixlen)
+            return addr
+        return None
+
+    def reserve(self, net: IPNetwork):
+        """
+        Removes the given network from the free space, e.g. to exclude
+        addresses that must not be allocated.
+        """
+        addr = int(net.network_address)
+        for prefix in range(net.prefixlen, self.net.prefixlen - 1, -1):
+            block = addr & ~(self.block_size(prefix) - 1)
+            free = self._free.get(prefix)
+            if not free or block not in free:
+                continue
+            free.remove(block)
+            if self.best_fit:
+                heapq.heapify(free)
+            self._split(block, prefix, addr, net.prefixlen)
+            self.reserved += net.num_addresses
+            return
+        raise ValueError("%s is not available in %s" % (net, self.net))
+
+    def network(self, addr: int, prefixlen: int) -> IPNetwork:
+        # Constructed from the string form, as hosts() is broken for networks
+        # constructed from a tuple in python 3.5 (https://bugs.python.org/issue27683).
+        return ip_network('%s/%i' % (self._addr_cls(addr), prefixlen))
+
+    def utilization(self) -> Mapping[str, int]:
+        """
+        Returns the number of total, reserved, allocated and free addresses,
+        and the prefix length of the largest free block (None if full).
+        """
+        free_prefixes = [p for p, blocks in self._free.items() if blocks]
+        total = self.net.num_addresses
+        return {
+            "total": total,
+            "reserved": self.reserved,
+            "allocated": self.allocated,
+            "free": total - self.reserved - self.allocated,
+            "largest_free_prefixlen": min(free_prefixes) if free_prefixes else None,
+        }
+
+    def _put(self, addr, prefixlen):
+        if self.best_fit:
+            heapq.heappush(self._free[prefixlen], addr)
+        else:
+            self._free[prefixlen].append(addr)
+
+    def _take(self, prefixlen):
+        if self.best_fit:
+            return heapq.heappop(self._free[prefixlen])
+        return self._free[prefixlen].pop()
+
+    def _split(self, addr, prefixlen, target, target_prefixlen):
+        """
+        Splits the free block addr/prefixlen down to the contained block
+        target/target_prefixlen, returning the buddies of every level, from
+        the largest to the smallest, to the free lists.
+        """
+        for prefix in range(prefixlen + 1, target_prefixlen + 1):
+            size = self.block_size(prefix)
+            self._put((target & ~(size - 1)) ^ size, prefix)
+
+
 class SubnetGenerator(object):
-    def __init__(self, network: str, docker: bool):
+    def __init__(self, network: str, docker: bool, alloc_mode: str = SUBNET_ALLOC_COMPAT,
+                 compact: bool = False):
         self.docker = docker
+        self.compact = compact
         if self.docker and network == DEFAULT_NETWORK:
             network = DEFAULT_SCN_DC_NETWORK
         if "/" not in network:
@@ -110,9 +327,13 @@ class SubnetGenerator(object):
         except ValueError:
             logging.critical("Invalid network '%s'", network)
             sys.exit(1)
-        self._subnets = defaultdict(lambda: AddressGenerator(self.docker)) \
+        if alloc_mode not in SUBNET_ALLOC_MODES:
+            logging.critical("Invalid subnet allocation mode '%s'", alloc_mode)
+            sys.exit(1)
+        self.alloc_mode = alloc_mode
+        self._subnets = defaultdict(lambda: AddressGenerator(self.docker, self.compact)) \
             # type: Mapping[str, AddressGenerator]
-        self._allocations = defaultdict(list)
+        self._allocator = BuddyAllocator(self._net, alloc_mode == SUBNET_ALLOC_BEST_FIT)
         # Initialise the allocations with the supplied network, making sure to
         # exclude 127.0.0.0/30 (for v4) and DEFAULT6_NETWORK_ADDR/126 (for v6)
         # if it's contained in the network.
@@ -125,81 +346,267 @@ class SubnetGenerator(object):
             exclude = ip_network(DEFAULT6_NETWORK_ADDR + "/126")
 
         if self._net.overlaps(exclude):
-            self._exclude_net(self._net, exclude)
-            return
-
-        self._allocations[self._net.prefixlen].append(self._net)
+            if exclude.prefixlen < self._net.prefixlen:
+                logging.critical("Network '%s' is contained in the excluded network %s",
+                                 network, exclude)
+                sys.exit(1)
+            self._allocator.reserve(exclude)
 
     def register(self, location: str) -> AddressGenerator:
         return self._subnets[location]
 
     def alloc_subnets(self) -> Mapping[IPNetwork, NetworkDescription]:
-        max_prefix = self._net.max_prefixlen
-        networks = {}
+        requests = []
         for topo, subnet in sorted(self._subnets.items(), key=lambda x: str(x)):
-            if not self.docker:
-                # Figure out what size subnet we need. If it's a link, then we just
-                # need a /31 (or /127), otherwise add 2 to the subnet size to cover
-                # the network and broadcast addresses.
-                if len(subnet) == 2:
-                    req_prefix = max_prefix - 1
-                else:
-                    req_prefix = max_prefix - math.ceil(math.log2(len(subnet) + 2))
-            else:
-                # Docker needs space for a network and broadcast address as well as an IP linking
-                # to the host
-                req_prefix = max_prefix - math.ceil(math.log2(len(subnet) + 3))
-
-            # Search all subnets from that size upwards
-            for prefix in range(req_prefix, -1, -1):
-                if not self._allocations[prefix]:
-                    # No subnets available at this size
-                    continue
-                alloc = self._allocations[prefix].pop()
-                # Carve out subnet of the required size
-                new_net = next(alloc.subnets(new_prefix=req_prefix))
-                new_net = _workaround_ip_network_hosts_py35(new_net)
-                logging.debug("Allocating %s from %s for subnet size %d" %
-                              (new_net, alloc, len(subnet)))
-                networks[new_net] = NetworkDescription(topo, subnet.alloc_addrs(new_net))
-                # Repopulate the allocations list with the left-over space
-                self._exclude_net(alloc, new_net)
-                break
-            else:
-                logging.critical("Unable to allocate /%d subnet" % req_prefix)
+            requests.append((topo, subnet, self._req_prefix(subnet)))
+        alloc_order = requests
+        if self.alloc_mode == SUBNET_ALLOC_BEST_FIT:
+            # Allocate the largest subnets first. As all blocks are aligned
+            # powers of two, this packs the subnets without any gaps.
+            alloc_order = sorted(requests, key=lambda r: r[2])
+        allocs = {}
+        for topo, subnet, req_prefix in alloc_order:
+            addr = self._allocator.alloc(req_prefix)
+            if addr is None:
+                logging.critical("Unable to allocate /%d subnet in %s (%s)",
+                                 req_prefix, self._net, self.utilization())
                 sys.exit(1)
+            allocs[topo] = addr
+        networks = {}
+        for topo, subnet, req_prefix in requests:
+            new_net = self._allocator.network(allocs[topo], req_prefix)
+            logging.debug("Allocating %s for subnet size %d" % (new_net, len(subnet)))
+            networks[new_net] = NetworkDescription(topo, subnet.alloc_addrs(new_net))
+        logging.debug("Subnet utilization of %s: %s", self._net, self.utilization())
         return networks
 
-    def _exclude_net(self, alloc, net):
-        for net in alloc.address_exclude(net):
-            self._allocations[net.prefixlen].append(net)
+    def utilization(self) -> Mapping[str, int]:
+        """
+        Returns the address space utilization, see BuddyAllocator.utilization.
+        """
+        return self._allocator.utilization()
 
+    def _req_prefix(self, subnet: AddressGenerator) -> int:
+        max_prefix = self._net.max_prefixlen
+        if not self.docker:
+            # Figure out what size subnet we need. If it's a link, then we just
+            # need a /31 (or /127), otherwise add 2 to the subnet size to cover
+            # the network and broadcast addresses.
+            if len(subnet) == 2:
+                return max_prefix - 1
+            return max_prefix - math.ceil(math.log2(len(subnet) + 2))
+        # Docker needs space for a network and broadcast address as well as an IP linking
+        # to the host
+        return max_prefix - math.ceil(math.log2(len(subnet) + 3))
+
+
+class AddressRegistry(object):
+    """
+    Index of the allocated element addresses, by element id, by AS and by role.
 
-class PortGenerator(object):
-    def __init__(self):
-        self.iter = iter(range(31000, 35000))
-        self._ports = defaultdict(lambda: next(self.iter))
+    Element ids follow the naming scheme of the TopoGenerator, i.e. a role
+    prefix followed by the AS in file format (e.g. "cs1-ff00_0_110-1",
+    "br1-ff00_0_110-1_internal" or "tester_1-ff00_0_110"). Auxiliary IPv4
+    addresses allocated for IPv6 docker networks ("_v4" suffix) can be looked up
+    by element id, but are not indexed by AS or role.
+    """
+    _ELEM_RE = re.compile(r'^(?P<role>[a-z]+)_?(?P<ia>\d+-[0-9a-f_]+)')
+    AUX_SUFFIX = '_v4'
+
+    def __init__(self, networks: Mapping[IPNetwork, NetworkDescription]):
+        """
+        :param dict networks: The allocated networks from SubnetGenerator.alloc_subnets.
+        """
+        # Element id to the networks and their element id to interface
+        # mappings, so that compact interfaces are only created on lookup.
+        self._elems = defaultdict(list)  # type: Mapping[str, List[Tuple[IPNetwork, Mapping]]]
+        self._by_as_role = defaultdict(list)  # type: Mapping[Tuple[str, str], List[str]]
+        self._by_as = defaultdict(list)  # type: Mapping[str, List[str]]
+        self._by_role = defaultdict(list)  # type: Mapping[str, List[str]]
+        for net, net_desc in networks.items():
+            for elem in net_desc.ip_net:
+                self._add(elem, net, net_desc.ip_net)
+
+    def _add(self, elem, net, ip_net):
+        new = elem not in self._elems
+        self._elems[elem].append((net, ip_net))
+        if not new or elem.endswith(self.AUX_SUFFIX):
+            return
+        role, ia = self.split_elem(elem)
+        if role is None:
+            return
+        self._by_as_role[(ia, role)].append(elem)
+        self._by_as[ia].append(elem)
+        self._by_role[role].append(elem)
+
+    @classmethod
+    def split_elem(cls, elem: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Splits an element id into its role and the AS in file format.
+        """
+        m = cls._ELEM_RE.match(elem)
+        if not m:
+            return None, None
+        return m.group('role'), m.group('ia')
+
+    def addrs(self, elem: str) -> List[Tuple[IPNetwork, IPInterface]]:
+        """
+        Returns all (network, interface) pairs allocated for the element.
+        """
+        return [(net, ip_net[elem]) for net, ip_net in self._elems.get(elem, [])]
+
+    def ip(self, elem: str) -> Optional[IPAddress]:
+        """
+        Returns the first address allocated for the element, or None.
+        """
+        addrs = self._elems.get(elem)
+        if not addrs:
+            return None
+        return addrs[0][1][elem].ip
+
+    def net(self, elem: str) -> Optional[IPNetwork]:
+        """
+        Returns the network of the first address allocated for the element, or None.
+        """
+        addrs = self._elems.get(elem)
+        if not addrs:
+            return None
+        return addrs[0][0]
+
+    def elems(self, topo_id=None, role: str = None) -> List[str]:
+        """
+        Returns the ids of the elements of the given AS and/or role, in
+        allocation order.
+
+        :param TopoID topo_id: The AS, or None for all ASes.
+        :param str role: The role prefix of the element ids, e.g. "co", or None for all roles.
+        """
+        if topo_id is None and role is None:
+            return [e for e in self._elems if not e.endswith(self.AUX_SUFFIX)]
+        if topo_id is None:
+            return self._by_role.get(role, [])
+        ia = topo_id.file_fmt()
+        if role is None:
+            return self._by_as.get(ia, [])
+        return self._by_as_role.get((ia, role), [])
+
+    def __contains__(self, elem):
+        return elem in self._elems
+
+
+class PortAllocator(object):
+    """
+    Allocates a block of BLOCK consecutive ports per element: the port of the element, followed by
+    its QUIC port. The blocks are taken in order from a list of port ranges.
+
+    The ports of a port plan, i.e. the ports of an earlier run, are kept for the elements in the
+    plan, and never handed to other elements. With check_host, blocks with ports that are bound on
+    the host are skipped. Plan ports are used even if bound, as they are typically bound by the
+    services of the earlier run.
+    """
+    BLOCK = 2
+
+    def __init__(self, ranges: List[Tuple[int, int]] = None, plan: Mapping[str, int] = None,
+                 check_host: bool = False):
+        """
+        :param ranges: The inclusive (first, last) port ranges, by default DEFAULT_PORT_RANGES.
+        :param plan: The ports of an earlier run, by element.
+        :param check_host: Skip the ports bound on the host.
+        """
+        self._ranges = ranges or DEFAULT_PORT_RANGES
+        self._plan = dict(plan or {})
+        self._ports = {}
+        self._taken = set()
+        for elem, port in sorted(self._plan.items()):
+            block = range(port, port + self.BLOCK)
+            if not self._taken.isdisjoint(block):
+                logging.critical("Port plan assigns port %d to more than one element (%s)",
+                                 port, elem)
+                sys.exit(1)
+            self._taken.update(block)
+        if check_host:
+            self._taken.update(host_bound_ports())
+        self._blocks = self._free_blocks()
 
     def register(self, id_: str) -> int:
-        p = self._ports[id_]
-        # reserve a quic port
-        self._ports[id_+"quic"]
-        return p
+        port = self._ports.get(id_)
+        if port is None:
+            port = self._plan.get(id_)
+            if port is None:
+                port = next(self._blocks, None)
+                if port is None:
+                    logging.critical("No free ports left in %s", ", ".join(
+                        "%d-%d" % r for r in self._ranges))
+                    sys.exit(1)
+            self._ports[id_] = port
+        return port
+
+    def plan(self) -> Mapping[str, int]:
+        """
+        Returns the ports of the registered elements.
+        """
+        return dict(self._ports)
+
+    @staticmethod
+    def load_plan(path: str) -> Mapping[str, int]:
+        """
+        Loads a port plan written by save_plan. A missing file is an empty plan.
+        """
+        try:
+            with open(path) as f:
+                return yaml.load(f, Loader=yaml.SafeLoader) or {}
+        except FileNotFoundError:
+            return {}
+
+    def save_plan(self, path: str):
+        """
+        Atomically writes the ports of the registered elements to path. The plan is not written
+        through the write sinks of the generated files, it outlives the output directory.
+        """
+        tmp = "%s.tmp" % path
+        with open(tmp, "w") as f:
+            yaml.dump(self.plan(), f, default_flow_style=False)
+        os.replace(tmp, path)
+
+    def _free_blocks(self):
+        for first, last in self._ranges:
+            for port in range(first, last - self.BLOCK + 2, self.BLOCK):
+                if self._taken.isdisjoint(range(port, port + self.BLOCK)):
+                    yield port
+
+
+def parse_port_range(raw: str) -> Tuple[int, int]:
+    """
+    Parses a port range of the form "first-last", e.g. "31000-34999".
+    """
+    first, sep, last = raw.partition("-")
+    rng = (int(first), int(last if sep else first))
+    if not 0 < rng[0] <= rng[1] <= 65535:
+        raise ValueError("Invalid port range '%s'" % raw)
+    return rng
+
+
+def host_bound_ports() -> List[int]:
+    """
+    Returns the listening TCP and bound UDP ports on the host, read from /proc/net. Returns an
+    empty list if /proc/net is not available.
+    """
+    ports = []
+    for proto, state in (("tcp", LISTEN), ("tcp6", LISTEN), ("udp", None), ("udp6", None)):
+        try:
+            with open(os.path.join("/proc/net", proto)) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            # sl local_address rem_address st ...
+            fields = line.split()
+            if state is None or fields[3] == state:
+                ports.append(int(fields[1].rsplit(":", 1)[1], 16))
+    return ports
 
 
 def socket_address_str(ip: IPAddress, port: int) -> str:
     if ip.version == 4:
         return "%s:%d" % (ip, port)
     return "[%s]:%d" % (ip, port)
-
-
-def _workaround_ip_network_hosts_py35(net: IPNetwork) -> IPNetwork:
-    """
-    Returns an _identical_ ipaddress.ip_network for which hosts() which will work as it should.
-
-    This works around a regression in python 3.5, where the behaviour of hosts was broken
-    when using a certain form of the ip_network constructor.
-    This regression is fixed in python 3.6.6 / 3.7.0.
-    See https://bugs.python.org/issue27683
-    """
-    return ip_network('%s/%i' % (net.network_address, net.prefixlen))
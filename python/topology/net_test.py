@@ -0,0 +1,190 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`net_test` --- topology.net unit tests
+=====================================================
+"""
+# Stdlib
+import os
+import tempfile
+import unittest
+from ipaddress import ip_network
+
+# SCION
+from python.topology.common import TopoID
+from python.topology.net import (
+    AddressGenerator,
+    AddressRegistry,
+    BuddyAllocator,
+    parse_port_range,
+    PortAllocator,
+    SubnetGenerator,
+    SUBNET_ALLOC_BEST_FIT,
+)
+
+
+class TestBuddyAllocator(unittest.TestCase):
+    """
+    Unit tests for topology.net.BuddyAllocator
+    """
+    def _allocs(self, allocator, prefixes):
+        return [str(allocator.network(allocator.alloc(p), p)) for p in prefixes]
+
+    def test_compat(self):
+        allocator = BuddyAllocator(ip_network("127.0.0.0/8"))
+        allocator.reserve(ip_network("127.0.0.0/30"))
+        # Same allocations as carving the first subnet of the last free block.
+        self.assertEqual(self._allocs(allocator, [29, 29, 31, 28]),
+                         ["127.0.0.8/29", "127.0.0.16/29", "127.0.0.4/31", "127.0.0.32/28"])
+
+    def test_best_fit(self):
+        allocator = BuddyAllocator(ip_network("10.0.0.0/24"), best_fit=True)
+        self.assertEqual(self._allocs(allocator, [26, 28, 28, 30]),
+                         ["10.0.0.0/26", "10.0.0.64/28", "10.0.0.80/28", "10.0.0.96/30"])
+
+    def test_exhausted(self):
+        allocator = BuddyAllocator(ip_network("10.0.0.0/30"))
+        self.assertEqual(self._allocs(allocator, [31, 31]), ["10.0.0.0/31", "10.0.0.2/31"])
+        self.assertIsNone(allocator.alloc(31))
+        self.assertEqual(allocator.utilization(), {
+            "total": 4, "reserved": 0, "allocated": 4, "free": 0,
+            "largest_free_prefixlen": None,
+        })
+
+    def test_reserve(self):
+        allocator = BuddyAllocator(ip_network("fd00::/120"), best_fit=True)
+        allocator.reserve(ip_network("fd00::4/126"))
+        self.assertEqual(self._allocs(allocator, [126, 126]), ["fd00::/126", "fd00::8/126"])
+        self.assertEqual(allocator.utilization()["free"], 256 - 12)
+        with self.assertRaises(ValueError):
+            allocator.reserve(ip_network("fd00::/127"))
+
+
+class TestSubnetGenerator(unittest.TestCase):
+    """
+    Unit tests for topology.net.SubnetGenerator
+    """
+    def test_best_fit(self):
+        gen = SubnetGenerator("172.20.0.0/20", True, SUBNET_ALLOC_BEST_FIT)
+        gen.register("a").register("a1")
+        big = gen.register("b")
+        for i in range(20):
+            big.register("b%d" % i)
+        networks = gen.alloc_subnets()
+        # Larger subnets are allocated first, the result keeps the request order.
+        self.assertEqual([(str(net), desc.name) for net, desc in networks.items()],
+                         [("172.20.0.32/30", "a"), ("172.20.0.0/27", "b")])
+        self.assertEqual(gen.utilization()["allocated"], 36)
+
+
+class TestAddressGenerator(unittest.TestCase):
+    """
+    Unit tests for topology.net.AddressGenerator
+    """
+    def _alloc(self, subnet, docker, compact):
+        gen = AddressGenerator(docker, compact)
+        refs = [gen.register(elem) for elem in ("sd1", "cs1-1", "br1-1", "cs1-1")]
+        return gen.alloc_addrs(ip_network(subnet)), refs
+
+    def test_compact(self):
+        for subnet, docker in (("127.0.0.8/29", False), ("172.20.0.8/29", True),
+                               ("fd00::/125", False), ("fd00::8/125", True)):
+            with self.subTest(subnet=subnet, docker=docker):
+                intfs, refs = self._alloc(subnet, docker, False)
+                compact_intfs, compact_refs = self._alloc(subnet, docker, True)
+                self.assertEqual(list(compact_intfs.items()), list(intfs.items()))
+                self.assertEqual([r.ip for r in compact_refs], [r.ip for r in refs])
+                self.assertEqual([str(r) for r in compact_refs], [str(r) for r in refs])
+
+    def test_compact_unallocated(self):
+        ref = AddressGenerator(False, True).register("sd1")
+        self.assertIsNone(ref.ip)
+
+
+class TestAddressRegistry(unittest.TestCase):
+    """
+    Unit tests for topology.net.AddressRegistry
+    """
+    def _networks(self):
+        gen = SubnetGenerator("127.0.0.0/8", False)
+        as_net = gen.register("1-ff00:0:110")
+        for elem in ("cs1-ff00_0_110-1", "co1-ff00_0_110-1", "co1-ff00_0_110-2",
+                     "sd1-ff00_0_110", "br1-ff00_0_110-1_internal"):
+            as_net.register(elem)
+        gen.register("1-ff00:0:111").register("sd1-ff00_0_111")
+        link = gen.register("br1-ff00_0_110-1<->br1-ff00_0_111-1")
+        link.register("br1-ff00_0_110-1")
+        link.register("br1-ff00_0_111-1")
+        gen.register("1-ff00:0:110_v4").register("sd1-ff00_0_110_v4")
+        return gen.alloc_subnets()
+
+    def test_lookup(self):
+        networks = self._networks()
+        registry = AddressRegistry(networks)
+        for net, net_desc in networks.items():
+            for elem, intf in net_desc.ip_net.items():
+                self.assertEqual(registry.ip(elem), intf.ip)
+                self.assertIn((net, intf), registry.addrs(elem))
+        self.assertIsNone(registry.ip("sd1-ff00_0_112"))
+        link_net = registry.net("br1-ff00_0_110-1")
+        self.assertEqual(link_net.prefixlen, 31)
+        self.assertIn(registry.ip("br1-ff00_0_111-1"), link_net)
+
+    def test_elems(self):
+        registry = AddressRegistry(self._networks())
+        topo_id = TopoID("1-ff00:0:110")
+        self.assertEqual(registry.elems(topo_id, "co"),
+                         ["co1-ff00_0_110-1", "co1-ff00_0_110-2"])
+        self.assertEqual(sorted(registry.elems(role="sd")),
+                         ["sd1-ff00_0_110", "sd1-ff00_0_111"])
+        self.assertEqual(sorted(registry.elems(topo_id, "br")),
+                         ["br1-ff00_0_110-1", "br1-ff00_0_110-1_internal"])
+        self.assertEqual(len(registry.elems(topo_id)), 6)
+        self.assertEqual(registry.elems(TopoID("1-ff00:0:112")), [])
+
+
+class TestPortAllocator(unittest.TestCase):
+    """
+    Unit tests for topology.net.PortAllocator
+    """
+    def test_ranges(self):
+        alloc = PortAllocator([parse_port_range("100-104"), parse_port_range("200-201")])
+        # 104 does not fit a block.
+        self.assertEqual([alloc.register(e) for e in "abc"], [100, 102, 200])
+        with self.assertRaises(SystemExit):
+            alloc.register("d")
+
+    def test_plan(self):
+        alloc = PortAllocator([(100, 109)], plan={"b": 100, "x": 104})
+        self.assertEqual([alloc.register(e) for e in "abc"], [102, 100, 106])
+        self.assertEqual(alloc.register("a"), 102)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ports.yml")
+            self.assertEqual(PortAllocator.load_plan(path), {})
+            alloc.save_plan(path)
+            self.assertEqual(PortAllocator.load_plan(path), {"a": 102, "b": 100, "c": 106})
+        with self.assertRaises(SystemExit):
+            PortAllocator(plan={"a": 100, "b": 101})
+
+    def test_parse_port_range(self):
+        self.assertEqual(parse_port_range("31000-34999"), (31000, 34999))
+        self.assertEqual(parse_port_range("80"), (80, 80))
+        for raw in ("0-10", "10-5", "1-65536", "a-b"):
+            with self.subTest(raw=raw):
+                with self.assertRaises(ValueError):
+                    parse_port_range(raw)
+
+
+if __name__ == "__main__":
+    unittest.main()
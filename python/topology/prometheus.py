@@ -19,10 +19,6 @@
 # Stdlib
 import os
 from collections import defaultdict
-from typing import Mapping
-
-# External packages
-import yaml
 
 # SCION
 from python.lib.defines import DOCKER_COMPOSE_CONFIG_VERSION, PROM_FILE
@@ -33,10 +29,8 @@ from python.topology.common import (
     prom_addr_dispatcher,
     sciond_ip,
 )
-from python.topology.net import (
-    NetworkDescription,
-    IPNetwork,
-)
+from python.topology.net import AddressRegistry
+from python.topology.serialization import dump_yaml
 
 CS_PROM_PORT = 30452
 SCIOND_PROM_PORT = 30455
@@ -49,9 +43,9 @@ PROM_DC_FILE = "prom-dc.yml"
 
 
 class PrometheusGenArgs(ArgsTopoDicts):
-    def __init__(self, args, topo_dicts, networks: Mapping[IPNetwork, NetworkDescription]):
+    def __init__(self, args, topo_dicts, registry: AddressRegistry):
         super().__init__(args, topo_dicts)
-        self.networks = networks
+        self.registry = registry
 
 
 class PrometheusGenerator(object):
@@ -74,7 +68,7 @@ class PrometheusGenerator(object):
         :param PrometheusGenArgs args: Contains the passed command line arguments and topo dicts.
         """
         self.args = args
-        self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
+        self.output_base = self.args.host.output_base
 
     def generate(self):
         config_dict = {}
@@ -88,11 +82,14 @@ class PrometheusGenerator(object):
                 ele_dict["ControlService"].append(a)
             if self.args.docker:
                 host_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
-                                                       self.args.networks, DISP_PROM_PORT, "")
+                                                       self.args.registry, DISP_PROM_PORT, "")
                 br_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
-                                                     self.args.networks, DISP_PROM_PORT, "br")
+                                                     self.args.registry, DISP_PROM_PORT, "br")
                 ele_dict["Dispatcher"] = [host_dispatcher, br_dispatcher]
-            sd_prom_addr = '[%s]:%d' % (sciond_ip(self.args.docker, topo_id, self.args.networks),
+                if self.args.shared_dispatcher:
+                    # Both resolve to the dispatcher of the AS.
+                    ele_dict["Dispatcher"] = [host_dispatcher]
+            sd_prom_addr = '[%s]:%d' % (sciond_ip(self.args.docker, topo_id, self.args.registry),
                                         SCIOND_PROM_PORT)
             ele_dict["Sciond"].append(sd_prom_addr)
             config_dict[topo_id] = ele_dict
@@ -133,12 +130,12 @@ class PrometheusGenerator(object):
             },
             'scrape_configs': scrape_configs,
         }
-        write_file(config_path, yaml.dump(config, default_flow_style=False))
+        write_file(config_path, dump_yaml(config))
 
     def _write_target_file(self, base_path, target_addrs, ele_type):
         targets_path = os.path.join(base_path, self.PROM_DIR, self.TARGET_FILES[ele_type])
         target_config = [{'targets': target_addrs}]
-        write_file(targets_path, yaml.dump(target_config, default_flow_style=False))
+        write_file(targets_path, dump_yaml(target_config))
 
     def _write_disp_file(self):
         if self.args.docker:
@@ -147,7 +144,7 @@ class PrometheusGenerator(object):
                                     PrometheusGenerator.PROM_DIR, "disp.yml")
         target_config = [{'targets': [prom_addr_dispatcher(False, None, None,
                                                            DISP_PROM_PORT, None)]}]
-        write_file(targets_path, yaml.dump(target_config, default_flow_style=False))
+        write_file(targets_path, dump_yaml(target_config))
 
     def _write_dc_file(self):
         name = 'prometheus'
@@ -166,4 +163,4 @@ class PrometheusGenerator(object):
             }
         }
         write_file(os.path.join(self.args.output_dir, PROM_DC_FILE),
-                   yaml.dump(prom_dc, default_flow_style=False))
+                   dump_yaml(prom_dc))
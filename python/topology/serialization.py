@@ -0,0 +1,209 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`serialization` --- SCION topology generator serialization
+================================================================
+
+Serializes the generated YAML, TOML and JSON files. The fast backend uses the
+libyaml emitter if available, a TOML encoder for the plain values the
+generators use (strings, ints, bools and lists of them), and an indenting JSON
+encoder built on the C string encoder of the json module. Its output is
+byte-identical to the pure backend, which uses PyYAML's Python emitter,
+toml.dumps and json.dumps.
+"""
+# Stdlib
+import json
+import re
+
+# External packages
+import toml
+import yaml
+
+BACKEND_FAST = 'fast'
+BACKEND_PURE = 'pure'
+BACKENDS = (BACKEND_FAST, BACKEND_PURE)
+
+_FAST_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+_backend = BACKEND_FAST
+
+_BARE_KEY = re.compile(r'[A-Za-z0-9_-]+')
+# Printable ASCII without quotes and backslashes, which toml does not escape.
+_PLAIN_STR = re.compile(r'[ !#-&(-\[\]-~]*')
+_TOML_ENCODER = toml.TomlEncoder()
+_json_str = json.encoder.encode_basestring_ascii
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def set_backend(backend: str):
+    """
+    Sets the serialization backend of the current process.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown serialization backend '%s'" % backend)
+    global _backend
+    _backend = backend
+
+
+def add_yaml_representer(data_type, representer):
+    """
+    Registers a YAML representer with the dumpers of all backends.
+    """
+    for dumper in {yaml.Dumper, yaml.SafeDumper, _FAST_DUMPER}:
+        dumper.add_representer(data_type, representer)
+
+
+def dump_yaml(data, **kwargs) -> str:
+    kwargs.setdefault('default_flow_style', False)
+    dumper = _FAST_DUMPER if _backend == BACKEND_FAST else yaml.Dumper
+    return yaml.dump(data, Dumper=dumper, **kwargs)
+
+
+def dump_toml(data: dict) -> str:
+    if _backend == BACKEND_FAST:
+        try:
+            return _dump_toml(data)
+        except _Unsupported:
+            pass
+    return toml.dumps(data)
+
+
+def dump_json(data, indent=None, sort_keys=False, default=None) -> str:
+    """
+    Same as json.dumps with the given arguments. json.dumps only uses its C
+    encoder without indentation.
+    """
+    if _backend == BACKEND_FAST and indent is not None:
+        try:
+            return _json_value(data, "\n", " " * indent, sort_keys, default)
+        except _Unsupported:
+            pass
+    return json.dumps(data, indent=indent, sort_keys=sort_keys, default=default)
+
+
+def _json_value(o, nl, step, sort_keys, default):
+    """
+    Mirrors the Python encoder of the json module with separators (',', ': ').
+    nl is the newline and indentation of the current level.
+    """
+    enc = _JSON_SCALARS.get(type(o))
+    if enc is not None:
+        return enc(o)
+    if isinstance(o, str):
+        return _json_str(o)
+    if o is True or o is False:
+        return "true" if o else "false"
+    if isinstance(o, int):
+        return int.__repr__(o)
+    if isinstance(o, float):
+        return _json_float(o)
+    inner = nl + step
+    sep = "," + inner
+    if isinstance(o, (list, tuple)):
+        if not o:
+            return "[]"
+        parts = []
+        for v in o:
+            # Scalars are encoded inline, they are the bulk of the values.
+            enc = _JSON_SCALARS.get(type(v))
+            parts.append(enc(v) if enc is not None else
+                         _json_value(v, inner, step, sort_keys, default))
+        return "[" + inner + sep.join(parts) + nl + "]"
+    if isinstance(o, dict):
+        if not o:
+            return "{}"
+        items = sorted(o.items()) if sort_keys else o.items()
+        parts = []
+        for k, v in items:
+            if type(k) is not str:
+                raise _Unsupported
+            enc = _JSON_SCALARS.get(type(v))
+            parts.append(_json_str(k) + ": " + (
+                enc(v) if enc is not None else _json_value(v, inner, step, sort_keys, default)))
+        return "{" + inner + sep.join(parts) + nl + "}"
+    if o is None:
+        return "null"
+    if default is None:
+        raise _Unsupported
+    return _json_value(default(o), nl, step, sort_keys, default)
+
+
+def _json_float(o):
+    if o != o or o in (float("inf"), float("-inf")):
+        raise _Unsupported
+    return float.__repr__(o)
+
+
+_JSON_SCALARS = {
+    str: _json_str,
+    int: int.__repr__,
+    bool: lambda o: "true" if o else "false",
+    float: _json_float,
+    type(None): lambda o: "null",
+}
+
+
+def _dump_toml(data):
+    """
+    Mirrors toml.dumps: the plain values of a table come first, followed by
+    its sub-tables in breadth-first order.
+    """
+    out, tables = _toml_table(data)
+    while tables:
+        next_tables = {}
+        for name, table in tables.items():
+            values, sub_tables = _toml_table(table)
+            if values or not sub_tables:
+                if out and out[-2:] != "\n\n":
+                    out += "\n"
+                out += "[" + name + "]\n" + values
+            for sub, sub_table in sub_tables.items():
+                next_tables[name + "." + sub] = sub_table
+        tables = next_tables
+    return out
+
+
+def _toml_table(table):
+    values = []
+    tables = {}
+    for key, value in table.items():
+        if type(key) is not str:
+            raise _Unsupported
+        if not _BARE_KEY.fullmatch(key):
+            key = _TOML_ENCODER.dump_value(key)
+        if isinstance(value, dict):
+            tables[key] = value
+        elif value is not None:
+            values.append(key + " = " + _toml_value(value) + "\n")
+    return "".join(values), tables
+
+
+def _toml_value(value):
+    t = type(value)
+    if t is str:
+        if _PLAIN_STR.fullmatch(value):
+            return '"' + value + '"'
+        return _TOML_ENCODER.dump_value(value)
+    if t is bool:
+        return "true" if value else "false"
+    if t is int:
+        return str(value)
+    if t is list:
+        # Lists of tables raise _Unsupported, toml.dumps writes them as arrays of tables.
+        return "[" + "".join(" " + _toml_value(v) + "," for v in value) + "]"
+    if isinstance(value, (dict, list)):
+        raise _Unsupported
+    return str(_TOML_ENCODER.dump_value(value))
@@ -0,0 +1,74 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`serialization_test` --- topology.serialization unit tests
+===============================================================
+"""
+# Stdlib
+import json
+import unittest
+
+# External packages
+import toml
+import yaml
+
+# SCION
+from python.topology import serialization
+
+
+class TestSerialization(unittest.TestCase):
+    """
+    Unit tests for topology.serialization
+    """
+    def tearDown(self):
+        serialization.set_backend(serialization.BACKEND_FAST)
+
+    def test_toml(self):
+        confs = [
+            {},
+            {"general": {"id": "br1-ff00_0_110-1", "config_dir": "/a b/c"},
+             "log": {"console": {"level": "debug"}},
+             "metrics": {"prometheus": "[fd00::1]:30442"}},
+            {"a": 1, "b": True, "c": 1.5e-07, "d": None, "e": [], "f": {},
+             "g": {"h": {"i": {}}, "j": [1, "x"]}, "dotted.key": {"k": "v"}},
+            {"quotes": "it's \"quoted\"", "escapes": "a\\b\tc\x01", "unicode": "é",
+             "list": ["'", "\"", ("tuple", 1)]},
+            {"tables": [{"a": 1}, {"b": {"c": 2}}], "after": {"x": 1}},
+        ]
+        for conf in confs:
+            with self.subTest(conf=conf):
+                self.assertEqual(serialization.dump_toml(conf), toml.dumps(conf))
+
+    def test_json(self):
+        data = {"b": [1, 2.5, -1e-07, True, None, [], {}], "a": {"x": "é\"\n", "y": [{"z": 0}]},
+                "obj": object()}
+        for kwargs in ({"indent": 2}, {"indent": 4, "sort_keys": True}, {"indent": 0}):
+            with self.subTest(kwargs=kwargs):
+                self.assertEqual(serialization.dump_json(data, default=str, **kwargs),
+                                 json.dumps(data, default=str, **kwargs))
+        self.assertEqual(serialization.dump_json({1: float("nan")}, indent=2),
+                         json.dumps({1: float("nan")}, indent=2))
+
+    def test_yaml(self):
+        conf = {"services": {"b": {"ports": ["30041:30041"], "user": "1:1"},
+                             "a": {"command": ["--config", "/share/conf/cs.toml"]}},
+                "version": "2.4", "empty": {}, "text": "multi\nline: 'x'"}
+        fast = serialization.dump_yaml(conf)
+        serialization.set_backend(serialization.BACKEND_PURE)
+        self.assertEqual(fast, serialization.dump_yaml(conf))
+        self.assertEqual(fast, yaml.dump(conf, default_flow_style=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
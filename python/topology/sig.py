@@ -14,15 +14,16 @@
 # limitations under the License.
 
 # Stdlib
-import json
 import os
 # External packages
-import toml
 # SCION
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsBase,
+    depends_healthy,
+    disp_healthcheck,
     json_default,
+    metrics_healthcheck,
     sciond_svc_name,
     SD_API_PORT,
     SIG_CONFIG_NAME,
@@ -30,6 +31,7 @@ from python.topology.common import (
 )
 from python.topology.net import socket_address_str
 from python.topology.prometheus import SIG_PROM_PORT
+from python.topology.serialization import dump_json, dump_toml
 
 
 class SIGGenArgs(ArgsBase):
@@ -53,8 +55,8 @@ class SIGGenerator(object):
         """
         self.args = args
         self.dc_conf = args.dc_conf
-        self.user = '%d:%d' % (os.getuid(), os.getgid())
-        self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
+        self.user = self.args.host.user
+        self.output_base = self.args.host.output_base
         self.prefix = ''
 
     def generate(self):
@@ -74,6 +76,7 @@ class SIGGenerator(object):
             'dispatcher',
             'container_name':
             'scion_%sdisp_sig_%s' % (self.prefix, topo_id.file_fmt()),
+            'healthcheck': disp_healthcheck(),
             'depends_on': {
                 'utils_chowner': {
                     'condition': 'service_started'
@@ -109,21 +112,21 @@ class SIGGenerator(object):
         disp_id = 'scion_disp_sig_%s' % topo_id.file_fmt()
         self.dc_conf['services'][setup_name] = {
             'image': 'tester:latest',
-            'depends_on': [disp_id],
+            'depends_on': depends_healthy(disp_id),
             'entrypoint': './sig_setup.sh',
             'privileged': True,
             'network_mode': 'service:%s' % disp_id,
         }
+        depends_on = depends_healthy(disp_id, sciond_svc_name(topo_id))
+        depends_on[setup_name] = {'condition': 'service_started'}
         self.dc_conf['services']['scion_sig_%s' % topo_id.file_fmt()] = {
             'image':
             'posix-gateway:latest',
             'container_name':
             'scion_%ssig_%s' % (self.prefix, topo_id.file_fmt()),
-            'depends_on': [
-                disp_id,
-                sciond_svc_name(topo_id),
-                setup_name,
-            ],
+            'depends_on': depends_on,
+            # The gateway serves the metrics on all addresses.
+            'healthcheck': metrics_healthcheck('127.0.0.1:%s' % SIG_PROM_PORT),
             'environment': {
                 'SCION_EXPERIMENTAL_GATEWAY_PATH_UPDATE_INTERVAL': '1s',
             },
@@ -150,7 +153,7 @@ class SIGGenerator(object):
             sig_cfg['ASes'][str(t_id)]['Nets'].append(net['net'])
 
         cfg = os.path.join(topo_id.base_dir(self.args.output_dir), "sig.json")
-        contents_json = json.dumps(sig_cfg, default=json_default, indent=2)
+        contents_json = dump_json(sig_cfg, default=json_default, indent=2)
         write_file(cfg, contents_json + '\n')
 
     def _sig_toml(self, topo_id, topo):
@@ -191,7 +194,7 @@ class SIGGenerator(object):
         }
         path = os.path.join(topo_id.base_dir(self.args.output_dir),
                             SIG_CONFIG_NAME)
-        write_file(path, toml.dumps(sig_conf))
+        write_file(path, dump_toml(sig_conf))
 
     def _disp_vol(self, topo_id):
         return 'vol_scion_%sdisp_sig_%s:/run/shm/dispatcher:rw' % (
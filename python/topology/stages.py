@@ -0,0 +1,121 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`stages` --- SCION topology generator stage scheduler
+==========================================================
+
+Runs the stages of the topology generator as a DAG. Every stage declares the
+artifacts it requires and provides. A stage starts as soon as all its required
+artifacts are provided, so that independent stages run concurrently.
+"""
+# Stdlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+class Stage(object):
+    def __init__(self, name: str, func: Callable[[], None],
+                 requires: Iterable[str] = (), provides: Iterable[str] = ()):
+        """
+        :param str name: The name of the stage.
+        :param func: Runs the stage.
+        :param requires: The artifacts that must be provided before the stage runs.
+        :param provides: The artifacts that are provided once the stage is done.
+        """
+        self.name = name
+        self.func = func
+        self.requires = frozenset(requires)
+        self.provides = frozenset(provides)
+
+
+class StageScheduler(object):
+    """
+    Runs stages in dependency order, on up to workers threads. Ready stages are
+    started in the order they were given, so with a single worker the stages
+    run one after another in that order.
+    """
+    def __init__(self, stages: List[Stage], workers: int = 1):
+        self.stages = stages
+        self.workers = max(1, workers)
+        # Stage name to (start, duration) in seconds, relative to the start of run().
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._check()
+
+    def _check(self):
+        """
+        Checks that all required artifacts are provided and that there are no cycles.
+        """
+        provided = set()
+        pending = list(self.stages)
+        while pending:
+            ready = [s for s in pending if s.requires <= provided]
+            if not ready:
+                raise ValueError("Unsatisfiable stage requirements: %s" % ", ".join(
+                    "%s requires %s" % (s.name, ", ".join(sorted(s.requires - provided)))
+                    for s in pending))
+            for s in ready:
+                provided |= s.provides
+                pending.remove(s)
+
+    def run(self):
+        """
+        Runs all stages. If a stage fails, no further stages are started, and
+        the error is raised once the running stages are done.
+        """
+        self._start = time.perf_counter()
+        provided = set()
+        pending = list(self.stages)
+        running = {}
+        err = None
+        with ThreadPoolExecutor(self.workers) as pool:
+            while running or (pending and err is None):
+                for stage in list(pending):
+                    if err is not None or len(running) >= self.workers:
+                        break
+                    if stage.requires <= provided:
+                        pending.remove(stage)
+                        running[pool.submit(self._run_stage, stage)] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    stage = running.pop(fut)
+                    try:
+                        fut.result()
+                    except BaseException as e:
+                        if err is None:
+                            err = e
+                        continue
+                    provided |= stage.provides
+        if err is not None:
+            raise err
+
+    def _run_stage(self, stage):
+        start = time.perf_counter()
+        try:
+            stage.func()
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.timings[stage.name] = (start - self._start, end - start)
+
+    def summary(self) -> str:
+        """
+        Returns a table of the start time and duration of every stage.
+        """
+        lines = ["%-16s %10s %10s" % ("stage", "start [s]", "time [s]")]
+        for name, (start, duration) in sorted(self.timings.items(), key=lambda x: x[1]):
+            lines.append("%-16s %10.3f %10.3f" % (name, start, duration))
+        return "\n".join(lines)
@@ -0,0 +1,72 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`stages_test` --- topology.stages unit tests
+=================================================
+"""
+# Stdlib
+import threading
+import unittest
+
+# SCION
+from python.topology.stages import Stage, StageScheduler
+
+
+class TestStageScheduler(unittest.TestCase):
+    """
+    Unit tests for topology.stages.StageScheduler
+    """
+    def _stages(self, ran, fail=None):
+        def func(name):
+            def run():
+                if name == fail:
+                    raise RuntimeError(name)
+                ran.append(name)
+            return run
+        return [
+            Stage("b", func("b"), requires=["topo"]),
+            Stage("topo", func("topo"), provides=["topo"]),
+            Stage("c", func("c"), requires=["topo", "b"]),
+            Stage("a", func("a")),
+        ]
+
+    def test_serial_order(self):
+        ran = []
+        self.assertRaises(ValueError, StageScheduler, self._stages(ran))
+        stages = self._stages(ran)
+        stages[0].provides = frozenset(["b"])
+        scheduler = StageScheduler(stages)
+        scheduler.run()
+        # The first ready stage in the given order runs next.
+        self.assertEqual(ran, ["topo", "b", "c", "a"])
+        self.assertEqual(scheduler.timings.keys(), {"topo", "a", "b", "c"})
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(2, timeout=5)
+        stages = [Stage("x", barrier.wait), Stage("y", barrier.wait)]
+        # Both stages must run at the same time to pass the barrier.
+        StageScheduler(stages, workers=2).run()
+
+    def test_failure(self):
+        ran = []
+        stages = self._stages(ran, fail="topo")
+        stages[0].provides = frozenset(["b"])
+        with self.assertRaisesRegex(RuntimeError, "topo"):
+            StageScheduler(stages).run()
+        # The stages that depend on the failed stage are not run.
+        self.assertEqual(ran, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
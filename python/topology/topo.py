@@ -17,16 +17,13 @@
 =============================================
 """
 # Stdlib
-import json
 import logging
 import os
 import random
 import sys
+from array import array
 from collections import defaultdict
 
-# External packages
-import yaml
-
 # SCION
 from python.lib.defines import (
     AS_LIST_FILE,
@@ -39,15 +36,19 @@ from python.lib.types import LinkType
 from python.lib.util import write_file
 from python.topology.common import (
     ArgsBase,
+    as_disp_elem,
     join_host_port,
     json_default,
     SCION_SERVICE_NAMES,
+    shares_as_disp,
     TopoID
 )
+from python.topology.groups import iter_ases, iter_links
 from python.topology.net import (
-    PortGenerator,
+    PortAllocator,
     SubnetGenerator
 )
+from python.topology.serialization import dump_json, dump_yaml
 
 DEFAULT_BEACON_SERVERS = 1
 DEFAULT_CONTROL_SERVERS = 1
@@ -81,7 +82,8 @@ class TopoGenArgs(ArgsBase):
             ADDR_TYPE_6: subnet_gen6,
         }
         self.default_mtu = default_mtu
-        self.port_gen = PortGenerator()
+        plan = PortAllocator.load_plan(self.port_plan) if self.port_plan else None
+        self.port_gen = PortAllocator(self.port_range, plan, self.check_ports)
 
 
 class TopoGenerator(object):
@@ -98,6 +100,8 @@ class TopoGenerator(object):
         self.ifid_map = {}
 
     def _reg_addr(self, topo_id: TopoID, elem_id, addr_type):
+        if shares_as_disp(self.args, elem_id):
+            elem_id = as_disp_elem(topo_id)
         subnet = self.args.subnet_gen[addr_type].register(str(topo_id))
         if self.args.docker and addr_type == ADDR_TYPE_6:
             # for docker also allocate an IPv4 address so that we have ipv4
@@ -106,9 +110,15 @@ class TopoGenerator(object):
             v4subnet.register(elem_id + '_v4')
         return subnet.register(elem_id)
 
-    def _reg_link_addrs(self, local_br, remote_br, local_ifid, remote_ifid, addr_type):
-        link_name = str(sorted((local_br, remote_br)))
-        link_name += str(sorted((local_ifid, remote_ifid)))
+    def _reg_link_addrs(self, local, remote, local_br, remote_br, local_ifid, remote_ifid,
+                        addr_type):
+        if self.args.fabric:
+            # All links of the fabric share one network, every BR has a single
+            # address in it.
+            link_name = fabric_name(local, remote)
+        else:
+            link_name = str(sorted((local_br, remote_br)))
+            link_name += str(sorted((local_ifid, remote_ifid)))
         subnet = self.args.subnet_gen[addr_type].register(link_name)
         if self.args.docker and addr_type == ADDR_TYPE_6:
             # for docker also allocate an IPv4 address so that we have ipv4
@@ -118,7 +128,7 @@ class TopoGenerator(object):
         return subnet.register(local_br), subnet.register(remote_br)
 
     def _iterate(self, f):
-        for isd_as, as_conf in self.args.topo_config_dict["ASes"].items():
+        for isd_as, as_conf in iter_ases(self.args.topo_config_dict):
             f(TopoID(isd_as), as_conf)
 
     def generate(self):
@@ -136,6 +146,8 @@ class TopoGenerator(object):
         self._iterate(self._write_as_topo)
         self._write_as_list()
         self._write_ifids()
+        if self.args.port_plan and not self.args.docker:
+            self.args.port_gen.save_plan(self.args.port_plan)
         return self.topo_dicts, networks
 
     def _register_addrs(self, topo_id, as_conf):
@@ -169,7 +181,8 @@ class TopoGenerator(object):
     def _register_br_entry(self, local, l_ifid, remote, r_ifid, remote_type, attrs,
                            local_br, remote_br, addr_type):
         link_addr_type = addr_type_from_underlay(attrs.get('underlay', DEFAULT_UNDERLAY))
-        self._reg_link_addrs(local_br, remote_br, l_ifid, r_ifid, link_addr_type)
+        self._reg_link_addrs(local, remote, local_br, remote_br, l_ifid, r_ifid,
+                             link_addr_type)
         self._reg_addr(local, local_br + "_internal", addr_type)
         if not self.args.docker:
             self.args.port_gen.register(local_br + "_internal")
@@ -202,20 +215,36 @@ class TopoGenerator(object):
         br = "br%s-%d" % (ep.file_fmt(), br_id)
         ifid = ep.ifid
         if self.args.random_ifids or not ifid:
-            ifid = if_ids[ep].new()
-        else:
-            if_ids[ep].add(ifid)
+            ifid = self._ifid_gen(if_ids, ep).new()
         return br, ifid
 
+    def _ifid_gen(self, if_ids, topo_id):
+        gen = if_ids.get(topo_id)
+        if gen is None:
+            rand = random
+            if self.args.seed is not None:
+                # Seeded per AS, so that the IFIDs of an AS only depend on its own links.
+                rand = random.Random("%s-%s" % (self.args.seed, topo_id))
+            gen = if_ids[topo_id] = IFIDGenerator(rand)
+        return gen
+
     def _read_links(self):
         assigned_br_id = {}
         br_ids = defaultdict(int)
-        if_ids = defaultdict(lambda: IFIDGenerator())
-        if not self.args.topo_config_dict.get("links", None):
-            return
-        for attrs in self.args.topo_config_dict["links"]:
-            a = LinkEP(attrs.pop("a"))
-            b = LinkEP(attrs.pop("b"))
+        if_ids = {}
+        links = []
+        for attrs in iter_links(self.args.topo_config_dict):
+            links.append((LinkEP(attrs.pop("a")), LinkEP(attrs.pop("b")), attrs))
+        if not self.args.random_ifids:
+            # Reserve the pinned IFIDs first, so that generated ones never collide with them.
+            pinned = defaultdict(list)
+            for a, b, _ in links:
+                for ep in (a, b):
+                    if ep.ifid:
+                        pinned[ep].append(ep.ifid)
+            for topo_id, ifids in pinned.items():
+                self._ifid_gen(if_ids, topo_id).reserve(ifids)
+        for a, b, attrs in links:
             linkto = linkto_a = linkto_b = attrs.pop("linkAtoB")
             if linkto.lower() == LinkType.CHILD:
                 linkto_a = LinkType.PARENT
@@ -297,8 +326,8 @@ class TopoGenerator(object):
     def _gen_br_entry(self, local, l_ifid, remote, r_ifid, remote_type, attrs,
                       local_br, remote_br, addr_type):
         link_addr_type = addr_type_from_underlay(attrs.get('underlay', DEFAULT_UNDERLAY))
-        public_addr, remote_addr = self._reg_link_addrs(local_br, remote_br, l_ifid,
-                                                        r_ifid, link_addr_type)
+        public_addr, remote_addr = self._reg_link_addrs(local, remote, local_br, remote_br,
+                                                        l_ifid, r_ifid, link_addr_type)
 
         intl_addr = self._reg_addr(local, local_br + "_internal", addr_type)
         if self.topo_dicts[local]["border_routers"].get(local_br) is None:
@@ -309,19 +338,27 @@ class TopoGenerator(object):
             self.topo_dicts[local]["border_routers"][local_br] = {
                 'internal_addr': join_host_port(intl_addr.ip, intl_port),
                 'interfaces': {
-                    l_ifid: self._gen_br_intf(remote, public_addr, remote_addr, attrs, remote_type)
+                    l_ifid: self._gen_br_intf(remote, public_addr, remote_addr, attrs,
+                                              remote_type, l_ifid, r_ifid)
                 }
             }
         else:
             # There is already a BR entry, add interface
-            intf = self._gen_br_intf(remote, public_addr, remote_addr, attrs, remote_type)
+            intf = self._gen_br_intf(remote, public_addr, remote_addr, attrs, remote_type,
+                                     l_ifid, r_ifid)
             self.topo_dicts[local]["border_routers"][local_br]['interfaces'][l_ifid] = intf
 
-    def _gen_br_intf(self, remote, public_addr, remote_addr, attrs, remote_type):
+    def _gen_br_intf(self, remote, public_addr, remote_addr, attrs, remote_type,
+                     l_ifid, r_ifid):
+        public_port = remote_port = SCION_ROUTER_PORT
+        if self.args.fabric:
+            # The interfaces of a BR share its fabric address.
+            public_port += l_ifid
+            remote_port += r_ifid
         return {
             'underlay': {
-                'public': join_host_port(public_addr.ip, SCION_ROUTER_PORT),
-                'remote': join_host_port(remote_addr.ip, SCION_ROUTER_PORT),
+                'public': join_host_port(public_addr.ip, public_port),
+                'remote': join_host_port(remote_addr.ip, remote_port),
             },
             'isd_as': str(remote),
             'link_to': LinkType.to_str(remote_type.lower()),
@@ -350,21 +387,23 @@ class TopoGenerator(object):
 
     def _write_as_topo(self, topo_id, _as_conf):
         path = os.path.join(topo_id.base_dir(self.args.output_dir), TOPO_FILE)
-        contents_json = json.dumps(self.topo_dicts[topo_id],
-                                   default=json_default, indent=2)
+        contents_json = dump_json(self.topo_dicts[topo_id],
+                                  default=json_default, indent=2)
         write_file(path, contents_json + '\n')
 
     def _write_as_list(self):
         list_path = os.path.join(self.args.output_dir, AS_LIST_FILE)
-        write_file(list_path, yaml.dump(dict(self.as_list)))
+        write_file(list_path, dump_yaml(dict(self.as_list)))
 
     def _write_ifids(self):
         list_path = os.path.join(self.args.output_dir, IFIDS_FILE)
-        write_file(list_path, yaml.dump(self.ifid_map,
-                                        default_flow_style=False))
+        write_file(list_path, dump_yaml(self.ifid_map))
 
 
 class LinkEP(TopoID):
+    # Every link end point has its own BR and interface ID.
+    INTERN = False
+
     def __init__(self, raw):
         self._brid = None
         self.ifid = None
@@ -386,27 +425,65 @@ class LinkEP(TopoID):
 
 
 class IFIDGenerator(object):
-    """Generates unique interface IDs"""
-
-    def __init__(self):
-        self._ifids = set()
+    """
+    Generates unique interface IDs. A bitmap marks the used IDs, and the free IDs are kept in an
+    array together with their positions, so that reserving and drawing an ID take constant time.
+    """
+    MIN_IFID = 1
+    MAX_IFID = 4095
+
+    def __init__(self, rand=random):
+        """
+        :param rand: The random.Random instance (or the random module) to draw IDs from.
+        """
+        self._rand = rand
+        self._used = bytearray(self.MAX_IFID + 1)
+        self._free = array('H', range(self.MIN_IFID, self.MAX_IFID + 1))
+        self._pos = array('H', [0] * self.MIN_IFID + list(range(len(self._free))))
+        self._nfree = len(self._free)
 
     def new(self):
-        while True:
-            ifid = random.randrange(1, 4096)
-            if ifid in self._ifids:
-                continue
-            self.add(ifid)
-            return ifid
+        if not self._nfree:
+            logging.critical("No free IFIDs left!")
+            exit(1)
+        ifid = self._free[self._rand.randrange(self._nfree)]
+        self._take(ifid)
+        return ifid
 
     def add(self, ifid):
-        if ifid in self._ifids:
-            logging.critical("IFID %d already exists!" % ifid)
-            exit(1)
-        if ifid < 1 or ifid > 4095:
+        if ifid < self.MIN_IFID or ifid > self.MAX_IFID:
             logging.critical("IFID %d is invalid!" % ifid)
             exit(1)
-        self._ifids.add(ifid)
+        if self._used[ifid]:
+            logging.critical("IFID %d already exists!" % ifid)
+            exit(1)
+        self._take(ifid)
+
+    def reserve(self, ifids):
+        """
+        Reserves the given, e.g. operator pinned, IFIDs.
+        """
+        for ifid in ifids:
+            self.add(ifid)
+
+    def _take(self, ifid):
+        # Move the last free ID into the slot of the taken one.
+        i = self._pos[ifid]
+        self._nfree -= 1
+        last = self._free[self._nfree]
+        self._free[i] = last
+        self._pos[last] = i
+        self._used[ifid] = 1
+
+
+def fabric_name(a: TopoID, b: TopoID) -> str:
+    """
+    Returns the name of the fabric network of a link between the ASes a and
+    b. Links within an ISD use the fabric of the ISD, links between two ISDs
+    the fabric of the ISD pair.
+    """
+    isds = sorted({a.isd_str(), b.isd_str()}, key=int)
+    return "fabric_" + "_".join(isds)
 
 
 def addr_type_from_underlay(underlay: str) -> str:
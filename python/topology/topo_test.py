@@ -0,0 +1,68 @@
+# Copyright 2020 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`topo_test` --- topology.topo unit tests
+=============================================
+"""
+# Stdlib
+import random
+import unittest
+
+# SCION
+from python.topology.topo import IFIDGenerator, TopoID, fabric_name
+
+
+class TestIFIDGenerator(unittest.TestCase):
+    """
+    Unit tests for topology.topo.IFIDGenerator
+    """
+    def test_exhaust(self):
+        gen = IFIDGenerator(random.Random(1))
+        gen.reserve([1, 4095, 17])
+        ifids = [gen.new() for _ in range(4092)]
+        self.assertEqual(sorted(ifids + [1, 17, 4095]), list(range(1, 4096)))
+        with self.assertRaises(SystemExit):
+            gen.new()
+
+    def test_seeded(self):
+        def draw(seed):
+            gen = IFIDGenerator(random.Random(seed))
+            gen.reserve([5])
+            return [gen.new() for _ in range(50)]
+        self.assertEqual(draw("1-ff00:0:110"), draw("1-ff00:0:110"))
+        self.assertNotEqual(draw("1-ff00:0:110"), draw("1-ff00:0:111"))
+        self.assertNotIn(5, draw(0))
+
+    def test_invalid(self):
+        gen = IFIDGenerator()
+        gen.add(7)
+        for ifid in (0, 4096, 7):
+            with self.subTest(ifid=ifid):
+                with self.assertRaises(SystemExit):
+                    gen.add(ifid)
+
+
+class TestFabricName(unittest.TestCase):
+    """
+    Unit tests for topology.topo.fabric_name
+    """
+    def test_fabric_name(self):
+        a, b, c = TopoID("1-ff00:0:110"), TopoID("1-ff00:0:111"), TopoID("12-ff00:0:120")
+        self.assertEqual(fabric_name(a, b), "fabric_1")
+        self.assertEqual(fabric_name(c, a), "fabric_1_12")
+        self.assertEqual(fabric_name(a, c), fabric_name(c, a))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,13 +2,14 @@
 
 # Copyright 2020 Anapaya Systems
 
+import argparse
 import os
-import shutil
-import tempfile
 
 from plumbum import cli
-from plumbum import cmd
-from plumbum import local
+
+from python.topology import generator
+from python.topology.bundle import ArtifactBundle
+from python.topology.config import ConfigGenArgs, ConfigGenerator
 
 
 class Gen(cli.Application):
@@ -17,17 +18,17 @@ class Gen(cli.Application):
     contains the output of a topogen run. This is needed so that the bazel test
     can consume this tar, in bazel you can't specify an unknown amount of files
     as output, therefore a tar is used to pack everything up.
+
+    Topogen runs in-process and generates into memory. The paths in the
+    generated files start with $SCIONROOT, so that tests can adapt them to
+    wherever they unpack the tar. The tar entries are sorted and carry no
+    timestamps, so the same inputs always produce the same tar.
     """
-    topogen_bin = './python/generator.py'
     scion_pki_bin = './bin/scion-pki'
     topo = "default.topo"
     outfile = 'gen.tar'
     params = ''
 
-    @cli.switch('topogen_bin', str, help='topogen binary path (default ./python/generator.py)')
-    def set_topogen_bin(self, topogen_bin: str):
-        self.topogen_bin = topogen_bin
-
     @cli.switch('scion_pki', str, help='scion-pki binary path (default ./bin/scion-pki)')
     def set_scion_pki(self, scion_pki: str):
         self.scion_pki_bin = scion_pki
@@ -45,25 +46,19 @@ class Gen(cli.Application):
         self.params = params
 
     def main(self):
-        tmpdir = local.path(tempfile.mkdtemp(prefix='topogen.'))
-        try:
-            scion_pki = local.path(self.scion_pki_bin)
-            topogen = local[self.topogen_bin]
-            local.env.path.insert(0, scion_pki.parent)
-            topogen_args = ['-o', tmpdir / 'gen', '-c', self.topo]
-            if self.params != '':
-                topogen_args += self.params.split()
-            print('Running topogen with following arguments: ' + ' '.join(topogen_args))
-            print(topogen(*topogen_args))
-            # Remove the explicit scion root dir, so that tests can adapt this to wherever they
-            # unpack the tar.
-            cmd.sed('-i', 's@%s@$SCIONROOT@g' % local.path('.'), tmpdir / 'gen' / 'scion-dc.yml')
-            cmd.sed('-i', 's@%s@$SCIONROOT@g' % tmpdir, tmpdir / 'gen' / 'scion-dc.yml')
-            for support_dir in ['logs', 'gen-cache', 'gen-data', 'traces']:
-                os.mkdir(tmpdir / support_dir)
-            cmd.tar('-C', tmpdir, '-cf', self.outfile, '.')
-        finally:
-            shutil.rmtree(tmpdir, ignore_errors=True)
+        topogen_args = ['-o', 'gen', '-c', self.topo, '--output-base', '$SCIONROOT',
+                        '--scion-pki', os.path.abspath(self.scion_pki_bin)]
+        topogen_args += self.params.split()
+        print('Running topogen with following arguments: ' + ' '.join(topogen_args))
+        parser = generator.add_arguments(argparse.ArgumentParser())
+        raw_args = parser.parse_args(topogen_args)
+        generator.init_features(raw_args)
+        # Rooted at the working directory, so that the files are below gen.
+        bundle = ArtifactBundle(os.curdir)
+        ConfigGenerator(ConfigGenArgs(raw_args)).generate_all(bundle=bundle)
+        for support_dir in ['logs', 'gen-cache', 'gen-data', 'traces']:
+            bundle.add_dir(support_dir)
+        bundle.write_tar(self.outfile)
 
 
 if __name__ == "__main__":
@@ -43,7 +43,6 @@ def topology(
 
     cmd = ("$(location //python/topology:topogentar) " +
            "--scion_pki $(location //go/scion-pki) " +
-           "--topogen_bin $(location //python/topology:topogen) " +
            "--topo $(location " + src + ") --out $@ --params '" + params + "'")
     native.genrule(
         name = name,
@@ -54,7 +53,6 @@ def topology(
         cmd = cmd,
         tools = [
             "//python/topology:topogentar",
-            "//python/topology:topogen",
             "//go/scion-pki",
             "//tools:docker_ip",
         ],
@@ -44,7 +44,12 @@ cmd_topo_clean() {
 
 cmd_topology() {
     set -e
-    cmd_topo_clean
+    if [[ " $* " == *" --incremental "* ]]; then
+        # Keep the generated files, only the changes are applied.
+        mkdir -p logs traces gen gen-cache gen-certs
+    else
+        cmd_topo_clean
+    fi
 
     # Build the necessary binaries.
     bazel build //:scion-topo
@@ -71,8 +76,9 @@ cmd_run() {
     run_setup
     echo "Running the network..."
     if is_docker_be; then
-        docker-compose -f gen/scion-dc.yml -p scion build
-        docker-compose -f gen/scion-dc.yml -p scion up -d
+        # tools/dc brings up the projects of a sharded topology concurrently.
+        ./tools/dc scion build
+        ./tools/dc scion up -d
         return 0
     fi
     # Start dispatcher first, as it is requrired by the border routers.
@@ -395,6 +401,7 @@ cmd_help() {
 	    $PROGRAM topology
 	        Create topology, configuration, and execution files.
 	        All arguments or options are passed to topology/generator.py
+	        With --incremental, the existing gen directory is updated instead of recreated.
 	    $PROGRAM run [nobuild]
 	        Run network.
 	    $PROGRAM mstart PROCESS
@@ -17,13 +17,14 @@
 import pathlib
 import sys
 import tempfile
-import yaml
 from collections import defaultdict
 
 from plumbum import cli, local
 from typing import Dict, List, NamedTuple
 
 from python.lib.types import LinkType
+from python.lib.util import load_yaml_file
+from python.topology.groups import iter_ases, iter_links
 from python.topology.topo import LinkEP, TopoID
 
 graph_fmt = """digraph topo {{
@@ -82,8 +83,7 @@ class Link(NamedTuple):
 
 
 def topodot(topofile) -> str:
-    with open(topofile, 'r') as f:
-        topo_config = yaml.safe_load(f)
+    topo_config = load_yaml_file(topofile, cache=True)
 
     links = topo_links(topo_config)
     clusters = topo_clusters(topo_config)
@@ -135,13 +135,13 @@ def topo_links(topo_config) -> List[Link]:
     return [
         Link(a=LinkEP(link['a']),
              b=LinkEP(link['b']),
-             type=link['linkAtoB'].lower()) for link in topo_config['links']
+             type=link['linkAtoB'].lower()) for link in iter_links(topo_config)
     ]
 
 
 def topo_clusters(topo_config) -> Dict[str, Dict[str, List[str]]]:
     clusters = defaultdict(lambda: defaultdict(list))
-    for raw_isd_as, config in topo_config['ASes'].items():
+    for raw_isd_as, config in iter_ases(topo_config):
         isd_as = TopoID(raw_isd_as)
         if config.get("core"):
             clusters[isd_as.ISD()]["core"].append(str(isd_as))